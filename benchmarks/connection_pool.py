@@ -0,0 +1,116 @@
+#########
+# Copyright (c) 2014 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+
+"""
+Benchmark for the connections made by sequences of operations, each creating
+Nova, Neutron and Cinder clients and making a few calls through each of them,
+as most operations do.
+
+Compares the client libraries' own connection handling against the shared
+connection pool (openstack_plugin_common.connection_pool), against a local
+HTTPS stand-in cloud, counting the connections - and so the TLS handshakes -
+the stand-in accepts.
+
+Usage: python -m benchmarks.connection_pool [--operations N] ...
+"""
+
+import argparse
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+
+import requests
+
+import openstack_plugin_common as common
+from openstack_plugin_common import connection_pool
+from openstack_plugin_common.tests.fake_cloud import (FakeCloud,
+                                                      FakeCloudServer,
+                                                      constant_latency)
+
+INSECURE = {'insecure': True}
+
+
+def _certificate(tmp_dir):
+    path = os.path.join(tmp_dir, 'cloud.pem')
+    with open(os.devnull, 'w') as devnull:
+        subprocess.check_call([
+            'openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes',
+            '-days', '1', '-subj', '/CN=127.0.0.1', '-keyout', path,
+            '-out', path], stdout=devnull, stderr=devnull)
+    return path
+
+
+def _operation(config, calls):
+    nova_client = common.NovaClient().get(config=config)
+    neutron_client = common.NeutronClient().get(config=config)
+    cinder_client = common.CinderClient().get(config=config)
+    for _ in range(calls):
+        nova_client.flavors.list(detailed=False)
+        neutron_client.list_networks()
+        cinder_client.volumes.list()
+
+
+def _run(name, server, args, pooled):
+    config = dict(server.cloud.openstack_config(), custom_configuration={
+        'nova_client': INSECURE,
+        'neutron_client': INSECURE,
+        'cinder_client': INSECURE,
+    }, connection_pool={'enabled': pooled})
+    connections = server.connections
+    start = time.time()
+    for _ in range(args.operations):
+        _operation(config, args.calls)
+    elapsed = time.time() - start
+    print('{0:>10}: {1:8.3f}s {2:6} connections {3:8.2f}ms per '
+          'operation'.format(name, elapsed, server.connections - connections,
+                             elapsed * 1000 / args.operations))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--operations', type=int, default=50)
+    parser.add_argument('--calls', type=int, default=2,
+                        help='calls per service per operation')
+    parser.add_argument('--latency-ms', type=float, default=0)
+    args = parser.parse_args()
+
+    requests.packages.urllib3.disable_warnings()
+    tmp_dir = tempfile.mkdtemp()
+    # the clients should only be configured by the benchmark
+    for name in [k for k in os.environ if k.startswith('OS_')]:
+        del os.environ[name]
+    os.environ[common.Config.OPENSTACK_CONFIG_PATH_ENV_VAR] = os.path.join(
+        tmp_dir, 'openstack_config.json')
+    latency = constant_latency(args.latency_ms / 1000.0) \
+        if args.latency_ms else None
+    server = FakeCloudServer(FakeCloud(latency=latency),
+                             certfile=_certificate(tmp_dir)).start()
+    try:
+        print('{0} operations, {1} calls per service each'.format(
+            args.operations, args.calls))
+        # the unpooled run comes first, as the pool is process-wide once
+        # enabled
+        _run('unpooled', server, args, pooled=False)
+        _run('pooled', server, args, pooled=True)
+    finally:
+        connection_pool.reset()
+        server.stop()
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+#########
+# Copyright (c) 2014 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+"""
+Benchmark for the cold import time of a plugin operation module, as paid by
+every task when agents start a fresh process per task.
+
+Each sample imports the module in a new interpreter. The median is checked
+against a budget, and the OpenStack client libraries loaded by the import
+(which should be none, as they are imported on first use) are listed.
+
+Usage: python -m benchmarks.import_time [--module M] [--budget-ms N] ...
+"""
+
+import argparse
+import subprocess
+import sys
+
+CLIENT_LIBRARIES = ('cinderclient', 'keystoneclient', 'neutronclient',
+                    'novaclient', 'IPy')
+
+_IMPORT_SCRIPT = '''
+import sys
+import time
+start = time.time()
+import {module}
+print(time.time() - start)
+print(' '.join(name for name in {libraries!r} if name in sys.modules))
+'''
+
+
+def sample(module):
+    output = subprocess.check_output([
+        sys.executable, '-c', _IMPORT_SCRIPT.format(
+            module=module, libraries=CLIENT_LIBRARIES)]).splitlines()
+    loaded_libraries = output[1].split() if len(output) > 1 else []
+    return float(output[0]), loaded_libraries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--module', default='neutron_plugin.network')
+    parser.add_argument('--samples', type=int, default=10)
+    parser.add_argument('--budget-ms', type=float, default=750)
+    args = parser.parse_args()
+
+    samples = [sample(args.module) for _ in range(args.samples)]
+    times = sorted(import_time * 1000 for import_time, _ in samples)
+    median = times[len(times) // 2]
+    print('import {0}: median {1:.0f} ms, min {2:.0f} ms, max {3:.0f} ms '
+          '(budget {4:.0f} ms)'.format(args.module, median, times[0],
+                                       times[-1], args.budget_ms))
+    print('client libraries loaded: {0}'.format(
+        ', '.join(samples[0][1]) or 'none'))
+
+    if median > args.budget_ms:
+        print('over budget')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
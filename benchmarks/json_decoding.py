@@ -0,0 +1,119 @@
+#########
+# Copyright (c) 2014 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+
+"""
+Benchmark for transferring and decoding a large port listing (50 MB by
+default), as returned by list_ports on a large tenant.
+
+Compares the decoding done by the client libraries - having requests guess
+the charset of the body, which declares none, and parsing it with the
+standard library's json - against the UTF-8 default and the fastest
+installed JSON module of openstack_plugin_common.response_decoding, and
+reports the size and decompression time of the gzip-compressed listing.
+
+Usage: python -m benchmarks.json_decoding [--size-mb N] ...
+"""
+
+import argparse
+import json
+import time
+import zlib
+
+import requests
+
+from openstack_plugin_common import response_decoding
+
+
+def _port(i):
+    return {
+        'id': '{0:08x}-0000-0000-0000-{1:012x}'.format(i, i),
+        'name': 'port-{0}'.format(i),
+        'network_id': '00000000-0000-0000-0000-{0:012x}'.format(i % 50),
+        'tenant_id': 'c0ffee00c0ffee00c0ffee00c0ffee00',
+        'mac_address': 'fa:16:3e:{0:02x}:{1:02x}:{2:02x}'.format(
+            i >> 16 & 0xff, i >> 8 & 0xff, i & 0xff),
+        'admin_state_up': True,
+        'status': 'ACTIVE',
+        'device_id': '{0:08x}-1111-1111-1111-{1:012x}'.format(i, i),
+        'device_owner': 'compute:nova',
+        'fixed_ips': [{
+            'subnet_id': '00000000-2222-2222-2222-{0:012x}'.format(i % 50),
+            'ip_address': '10.{0}.{1}.{2}'.format(
+                i >> 16 & 0xff, i >> 8 & 0xff, i & 0xff)}],
+        'security_groups': ['00000000-3333-3333-3333-000000000001'],
+        'allowed_address_pairs': [],
+        'extra_dhcp_opts': [],
+        'binding:vnic_type': 'normal',
+    }
+
+
+def _listing(size):
+    port_size = len(json.dumps(_port(0))) + 2
+    ports = [_port(i) for i in range(size / port_size)]
+    return json.dumps({'ports': ports, 'ports_links': []})
+
+
+def _response(content, encoding=None):
+    response = requests.Response()
+    response.status_code = 200
+    response.headers['Content-Type'] = 'application/json'
+    response._content = content
+    response.encoding = encoding
+    return response
+
+
+def _time(f, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.time()
+        f()
+        times.append(time.time() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--size-mb', type=float, default=50)
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='the best of how many runs is reported')
+    args = parser.parse_args()
+
+    content = _listing(int(args.size_mb * 1024 * 1024))
+    fast_json = response_decoding.get_json_module()
+    print('{0:.1f} MB listing, best of {1} runs'.format(
+        len(content) / 1024.0 / 1024, args.repeat))
+
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    compressed = compressor.compress(content) + compressor.flush()
+    print('{0:>34}: {1:7.3f}s ({2:.1f} MB, {3:.1f}%)'.format(
+        'gzip decompression',
+        _time(lambda: zlib.decompress(compressed, 16 + zlib.MAX_WBITS),
+              args.repeat),
+        len(compressed) / 1024.0 / 1024,
+        100.0 * len(compressed) / len(content)))
+
+    decoders = [
+        ('guessed charset, json', None, json),
+        ('UTF-8, json', 'utf-8', json),
+        ('UTF-8, {0}'.format(fast_json.__name__), 'utf-8', fast_json),
+    ]
+    for name, encoding, json_module in decoders:
+        def decode():
+            json_module.loads(_response(content, encoding).text)
+        print('{0:>34}: {1:7.3f}s'.format(name, _time(decode, args.repeat)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,246 @@
+#########
+# Copyright (c) 2014 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+
+"""
+Load test running the install and uninstall of many deployments concurrently,
+through the plugin's real operations, against an in-memory OpenStack cloud
+with simulated request latency.
+
+Each simulated node instance is a deployment of a network, subnet, router,
+security groups, port, keypair, server, floating IPs and volume (see
+openstack_plugin_common.tests.lifecycle). Operations asking to be retried, or
+failing with a recoverable error (e.g. on an injected fault), are retried as
+the workflow engine would. Reports the throughput, the latency percentiles of
+the operations and of whole lifecycles, and the API calls per instance.
+
+Usage: python -m benchmarks.load_test [--instances N] [--concurrency C] ...
+"""
+
+import argparse
+import collections
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import traceback
+
+from cloudify.exceptions import NonRecoverableError
+
+from openstack_plugin_common import Config
+from openstack_plugin_common.tests.fake_cloud import (FakeCloud,
+                                                      FakeCloudServer,
+                                                      lognormal_latency)
+from openstack_plugin_common.tests.lifecycle import (Lifecycle,
+                                                     operation_name)
+
+
+class _TimedLifecycle(Lifecycle):
+
+    def __init__(self, results, args, *lifecycle_args):
+        super(_TimedLifecycle, self).__init__(*lifecycle_args)
+        self.results = results
+        self.args = args
+
+    def run(self, operation, node, target=None, connected=(), **kwargs):
+        name = operation_name(operation)
+        for retry in range(self.args.max_retries + 1):
+            start = time.time()
+            try:
+                return super(_TimedLifecycle, self).run(
+                    operation, node, target, connected, **kwargs)
+            except NonRecoverableError:
+                raise
+            except Exception as e:
+                if retry == self.args.max_retries:
+                    raise
+                self.results.record_retry(name)
+                time.sleep(min(getattr(e, 'retry_after', None) or 0,
+                               self.args.retry_interval))
+            finally:
+                self.results.record_operation(name, time.time() - start)
+
+
+class _Results(object):
+
+    def __init__(self):
+        self.operations = collections.defaultdict(list)
+        self.retries = collections.Counter()
+        self.lifecycles = []
+        self.failures = []
+        self._lock = threading.Lock()
+
+    def record_operation(self, name, duration):
+        with self._lock:
+            self.operations[name].append(duration)
+
+    def record_retry(self, name):
+        with self._lock:
+            self.retries[name] += 1
+
+    def record_lifecycle(self, duration):
+        with self._lock:
+            self.lifecycles.append(duration)
+
+    def record_failure(self, deployment_id):
+        with self._lock:
+            self.failures.append((deployment_id, traceback.format_exc()))
+
+
+def percentile(values, p):
+    values = sorted(values)
+    if not values:
+        return 0
+    return values[min(len(values) - 1, int(len(values) * p / 100.0))]
+
+
+def _percentiles(values, scale=1):
+    return ' '.join('{0:9.1f}'.format(percentile(values, p) * scale)
+                    for p in (50, 95, 99))
+
+
+def _worker(instances, results, args, openstack_config, provider_context,
+            tmpdir):
+    while True:
+        with instances['lock']:
+            if not instances['remaining']:
+                return
+            instances['remaining'] -= 1
+            deployment_id = 'deployment-{0}'.format(instances['remaining'])
+
+        lifecycle = _TimedLifecycle(results, args, openstack_config,
+                                    provider_context, deployment_id, tmpdir)
+        start = time.time()
+        try:
+            lifecycle.install()
+            lifecycle.uninstall()
+            results.record_lifecycle(time.time() - start)
+        except Exception:
+            results.record_failure(deployment_id)
+
+
+def _openstack_config(cloud, args):
+    config = cloud.openstack_config()
+    if args.read_rate or args.write_rate:
+        config['rate_limit'] = {'read': args.read_rate,
+                                'write': args.write_rate}
+    if args.adaptive_concurrency:
+        config['concurrency_limit'] = {'enabled': True}
+    return config
+
+
+def _report(results, cloud, args, elapsed):
+    instances = len(results.lifecycles)
+    operations = sum(len(d) for d in results.operations.values())
+    print('{0} instances ({1} failed), {2} concurrent: {3:.2f}s, '
+          '{4:.1f} instances/s, {5:.1f} operations/s'.format(
+              instances, len(results.failures), args.concurrency, elapsed,
+              instances / elapsed, operations / elapsed))
+    print('API calls per instance: {0:.1f}'.format(
+        len(cloud.calls) / float(max(args.instances, 1))))
+    print('{0:<50} {1:>9} {2:>9} {3:>9} {4:>7}'.format(
+        'latency (ms)', 'p50', 'p95', 'p99', 'retries'))
+    print('{0:<50} {1}'.format('lifecycle',
+                               _percentiles(results.lifecycles, 1000)))
+    print('{0:<50} {1}'.format('operation', _percentiles(
+        sum(results.operations.values(), []), 1000)))
+    for name, durations in sorted(results.operations.iteritems()):
+        print('{0:<50} {1} {2:7}'.format(
+            name, _percentiles(durations, 1000), results.retries[name]))
+    for deployment_id, failure in results.failures[:1]:
+        print('\n{0} failed:\n{1}'.format(deployment_id, failure))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--instances', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--latency-ms', type=float, default=20,
+                        help='median API request latency')
+    parser.add_argument('--latency-sigma', type=float, default=0.5)
+    parser.add_argument('--transition-time', type=float, default=0,
+                        help='seconds servers and volumes spend in their '
+                             'transitional states (note that the operations '
+                             'poll these every few seconds)')
+    parser.add_argument('--fault-rate', type=float, default=0,
+                        help='fraction of the API requests failing with 503')
+    parser.add_argument('--read-rate', type=float, default=0,
+                        help='client-side limit of read requests per second '
+                             'per endpoint')
+    parser.add_argument('--write-rate', type=float, default=0,
+                        help='client-side limit of write requests per '
+                             'second per endpoint')
+    parser.add_argument('--adaptive-concurrency', action='store_true',
+                        help='limit the in-flight requests per endpoint '
+                             'adaptively')
+    parser.add_argument('--max-retries', type=int, default=10)
+    parser.add_argument('--retry-interval', type=float, default=1,
+                        help='maximal seconds to wait before retrying an '
+                             'operation')
+    parser.add_argument('--http', action='store_true',
+                        help='serve the cloud over HTTP on localhost rather '
+                             'than in-process')
+    args = parser.parse_args()
+
+    latency = lognormal_latency(args.latency_ms / 1000.0,
+                                args.latency_sigma) \
+        if args.latency_ms else None
+    cloud = FakeCloud(transition_time=args.transition_time, latency=latency)
+    if args.fault_rate:
+        cloud.inject_fault(503, rate=args.fault_rate)
+    ext_network = cloud.add('network', name='ext-net',
+                            **{'router:external': True})
+    provider_context = {'resources': {'ext_network': {
+        'id': ext_network['id'], 'name': ext_network['name']}}}
+
+    # operations should only be configured by their openstack_config
+    tmpdir = tempfile.mkdtemp()
+    for name in [k for k in os.environ if k.startswith('OS_')]:
+        del os.environ[name]
+    os.environ[Config.OPENSTACK_CONFIG_PATH_ENV_VAR] = os.path.join(
+        tmpdir, 'openstack_config.json')
+    logging.getLogger('mock-context-logger').disabled = True
+
+    results = _Results()
+    instances = {'remaining': args.instances, 'lock': threading.Lock()}
+    server = FakeCloudServer(cloud).start() if args.http else None
+    workers = [threading.Thread(target=_worker, args=(
+        instances, results, args, _openstack_config(cloud, args),
+        provider_context, tmpdir)) for _ in range(args.concurrency)]
+    patch = cloud.patch_requests()
+    patch.__enter__()
+    try:
+        start = time.time()
+        for worker in workers:
+            worker.daemon = True
+            worker.start()
+        for worker in workers:
+            while worker.is_alive():
+                worker.join(1)
+        elapsed = time.time() - start
+    finally:
+        patch.__exit__(None, None, None)
+        if server:
+            server.stop()
+        shutil.rmtree(tmpdir)
+
+    _report(results, cloud, args, elapsed)
+    return 1 if results.failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
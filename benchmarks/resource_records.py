@@ -0,0 +1,110 @@
+#########
+# Copyright (c) 2014 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+
+"""
+Benchmark for the memory and time used by holding the listing of all of the
+ports of a tenant, through cosmo_list and cosmo_list_records of a Neutron
+client.
+
+cosmo_list keeps the full port dicts, while cosmo_list_records has Neutron
+return only the ids and names of the ports and keeps them in slotted
+records. Each listing is made by a fresh process, which reports the growth
+of its resident set size while holding the listing (read from /proc, so
+Linux only), against a local stand-in cloud.
+
+Usage: python -m benchmarks.resource_records [--ports N] ...
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import openstack_plugin_common as common
+from openstack_plugin_common.tests.fake_cloud import (FakeCloud,
+                                                      FakeCloudServer)
+
+
+def _rss():
+    """ The current resident set size of this process, in MB """
+    with open('/proc/self/statm') as f:
+        pages = int(f.read().split()[1])
+    return pages * os.sysconf('SC_PAGE_SIZE') / 1048576.0
+
+
+def _list_ports(config, list_function):
+    """ Lists the ports in this process, returning the number of ports,
+    the time taken and the growth of the RSS in MB """
+    neutron_client = common.NeutronClient().get(config=config)
+    # authenticates, so that only the listing is measured
+    neutron_client.httpclient.authenticate()
+    rss = _rss()
+    start = time.time()
+    ports = list(getattr(neutron_client, list_function)('port'))
+    elapsed = time.time() - start
+    return len(ports), elapsed, _rss() - rss
+
+
+def _run(config, list_function):
+    output = subprocess.check_output(
+        [sys.executable, '-m', 'benchmarks.resource_records', '--child',
+         json.dumps([config, list_function])], env=os.environ)
+    return json.loads(output.splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--ports', type=int, default=50000,
+                        help='number of ports of the tenant')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(_list_ports(*json.loads(args.child))))
+        return
+
+    tmp_dir = tempfile.mkdtemp()
+    # the clients should only be configured by the benchmark
+    for name in [k for k in os.environ if k.startswith('OS_')]:
+        del os.environ[name]
+    os.environ[common.Config.OPENSTACK_CONFIG_PATH_ENV_VAR] = os.path.join(
+        tmp_dir, 'openstack_config.json')
+    cloud = FakeCloud()
+    network = cloud.add('network', name='net')
+    for i in range(args.ports):
+        cloud.add('port', name='port-{0}'.format(i), network_id=network['id'],
+                  fixed_ips=[{'ip_address': '10.0.{0}.{1}'.format(
+                      i / 256 % 256, i % 256)}])
+    server = FakeCloudServer(cloud).start()
+    try:
+        for list_function in ('cosmo_list', 'cosmo_list_records'):
+            start_bytes = server.bytes_sent
+            ports, elapsed, growth = _run(cloud.openstack_config(),
+                                          list_function)
+            print('{0:>18}: {1} ports, {2:6.2f}s {3:7.1f} MB RSS growth, '
+                  '{4:7.1f} MB received'.format(
+                      list_function, ports, elapsed, growth,
+                      (server.bytes_sent - start_bytes) / 1048576.0))
+    finally:
+        server.stop()
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+#########
+# Copyright (c) 2014 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+
+"""
+Benchmark for looking up a single server of a tenant of many servers, by
+name and by id, as use_external_resource does.
+
+Compares novaclient's findall, which lists the details of all of the servers
+when searching by id, against the Nova sugar's cosmo_get, which gets a server
+by id directly, and finds a server by name through the brief listing (filtered
+by Nova) before getting the details of that match alone, against a local
+stand-in cloud. The times
+include the stand-in's own work, which is slowest for detailed listings.
+
+Usage: python -m benchmarks.server_lookup [--servers N] ...
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import openstack_plugin_common as common
+from openstack_plugin_common.tests.fake_cloud import (FakeCloud,
+                                                      FakeCloudServer,
+                                                      FLAVORS,
+                                                      IMAGES)
+
+
+def _run(name, server, nova_client, lookup, lookups):
+    server.cloud.pop_calls()
+    bytes_sent = server.bytes_sent
+    start = time.time()
+    for _ in range(lookups):
+        lookup(nova_client)
+    elapsed = time.time() - start
+    print('{0:>18}: {1:8.2f}ms {2:3} calls {3:9.1f} KB received per '
+          'lookup'.format(name, elapsed * 1000 / lookups,
+                          len(server.cloud.pop_calls()) / lookups,
+                          (server.bytes_sent - bytes_sent) / 1024.0 /
+                          lookups))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--servers', type=int, default=2000)
+    parser.add_argument('--lookups', type=int, default=3)
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp()
+    # the clients should only be configured by the benchmark
+    for name in [k for k in os.environ if k.startswith('OS_')]:
+        del os.environ[name]
+    os.environ[common.Config.OPENSTACK_CONFIG_PATH_ENV_VAR] = os.path.join(
+        tmp_dir, 'openstack_config.json')
+    cloud = FakeCloud()
+    cloud.add('network', name='net')
+    with cloud.patch_requests():
+        nova_client = common.NovaClient().get(
+            config=cloud.openstack_config())
+        for i in range(args.servers):
+            target = nova_client.servers.create(
+                'server-{0}'.format(i), IMAGES[0]['id'], FLAVORS[0]['id'],
+                meta={'deployment': 'benchmark', 'index': str(i)})
+    server = FakeCloudServer(cloud).start()
+    try:
+        nova_client = common.NovaClient().get(
+            config=cloud.openstack_config())
+        nova_client.client.authenticate()
+        target_name = 'server-{0}'.format(args.servers - 1)
+        print('{0} servers'.format(args.servers))
+        _run('findall by name', server, nova_client,
+             lambda c: c.servers.findall(name=target_name), args.lookups)
+        _run('cosmo_get by name', server, nova_client,
+             lambda c: c.cosmo_get('server', name=target_name), args.lookups)
+        _run('findall by id', server, nova_client,
+             lambda c: c.servers.findall(id=target.id), args.lookups)
+        _run('cosmo_get by id', server, nova_client,
+             lambda c: c.cosmo_get('server', id=target.id), args.lookups)
+    finally:
+        server.stop()
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+#########
+# Copyright (c) 2014 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+
+"""
+Benchmark for removing the default egress rules of a new security group on
+a tenant with a large number of security group rules.
+
+Compares listing all of the tenant's rules and deleting the matching rules one
+by one against the filtered listing and parallel deletion used by
+neutron_plugin.security_group. Requests are served by an in-memory Neutron
+stand-in which simulates network round-trip time and bandwidth.
+
+Usage: python -m benchmarks.sg_rules_cleanup [--tenant-rules N] ...
+"""
+
+import argparse
+import json
+import threading
+import time
+
+from neutron_plugin import security_group
+
+
+class FakeNeutron(object):
+
+    def __init__(self, tenant_rules, egress_rules, rtt, bandwidth):
+        self.rtt = rtt
+        self.bandwidth = bandwidth
+        self.requests = 0
+        self.bytes = 0
+        self._lock = threading.Lock()
+        self.rules = [self._rule('other-sg-{0}'.format(i % 1000), 'ingress',
+                                 i) for i in range(tenant_rules)]
+        self.rules += [self._rule('sg-id', 'egress', tenant_rules + i)
+                       for i in range(egress_rules)]
+
+    @staticmethod
+    def _rule(sg_id, direction, i):
+        return {
+            'id': 'rule-{0}'.format(i),
+            'security_group_id': sg_id,
+            'tenant_id': 'tenant-id',
+            'direction': direction,
+            'ethertype': 'IPv4',
+            'protocol': 'tcp',
+            'port_range_min': 1 + i % 65535,
+            'port_range_max': 1 + i % 65535,
+            'remote_ip_prefix': '10.0.0.0/8',
+            'remote_group_id': None,
+        }
+
+    def _respond(self, body):
+        payload = json.dumps(body)
+        with self._lock:
+            self.requests += 1
+            self.bytes += len(payload)
+        time.sleep(self.rtt + len(payload) / self.bandwidth)
+        return json.loads(payload)
+
+    def list_security_group_rules(self, **filters):
+        rules = [r for r in self.rules if
+                 all(r.get(k) == v for k, v in filters.items())]
+        return self._respond({'security_group_rules': rules})
+
+    def delete_security_group_rule(self, rule_id):
+        return self._respond(None)
+
+
+def legacy_cleanup(neutron_client, sg_id):
+    rules = neutron_client.list_security_group_rules()['security_group_rules']
+    rules = [rule for rule in rules if rule['security_group_id'] == sg_id]
+    for rule in rules:
+        if rule.get('direction') == 'egress':
+            neutron_client.delete_security_group_rule(rule['id'])
+
+
+def filtered_cleanup(neutron_client, sg_id):
+    security_group._delete_rules(
+        neutron_client,
+        security_group._rules_for_sg_id(neutron_client, sg_id,
+                                        direction='egress'))
+
+
+def _run(name, cleanup, args):
+    neutron_client = FakeNeutron(args.tenant_rules, args.egress_rules,
+                                 args.rtt_ms / 1000.0,
+                                 args.bandwidth_mbps * 1024 * 1024 / 8.0)
+    start = time.time()
+    cleanup(neutron_client, 'sg-id')
+    elapsed = time.time() - start
+    print('{0:>10}: {1:8.3f}s {2:6} requests {3:12} bytes'.format(
+        name, elapsed, neutron_client.requests, neutron_client.bytes))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--tenant-rules', type=int, default=20000)
+    parser.add_argument('--egress-rules', type=int, default=2)
+    parser.add_argument('--rtt-ms', type=float, default=20)
+    parser.add_argument('--bandwidth-mbps', type=float, default=100)
+    args = parser.parse_args()
+
+    print('{0} tenant rules, {1} egress rules to delete'.format(
+        args.tenant_rules, args.egress_rules))
+    _run('legacy', legacy_cleanup, args)
+    _run('filtered', filtered_cleanup, args)
+
+
+if __name__ == '__main__':
+    main()
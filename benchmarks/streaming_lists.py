@@ -0,0 +1,103 @@
+#########
+# Copyright (c) 2014 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+
+"""
+Benchmark for the peak memory used by listing all of the ports of tenants of
+growing size, through cosmo_list of a Neutron client.
+
+Compares neutronclient's list_ports, which reads and parses the whole
+response, against the streamed listing of openstack_plugin_common.streaming,
+against a local stand-in cloud which doesn't paginate. Each listing is made
+by a fresh process, which reports the growth of its peak resident set size.
+
+Usage: python -m benchmarks.streaming_lists [--ports N,N,...] ...
+"""
+
+import argparse
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import openstack_plugin_common as common
+from openstack_plugin_common.tests.fake_cloud import (FakeCloud,
+                                                      FakeCloudServer)
+
+
+def _list_ports(config):
+    """ Lists the ports in this process, returning the number of ports,
+    the time taken and the growth of the peak RSS in MB """
+    neutron_client = common.NeutronClient().get(config=config)
+    # authenticates, so that only the listing is measured
+    neutron_client.httpclient.authenticate()
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.time()
+    ports = 0
+    for _ in neutron_client.cosmo_list('port'):
+        ports += 1
+    elapsed = time.time() - start
+    growth = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - peak_rss
+    return ports, elapsed, growth / 1024.0
+
+
+def _run(config, streamed):
+    config = dict(config, streaming_lists={'enabled': streamed})
+    output = subprocess.check_output(
+        [sys.executable, '-m', 'benchmarks.streaming_lists', '--child',
+         json.dumps(config)], env=os.environ)
+    return json.loads(output.splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--ports', default='10000,50000,100000',
+                        help='comma separated tenant sizes')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(_list_ports(json.loads(args.child))))
+        return
+
+    tmp_dir = tempfile.mkdtemp()
+    # the clients should only be configured by the benchmark
+    for name in [k for k in os.environ if k.startswith('OS_')]:
+        del os.environ[name]
+    os.environ[common.Config.OPENSTACK_CONFIG_PATH_ENV_VAR] = os.path.join(
+        tmp_dir, 'openstack_config.json')
+    cloud = FakeCloud()
+    network = cloud.add('network', name='net')
+    server = FakeCloudServer(cloud).start()
+    try:
+        for size in [int(n) for n in args.ports.split(',')]:
+            for i in range(size - len(cloud.resources('port'))):
+                cloud.add('port', name='port-{0}'.format(i),
+                          network_id=network['id'])
+            for name, streamed in (('loaded', False), ('streamed', True)):
+                ports, elapsed, growth = _run(cloud.openstack_config(),
+                                              streamed)
+                print('{0:>7} ports, {1:>8}: {2:7.2f}s {3:8.1f} MB peak RSS '
+                      'growth'.format(ports, name, elapsed, growth))
+    finally:
+        server.stop()
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == '__main__':
+    main()
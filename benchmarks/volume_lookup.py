@@ -0,0 +1,102 @@
+#########
+# Copyright (c) 2014 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+
+"""
+Benchmark for the volume lookups and counts of a tenant of many volumes, as
+use_external_resource and the quota validation of creation_validation make
+them.
+
+Compares cinderclient's findall, which lists the details of all of the
+volumes (of all tenants, for an admin), against the Cinder sugar, which has
+Cinder filter the listing by name, within the tenant, and gets the details
+of the single match alone, against a local stand-in cloud, where most of
+the volumes belong to other tenants and the lookups are made by an admin.
+
+Usage: python -m benchmarks.volume_lookup [--volumes N] ...
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import openstack_plugin_common as common
+from openstack_plugin_common import connection_pool
+from openstack_plugin_common.tests.fake_cloud import (FakeCloud,
+                                                      FakeCloudServer)
+
+
+def _run(name, server, cinder_client, lookup, lookups):
+    server.cloud.pop_calls()
+    bytes_sent = server.bytes_sent
+    start = time.time()
+    for _ in range(lookups):
+        lookup(cinder_client)
+    elapsed = time.time() - start
+    print('{0:>26}: {1:8.2f}ms {2:3} calls {3:9.1f} KB received per '
+          'lookup'.format(name, elapsed * 1000 / lookups,
+                          len(server.cloud.pop_calls()) / lookups,
+                          (server.bytes_sent - bytes_sent) / 1024.0 /
+                          lookups))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--volumes', type=int, default=20000)
+    parser.add_argument('--tenant-volumes', type=int, default=2000,
+                        help="how many of the volumes are the tenant's")
+    parser.add_argument('--lookups', type=int, default=5)
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp()
+    # the clients should only be configured by the benchmark
+    for name in [k for k in os.environ if k.startswith('OS_')]:
+        del os.environ[name]
+    os.environ[common.Config.OPENSTACK_CONFIG_PATH_ENV_VAR] = os.path.join(
+        tmp_dir, 'openstack_config.json')
+    cloud = FakeCloud()
+    for i in range(args.volumes):
+        tenant_id = {} if i < args.tenant_volumes else {
+            'tenant_id': 'tenant-{0}'.format(i % 10)}
+        cloud.add_volume(size=1, display_name='volume-{0}'.format(i),
+                         display_description='benchmark volume {0}'.format(i),
+                         **tenant_id)
+    server = FakeCloudServer(cloud).start()
+    try:
+        cinder_client = common.CinderClient().get(
+            config=cloud.openstack_config())
+        cinder_client.client.authenticate()
+        name = 'volume-{0}'.format(args.tenant_volumes - 1)
+        print("{0} volumes, {1} of them the tenant's".format(
+            args.volumes, args.tenant_volumes))
+        _run('findall by name', server, cinder_client,
+             lambda c: c.volumes.findall(display_name=name), args.lookups)
+        _run('cosmo_get by name', server, cinder_client,
+             lambda c: c.cosmo_get('volume', display_name=name),
+             args.lookups)
+        _run('findall count', server, cinder_client,
+             lambda c: len(c.volumes.findall()), args.lookups)
+        _run('cosmo_list_records count', server, cinder_client,
+             lambda c: sum(1 for _ in c.cosmo_list_records('volume')),
+             args.lookups)
+    finally:
+        connection_pool.reset()
+        server.stop()
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -56,7 +56,7 @@ class TestCinderVolume(unittest.TestCase):
         cinder_client_m.volumes = mock.Mock()
         cinder_client_m.volumes.create = mock.Mock(
             return_value=creating_volume_m)
-        cinder_client_m.volumes.get = mock.Mock(
+        cinder_client_m.cosmo_get_by_id = mock.Mock(
             return_value=available_volume_m)
         ctx_m = cfy_mocks.MockCloudifyContext(node_id='a',
                                               properties=volume_properties)
@@ -67,7 +67,8 @@ class TestCinderVolume(unittest.TestCase):
             size=volume_size,
             display_name=volume_name,
             description=volume_description)
-        cinder_client_m.volumes.get.assert_called_once_with(volume_id)
+        cinder_client_m.cosmo_get_by_id.assert_called_once_with(
+            volume.VOLUME_OPENSTACK_TYPE, volume_id)
         self.assertEqual(
             volume_id,
             ctx_m.instance.runtime_properties[OPENSTACK_ID_PROPERTY])
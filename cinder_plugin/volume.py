@@ -29,6 +29,7 @@ from openstack_plugin_common import (delete_resource_and_runtime_properties,
                                      OPENSTACK_ID_PROPERTY,
                                      OPENSTACK_TYPE_PROPERTY,
                                      OPENSTACK_NAME_PROPERTY)
+from openstack_plugin_common.retry import poll_delays
 
 VOLUME_STATUS_CREATING = 'creating'
 VOLUME_STATUS_DELETING = 'deleting'
@@ -84,8 +85,13 @@ def delete(cinder_client, **kwargs):
 @with_cinder_client
 def wait_until_status(cinder_client, volume_id, status, num_tries=10,
                       timeout=2):
-    for _ in range(num_tries):
-        volume = cinder_client.volumes.get(volume_id)
+    # polls with jittered, growing delays of at least timeout seconds, for
+    # about num_tries * timeout seconds
+    deadline = time.time() + num_tries * timeout
+    delays = poll_delays(base=timeout, cap=timeout * 3)
+    while True:
+        volume = cinder_client.cosmo_get_by_id(VOLUME_OPENSTACK_TYPE,
+                                               volume_id)
 
         if volume.status in VOLUME_ERROR_STATUSES:
             raise cfy_exc.NonRecoverableError(
@@ -93,7 +99,10 @@ def wait_until_status(cinder_client, volume_id, status, num_tries=10,
 
         if volume.status == status:
             return volume, True
-        time.sleep(timeout)
+        delay = next(delays)
+        if time.time() + delay > deadline:
+            break
+        time.sleep(delay)
 
     ctx.logger.warning("Volume {0} current state: '{1}', "
                        "expected state: '{2}'".format(volume_id,
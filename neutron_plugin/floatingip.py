@@ -45,8 +45,8 @@ def create(neutron_client, **kwargs):
 
     # Sugar: floating_network_name -> (resolve) -> floating_network_id
     if 'floating_network_name' in floatingip:
-        floatingip['floating_network_id'] = neutron_client.cosmo_get_named(
-            'network', floatingip['floating_network_name'])['id']
+        floatingip['floating_network_id'] = neutron_client.cosmo_get_record(
+            'network', name=floatingip['floating_network_name']).id
         del floatingip['floating_network_name']
     elif 'floating_network_id' not in floatingip:
         provider_context = provider(ctx)
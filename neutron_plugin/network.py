@@ -51,6 +51,7 @@ def create(neutron_client, **kwargs):
     transform_resource_name(ctx, network)
 
     net = neutron_client.create_network({'network': network})['network']
+    neutron_client.cosmo_created(NETWORK_OPENSTACK_TYPE, net)
     ctx.instance.runtime_properties[OPENSTACK_ID_PROPERTY] = net['id']
     ctx.instance.runtime_properties[OPENSTACK_TYPE_PROPERTY] =\
         NETWORK_OPENSTACK_TYPE
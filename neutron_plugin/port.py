@@ -17,8 +17,6 @@ from cloudify import ctx
 from cloudify.decorators import operation
 from cloudify.exceptions import NonRecoverableError
 
-import neutronclient.common.exceptions as neutron_exceptions
-
 from openstack_plugin_common import (
     transform_resource_name,
     with_neutron_client,
@@ -29,6 +27,8 @@ from openstack_plugin_common import (
     use_external_resource,
     is_external_relationship,
     validate_resource,
+    get_retry_after,
+    neutron_exceptions,
     OPENSTACK_ID_PROPERTY,
     OPENSTACK_TYPE_PROPERTY,
     OPENSTACK_NAME_PROPERTY,
@@ -129,7 +129,7 @@ def detach(neutron_client, **kwargs):
                     'detach from server {1}..'
                     .format(server_floating_ip['floating_ip_address'],
                             server_id),
-            retry_after=10)
+            retry_after=get_retry_after(ctx, 'status_wait', floor=10))
     change = {
         'port': {
             'device_id': '',
@@ -137,7 +137,13 @@ def detach(neutron_client, **kwargs):
         }
     }
     ctx.logger.info('Detaching port {0}...'.format(port_id))
-    neutron_client.update_port(port_id, change)
+    try:
+        neutron_client.update_port(port_id, change)
+    except neutron_exceptions.NeutronClientException, e:
+        if e.status_code != 404:
+            raise
+        ctx.logger.info('Port {0} was already deleted'.format(port_id))
+        return
     ctx.logger.info('Successfully detached port {0}'.format(port_id))
 
 
@@ -187,7 +193,14 @@ def _get_server_floating_ip(neutron_client, server_id):
             # this floating ip is not attached to any port
             continue
 
-        port = neutron_client.show_port(port_id)['port']
+        try:
+            port = neutron_client.show_port(port_id)['port']
+        except neutron_exceptions.NeutronClientException, e:
+            if e.status_code != 404:
+                raise
+            # the port was deleted since listing the floating ips (e.g. by
+            # another deployment), so it is not attached to the server
+            continue
         device_id = port.get('device_id')
         if not device_id:
             # this port is not attached to any server
@@ -13,21 +13,32 @@
 #  * See the License for the specific language governing permissions and
 #  * limitations under the License.
 
+from multiprocessing.pool import ThreadPool
+
 from cloudify import ctx
 from cloudify.decorators import operation
+from cloudify.exceptions import NonRecoverableError
+from cloudify.manager import get_rest_client
 from openstack_plugin_common import (
     transform_resource_name,
     with_neutron_client,
     delete_resource_and_runtime_properties,
+    delete_runtime_properties,
+    neutron_exceptions,
+    OPENSTACK_ID_PROPERTY,
+    OPENSTACK_NAME_PROPERTY
 )
 from openstack_plugin_common.security_group import (
     build_sg_data,
+    diff_rules,
     process_rules,
+    rules_content_hash,
     use_external_sg,
     set_sg_runtime_properties,
     delete_sg,
     sg_creation_validation,
-    RUNTIME_PROPERTIES_KEYS
+    RUNTIME_PROPERTIES_KEYS,
+    SECURITY_GROUP_OPENSTACK_TYPE
 )
 
 DEFAULT_RULE_VALUES = {
@@ -40,6 +51,28 @@ DEFAULT_RULE_VALUES = {
     'remote_ip_prefix': '0.0.0.0/0',
 }
 
+# the egress rules Neutron adds to every new security group
+DEFAULT_EGRESS_RULES = [
+    dict(DEFAULT_RULE_VALUES, direction='egress', ethertype=ethertype,
+         port_range_min=None, port_range_max=None, protocol=None,
+         remote_ip_prefix=None)
+    for ethertype in ('IPv4', 'IPv6')]
+
+# maximal number of security group rules deleted in parallel
+DELETE_RULES_CONCURRENCY = 10
+
+SHARE_IDENTICAL_GROUP_PROPERTY = 'share_identical_group'
+SHARED_SG_NAME_PREFIX = 'cloudify_shared_sg_'
+# shared groups are renamed to their final name once all rules are in place
+PENDING_SHARED_SG_NAME_SUFFIX = '_pending'
+# and are renamed by their last user before being deleted, so that they are
+# not reused meanwhile
+DELETING_SHARED_SG_NAME_SUFFIX = '_deleting'
+NODE_INSTANCE_DELETED_STATES = ('deleting', 'deleted')
+
+# Runtime properties
+CONTENT_HASH_PROPERTY = 'content_hash'  # set only for shared groups
+
 
 @operation
 @with_neutron_client
@@ -57,7 +90,25 @@ def create(neutron_client, **kwargs):
     if use_external_sg(neutron_client):
         return
 
-    transform_resource_name(ctx, security_group)
+    shared_sg_name = None
+    if ctx.node.properties.get(SHARE_IDENTICAL_GROUP_PROPERTY):
+        # only nodes of the same name share a group, so that the users of a
+        # group can be listed by the node's name
+        content_hash = rules_content_hash(
+            security_group, sg_rules,
+            disable_default_egress_rules=bool(disable_default_egress_rules),
+            node_name=ctx.node.name)
+        security_group['name'] = SHARED_SG_NAME_PREFIX + content_hash
+        transform_resource_name(ctx, security_group)
+
+        if _use_shared_sg(neutron_client, security_group['name'],
+                          content_hash):
+            return
+
+        shared_sg_name = security_group['name']
+        security_group['name'] += PENDING_SHARED_SG_NAME_SUFFIX
+    else:
+        transform_resource_name(ctx, security_group)
 
     sg = neutron_client.create_security_group(
         {'security_group': security_group})['security_group']
@@ -66,24 +117,98 @@ def create(neutron_client, **kwargs):
 
     try:
         if disable_default_egress_rules:
-            for er in _egress_rules(_rules_for_sg_id(neutron_client,
-                                                     sg['id'])):
-                neutron_client.delete_security_group_rule(er['id'])
-
-        for sgr in sg_rules:
-            sgr['security_group_id'] = sg['id']
-            neutron_client.create_security_group_rule(
-                {'security_group_rule': sgr})
+            _delete_rules(neutron_client,
+                          _rules_for_sg_id(neutron_client, sg['id'],
+                                           direction='egress'))
+
+        _create_rules(neutron_client, sg['id'], sg_rules)
+
+        if shared_sg_name:
+            sg = neutron_client.update_security_group(
+                sg['id'], {'security_group': {'name': shared_sg_name}})[
+                'security_group']
     except Exception:
         delete_resource_and_runtime_properties(ctx, neutron_client,
                                                RUNTIME_PROPERTIES_KEYS)
         raise
 
+    if shared_sg_name:
+        shared_sg = _get_shared_sg(neutron_client, shared_sg_name)
+        if shared_sg and shared_sg['id'] != sg['id'] and _claim_shared_sg(
+                neutron_client, shared_sg, shared_sg_name, content_hash):
+            ctx.logger.info('An identical security group {0} was created '
+                            'concurrently - using it instead'.format(
+                                shared_sg['id']))
+            neutron_client.delete_security_group(sg['id'])
+        else:
+            _set_shared_sg_runtime_properties(sg, neutron_client,
+                                              content_hash)
+    else:
+        neutron_client.cosmo_created(SECURITY_GROUP_OPENSTACK_TYPE, sg)
+
 
 @operation
 @with_neutron_client
 def delete(neutron_client, **kwargs):
-    delete_sg(neutron_client)
+    content_hash = ctx.instance.runtime_properties.get(CONTENT_HASH_PROPERTY)
+    if not content_hash:
+        delete_sg(neutron_client)
+        return
+
+    sg_id = ctx.instance.runtime_properties[OPENSTACK_ID_PROPERTY]
+    name = ctx.instance.runtime_properties[OPENSTACK_NAME_PROPERTY]
+    try:
+        # renamed before listing its users - an instance about to reuse the
+        # group either has its use listed, or finds the group renamed when
+        # checking it and doesn't use it
+        _rename_sg(neutron_client, sg_id,
+                   name + DELETING_SHARED_SG_NAME_SUFFIX)
+        users = _get_other_shared_sg_users(content_hash)
+        if users:
+            ctx.logger.info('Not deleting shared security group since it is '
+                            'still used by {0} other node instances'.format(
+                                len(users)))
+            _rename_sg(neutron_client, sg_id, name)
+        else:
+            delete_sg(neutron_client)
+    except neutron_exceptions.NeutronClientException, e:
+        # the last users of the group were deleted concurrently
+        if e.status_code != 404:
+            raise
+    delete_runtime_properties(
+        ctx, RUNTIME_PROPERTIES_KEYS + [CONTENT_HASH_PROPERTY])
+
+
+@operation
+@with_neutron_client
+def reconcile_rules(neutron_client, **kwargs):
+    """ Updates the rules of an existing (possibly external) security group
+    to match the node's declared rules, creating and deleting only the rules
+    which differ """
+    if ctx.instance.runtime_properties.get(CONTENT_HASH_PROPERTY):
+        raise NonRecoverableError(
+            "Can't reconcile the rules of a shared security group, as it "
+            "might be used by other nodes")
+
+    sg_id = ctx.instance.runtime_properties[OPENSTACK_ID_PROPERTY]
+    sg_rules = process_rules(neutron_client, DEFAULT_RULE_VALUES,
+                             'remote_ip_prefix', 'remote_group_id',
+                             'port_range_min', 'port_range_max')
+    if not ctx.node.properties.get('disable_default_egress_rules'):
+        sg_rules += DEFAULT_EGRESS_RULES
+
+    rules_to_add, rules_to_remove = diff_rules(
+        sg_rules, _rules_for_sg_id(neutron_client, sg_id),
+        DEFAULT_RULE_VALUES.keys(), 'remote_ip_prefix', 'port_range_min',
+        'port_range_max')
+    ctx.logger.info('Reconciling security group {0} rules: adding {1}, '
+                    'removing {2}'.format(sg_id, len(rules_to_add),
+                                          len(rules_to_remove)))
+
+    # adding first, so that traffic allowed both before and after the update
+    # is never blocked
+    _create_rules(neutron_client, sg_id, rules_to_add)
+    _delete_rules(neutron_client, rules_to_remove)
 
 
 @operation
@@ -92,11 +217,101 @@ def creation_validation(neutron_client, **kwargs):
     sg_creation_validation(neutron_client, 'remote_ip_prefix')
 
 
-def _egress_rules(rules):
-    return [rule for rule in rules if rule.get('direction') == 'egress']
+def _get_shared_sg(neutron_client, name):
+    # identical groups created concurrently by several deployments all get the
+    # same name; in that case the one with the lowest id is used
+    sgs = list(neutron_client.cosmo_list(SECURITY_GROUP_OPENSTACK_TYPE,
+                                         name=name))
+    return min(sgs, key=lambda sg: sg['id']) if sgs else None
+
+
+def _use_shared_sg(neutron_client, name, content_hash):
+    """ Uses the shared group of the given name, if there is one """
+    shared_sg = _get_shared_sg(neutron_client, name)
+    while shared_sg:
+        if _claim_shared_sg(neutron_client, shared_sg, name, content_hash):
+            ctx.logger.info('Using shared security group {0}'.format(
+                shared_sg['id']))
+            return True
+        shared_sg = _get_shared_sg(neutron_client, name)
+    return False
+
+
+def _claim_shared_sg(neutron_client, sg, name, content_hash):
+    """ Saves the use of a shared group, and then checks that it is neither
+    deleted nor being deleted - as its last other user renames it before
+    listing its users, either the use is listed, or the group is found
+    renamed here, in which case the use is cleared """
+    _set_shared_sg_runtime_properties(sg, neutron_client, content_hash)
+    ctx.instance.update()
+    try:
+        if neutron_client.show_security_group(sg['id'])[
+                'security_group']['name'] == name:
+            return True
+    except neutron_exceptions.NeutronClientException, e:
+        if e.status_code != 404:
+            raise
+    ctx.logger.info('Shared security group {0} was deleted '
+                    'concurrently'.format(sg['id']))
+    delete_runtime_properties(
+        ctx, RUNTIME_PROPERTIES_KEYS + [CONTENT_HASH_PROPERTY])
+    ctx.instance.update()
+    return False
+
+
+def _set_shared_sg_runtime_properties(sg, neutron_client, content_hash):
+    set_sg_runtime_properties(sg, neutron_client)
+    ctx.instance.runtime_properties[CONTENT_HASH_PROPERTY] = content_hash
+
 
+def _rename_sg(neutron_client, sg_id, name):
+    neutron_client.update_security_group(
+        sg_id, {'security_group': {'name': name}})
 
-def _rules_for_sg_id(neutron_client, id):
-    rules = neutron_client.list_security_group_rules()['security_group_rules']
-    rules = [rule for rule in rules if rule['security_group_id'] == id]
-    return rules
+
+def _get_other_shared_sg_users(content_hash):
+    """ Returns the ids of the other users of the node instance's shared
+    group - the instances of the node's name (of any deployment) which have
+    the group's id and content hash in their runtime properties """
+    sg_id = ctx.instance.runtime_properties[OPENSTACK_ID_PROPERTY]
+    node_instances = get_rest_client().node_instances.list(
+        node_name=ctx.node.name,
+        _include=['id', 'state', 'runtime_properties'])
+    return [node_instance.id for node_instance in node_instances if
+            node_instance.id != ctx.instance.id and
+            node_instance.state not in NODE_INSTANCE_DELETED_STATES and
+            node_instance.runtime_properties.get(
+                CONTENT_HASH_PROPERTY) == content_hash and
+            node_instance.runtime_properties.get(
+                OPENSTACK_ID_PROPERTY) == sg_id]
+
+
+def _rules_for_sg_id(neutron_client, id, **filters):
+    # filtering is done by Neutron - listing all of the tenant's rules might
+    # be very expensive for large tenants
+    return neutron_client.list_security_group_rules(
+        security_group_id=id, **filters)['security_group_rules']
+
+
+def _create_rules(neutron_client, sg_id, rules):
+    # a single bulk request, which Neutron handles atomically
+    if rules:
+        neutron_client.create_security_group_rule({'security_group_rules': [
+            dict(sgr, security_group_id=sg_id) for sgr in rules]})
+
+
+def _delete_rules(neutron_client, rules):
+    # Neutron has no bulk deletion of security group rules, so the rules are
+    # deleted in parallel rather than one after the other
+    rule_ids = [rule['id'] for rule in rules]
+    if len(rule_ids) <= 1:
+        for rule_id in rule_ids:
+            neutron_client.delete_security_group_rule(rule_id)
+        return
+
+    pool = ThreadPool(min(len(rule_ids), DELETE_RULES_CONCURRENCY))
+    try:
+        pool.map(neutron_client.delete_security_group_rule, rule_ids)
+    finally:
+        pool.close()
+        pool.join()
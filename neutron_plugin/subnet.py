@@ -74,6 +74,7 @@ def create(neutron_client, **kwargs):
     transform_resource_name(ctx, subnet)
 
     s = neutron_client.create_subnet({'subnet': subnet})['subnet']
+    neutron_client.cosmo_created(SUBNET_OPENSTACK_TYPE, s)
     ctx.instance.runtime_properties[OPENSTACK_ID_PROPERTY] = s['id']
     ctx.instance.runtime_properties[OPENSTACK_TYPE_PROPERTY] = \
         SUBNET_OPENSTACK_TYPE
@@ -16,13 +16,49 @@
 import unittest
 
 import mock
+from neutronclient.common import exceptions as neutron_exceptions
 
 import neutron_plugin.port
 from cloudify.mocks import MockCloudifyContext
+from cloudify.mocks import MockContext
+from openstack_plugin_common import NeutronClient, OPENSTACK_ID_PROPERTY
 
 
 class TestPort(unittest.TestCase):
 
+    def test_server_floating_ip_of_deleted_port(self):
+        neutron_client = mock.Mock()
+        neutron_client.list_floatingips.return_value = {'floatingips': [
+            {'id': 'fip-1', 'port_id': 'deleted-port-id'},
+            {'id': 'fip-2', 'port_id': 'port-id'}]}
+
+        def show_port(port_id):
+            if port_id == 'deleted-port-id':
+                raise neutron_exceptions.NeutronClientException(
+                    status_code=404)
+            return {'port': {'id': port_id, 'device_id': 'server-id'}}
+        neutron_client.show_port.side_effect = show_port
+
+        self.assertEquals(
+            'fip-2', neutron_plugin.port._get_server_floating_ip(
+                neutron_client, 'server-id')['id'])
+
+    def test_detach_of_deleted_port(self):
+        neutron_client = mock.Mock()
+        neutron_client.list_floatingips.return_value = {'floatingips': []}
+        neutron_client.update_port.side_effect = \
+            neutron_exceptions.NeutronClientException(status_code=404)
+        ctx = MockCloudifyContext(
+            source=self._get_mock_subject_ctx('server-id'),
+            target=self._get_mock_subject_ctx('port-id'))
+
+        with mock.patch.object(NeutronClient, 'get',
+                               mock.Mock(return_value=neutron_client)):
+            neutron_plugin.port.detach(ctx=ctx)
+
+        neutron_client.update_port.assert_called_once_with(
+            'port-id', {'port': {'device_id': '', 'device_owner': ''}})
+
     def test_fixed_ips_no_fixed_ips(self):
         node_props = {'fixed_ip': ''}
 
@@ -99,3 +135,11 @@ class TestPort(unittest.TestCase):
     def _get_mock_ctx_with_node_properties(properties):
         return MockCloudifyContext(node_id='test_node_id',
                                    properties=properties)
+
+    @staticmethod
+    def _get_mock_subject_ctx(openstack_id):
+        return MockContext({
+            'node': MockContext({'properties': {}}),
+            'instance': MockContext({'runtime_properties': {
+                OPENSTACK_ID_PROPERTY: openstack_id}})
+        })
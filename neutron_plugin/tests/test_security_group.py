@@ -0,0 +1,369 @@
+########
+# Copyright (c) 2014 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#    * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    * See the License for the specific language governing permissions and
+#    * limitations under the License.
+
+import unittest
+
+import mock
+
+import neutron_plugin.security_group
+from cloudify.exceptions import NonRecoverableError
+from cloudify.mocks import MockCloudifyContext
+from cloudify_rest_client.node_instances import NodeInstance
+from neutronclient.common import exceptions as neutron_exceptions
+from openstack_plugin_common import (OPENSTACK_ID_PROPERTY,
+                                     OPENSTACK_TYPE_PROPERTY,
+                                     OPENSTACK_NAME_PROPERTY)
+
+
+class TestSecurityGroup(unittest.TestCase):
+
+    def test_disable_default_egress_rules(self):
+        egress_rules = [{'id': 'rule-{0}'.format(i)} for i in range(25)]
+
+        neutron_client = self._get_mock_neutron_client(egress_rules)
+        ctx = self._get_mock_ctx(disable_default_egress_rules=True)
+
+        neutron_plugin.security_group.create(neutron_client=neutron_client,
+                                             ctx=ctx)
+
+        neutron_client.list_security_group_rules.assert_called_once_with(
+            security_group_id='sg-id', direction='egress')
+        deleted_rule_ids = [c[0][0] for c in
+                            neutron_client.delete_security_group_rule
+                            .call_args_list]
+        self.assertEquals(sorted(rule['id'] for rule in egress_rules),
+                          sorted(deleted_rule_ids))
+
+    def test_keep_default_egress_rules(self):
+        neutron_client = self._get_mock_neutron_client([{'id': 'rule-1'}])
+        ctx = self._get_mock_ctx(disable_default_egress_rules=False)
+
+        neutron_plugin.security_group.create(neutron_client=neutron_client,
+                                             ctx=ctx)
+
+        self.assertFalse(neutron_client.list_security_group_rules.called)
+        self.assertFalse(neutron_client.delete_security_group_rule.called)
+
+    def test_rules_created_in_bulk(self):
+        neutron_client = self._get_mock_neutron_client([])
+        ctx = self._get_mock_ctx(rules=[{'port': 22}, {'port': 80}])
+
+        neutron_plugin.security_group.create(neutron_client=neutron_client,
+                                             ctx=ctx)
+
+        neutron_client.create_security_group_rule.assert_called_once_with(
+            {'security_group_rules': [
+                self._get_rule(22, security_group_id='sg-id'),
+                self._get_rule(80, security_group_id='sg-id')]})
+
+    def test_reconcile_rules(self):
+        live_rules = [
+            self._get_rule(22, id='kept'),
+            self._get_rule(22, id='duplicate'),
+            self._get_rule(8080, id='removed')] + [
+            dict(rule, id='egress-{0}'.format(i))
+            for i, rule in enumerate(
+                neutron_plugin.security_group.DEFAULT_EGRESS_RULES)]
+        neutron_client = self._get_mock_neutron_client(live_rules)
+        ctx = self._get_mock_ctx(rules=[{'port': 22}, {'port': 443}])
+        ctx.instance.runtime_properties[OPENSTACK_ID_PROPERTY] = 'sg-id'
+
+        neutron_plugin.security_group.reconcile_rules(
+            neutron_client=neutron_client, ctx=ctx)
+
+        neutron_client.list_security_group_rules.assert_called_once_with(
+            security_group_id='sg-id')
+        neutron_client.create_security_group_rule.assert_called_once_with(
+            {'security_group_rules': [
+                self._get_rule(443, security_group_id='sg-id')]})
+        deleted_rule_ids = [c[0][0] for c in
+                            neutron_client.delete_security_group_rule
+                            .call_args_list]
+        self.assertEquals(['duplicate', 'removed'], sorted(deleted_rule_ids))
+
+    def test_reconcile_rules_without_default_egress_rules(self):
+        live_rules = [dict(rule, id='egress-{0}'.format(i)) for i, rule in
+                      enumerate(neutron_plugin.security_group
+                                .DEFAULT_EGRESS_RULES)]
+        neutron_client = self._get_mock_neutron_client(live_rules)
+        ctx = self._get_mock_ctx(disable_default_egress_rules=True)
+        ctx.instance.runtime_properties[OPENSTACK_ID_PROPERTY] = 'sg-id'
+
+        neutron_plugin.security_group.reconcile_rules(
+            neutron_client=neutron_client, ctx=ctx)
+
+        self.assertFalse(neutron_client.create_security_group_rule.called)
+        deleted_rule_ids = [c[0][0] for c in
+                            neutron_client.delete_security_group_rule
+                            .call_args_list]
+        self.assertEquals(['egress-0', 'egress-1'], sorted(deleted_rule_ids))
+
+    def test_reconcile_rules_of_shared_sg(self):
+        neutron_client = mock.Mock()
+        ctx = self._get_mock_shared_sg_ctx()
+
+        self.assertRaises(NonRecoverableError,
+                          neutron_plugin.security_group.reconcile_rules,
+                          neutron_client=neutron_client, ctx=ctx)
+        self.assertFalse(neutron_client.list_security_group_rules.called)
+
+    def test_shared_sg_reused(self):
+        neutron_client = self._get_mock_neutron_client([])
+        neutron_client.cosmo_list.return_value = [
+            {'id': 'shared-sg-id', 'name': 'shared-sg-name'}]
+        ctx = self._get_mock_ctx(share_identical_group=True)
+
+        neutron_plugin.security_group.create(neutron_client=neutron_client,
+                                             ctx=ctx)
+
+        self.assertFalse(neutron_client.create_security_group.called)
+        shared_sg_name = neutron_client.cosmo_list.call_args[1]['name']
+        self.assertTrue(shared_sg_name.startswith(
+            neutron_plugin.security_group.SHARED_SG_NAME_PREFIX))
+        self.assertEquals('shared-sg-id', ctx.instance.runtime_properties[
+            OPENSTACK_ID_PROPERTY])
+        self.assertEquals(
+            shared_sg_name[len(
+                neutron_plugin.security_group.SHARED_SG_NAME_PREFIX):],
+            ctx.instance.runtime_properties[
+                neutron_plugin.security_group.CONTENT_HASH_PROPERTY])
+
+    def test_shared_sg_created(self):
+        neutron_client = self._get_mock_neutron_client([])
+        neutron_client.cosmo_list.side_effect = [
+            [], [{'id': 'sg-id', 'name': 'sg-name'}]]
+        ctx = self._get_mock_ctx(share_identical_group=True)
+
+        neutron_plugin.security_group.create(neutron_client=neutron_client,
+                                             ctx=ctx)
+
+        shared_sg_name = neutron_client.cosmo_list.call_args[1]['name']
+        created_sg = neutron_client.create_security_group.call_args[0][0]
+        self.assertEquals(
+            shared_sg_name +
+            neutron_plugin.security_group.PENDING_SHARED_SG_NAME_SUFFIX,
+            created_sg['security_group']['name'])
+        neutron_client.update_security_group.assert_called_once_with(
+            'sg-id', {'security_group': {'name': shared_sg_name}})
+        self.assertFalse(neutron_client.delete_security_group.called)
+        self.assertIn(neutron_plugin.security_group.CONTENT_HASH_PROPERTY,
+                      ctx.instance.runtime_properties)
+
+    def test_shared_sg_deleted_concurrently_with_reuse(self):
+        neutron_client = self._get_mock_neutron_client([])
+        neutron_client.cosmo_list.side_effect = [
+            [{'id': 'deleted-sg-id', 'name': 'shared-sg-name'}], [],
+            [{'id': 'sg-id', 'name': 'sg-name'}]]
+        ctx = self._get_mock_ctx(share_identical_group=True)
+        events = []
+
+        def show_security_group(sg_id):
+            events.append(('show', ctx.instance.runtime_properties.get(
+                OPENSTACK_ID_PROPERTY)))
+            raise neutron_exceptions.NeutronClientException(status_code=404)
+        neutron_client.show_security_group.side_effect = show_security_group
+
+        with mock.patch.object(ctx.instance, 'update', side_effect=lambda: (
+                events.append(('update', ctx.instance.runtime_properties.get(
+                    OPENSTACK_ID_PROPERTY))))):
+            neutron_plugin.security_group.create(
+                neutron_client=neutron_client, ctx=ctx)
+
+        # the use of the group was saved before finding it deleted, and the
+        # created group's when the operation returned
+        self.assertEquals([('update', 'deleted-sg-id'),
+                           ('show', 'deleted-sg-id'),
+                           ('update', None),
+                           ('update', 'sg-id')], events)
+        self.assertTrue(neutron_client.create_security_group.called)
+        self.assertEquals('sg-id', ctx.instance.runtime_properties[
+            OPENSTACK_ID_PROPERTY])
+
+    def test_shared_sg_being_deleted_not_reused(self):
+        neutron_client = self._get_mock_neutron_client([])
+        neutron_client.cosmo_list.side_effect = [
+            [{'id': 'deleting-sg-id', 'name': 'shared-sg-name'}], [],
+            [{'id': 'sg-id', 'name': 'sg-name'}]]
+        neutron_client.show_security_group.side_effect = lambda sg_id: {
+            'security_group': {'id': sg_id, 'name': 'shared-sg-name' +
+                               neutron_plugin.security_group
+                               .DELETING_SHARED_SG_NAME_SUFFIX}}
+        ctx = self._get_mock_ctx(share_identical_group=True)
+
+        neutron_plugin.security_group.create(neutron_client=neutron_client,
+                                             ctx=ctx)
+
+        self.assertTrue(neutron_client.create_security_group.called)
+        self.assertEquals('sg-id', ctx.instance.runtime_properties[
+            OPENSTACK_ID_PROPERTY])
+
+    def test_shared_sg_content_hash(self):
+        hashes = []
+        for rules in ([{'port': 80}, {'port': 22}],
+                      [{'port': 22}, {'port': 80}, {'port': 80}],
+                      [{'port': 22}]):
+            neutron_client = self._get_mock_neutron_client([])
+            neutron_client.cosmo_list.return_value = [
+                {'id': 'shared-sg-id', 'name': 'shared-sg-name'}]
+            ctx = self._get_mock_ctx(share_identical_group=True, rules=rules)
+            neutron_plugin.security_group.create(
+                neutron_client=neutron_client, ctx=ctx)
+            hashes.append(ctx.instance.runtime_properties[
+                neutron_plugin.security_group.CONTENT_HASH_PROPERTY])
+
+        neutron_client = self._get_mock_neutron_client([])
+        neutron_client.cosmo_list.return_value = [
+            {'id': 'shared-sg-id', 'name': 'shared-sg-name'}]
+        ctx = self._get_mock_ctx(share_identical_group=True,
+                                 rules=[{'port': 80}, {'port': 22}],
+                                 node_name='other_node')
+        neutron_plugin.security_group.create(
+            neutron_client=neutron_client, ctx=ctx)
+        hashes.append(ctx.instance.runtime_properties[
+            neutron_plugin.security_group.CONTENT_HASH_PROPERTY])
+
+        self.assertEquals(hashes[0], hashes[1])
+        self.assertNotEquals(hashes[0], hashes[2])
+        # the users of a group are listed by the node's name
+        self.assertNotEquals(hashes[0], hashes[3])
+
+    def test_shared_sg_delete_with_other_users(self):
+        neutron_client = mock.Mock()
+        ctx = self._get_mock_shared_sg_ctx()
+        node_instances = [
+            self._get_mock_node_instance('other-user', 'started'),
+            self._get_mock_node_instance('deleted-user', 'deleting')]
+
+        rest_client = self._get_mock_rest_client(node_instances)
+
+        with mock.patch('neutron_plugin.security_group.get_rest_client',
+                        rest_client):
+            neutron_plugin.security_group.delete(
+                neutron_client=neutron_client, ctx=ctx)
+
+        self.assertFalse(neutron_client.cosmo_delete_resource.called)
+        self.assertEquals([
+            mock.call('shared-sg-id', {'security_group': {
+                'name': 'shared-sg-name_deleting'}}),
+            mock.call('shared-sg-id', {'security_group': {
+                'name': 'shared-sg-name'}})],
+            neutron_client.update_security_group.call_args_list)
+        self.assertEquals(
+            'test_node',
+            rest_client().node_instances.list.call_args[1]['node_name'])
+        self.assertEquals({}, ctx.instance.runtime_properties)
+
+    def test_shared_sg_delete_by_last_user(self):
+        neutron_client = mock.Mock()
+        ctx = self._get_mock_shared_sg_ctx()
+        node_instances = [
+            self._get_mock_node_instance(ctx.instance.id, 'deleting'),
+            self._get_mock_node_instance('deleted-user', 'deleted')]
+
+        with mock.patch('neutron_plugin.security_group.get_rest_client',
+                        self._get_mock_rest_client(node_instances)):
+            neutron_plugin.security_group.delete(
+                neutron_client=neutron_client, ctx=ctx)
+
+        neutron_client.update_security_group.assert_called_once_with(
+            'shared-sg-id', {'security_group': {
+                'name': 'shared-sg-name_deleting'}})
+        neutron_client.cosmo_delete_resource.assert_called_once_with(
+            'security_group', 'shared-sg-id')
+        self.assertEquals({}, ctx.instance.runtime_properties)
+
+    def test_shared_sg_delete_of_deleted_sg(self):
+        neutron_client = mock.Mock()
+        neutron_client.update_security_group.side_effect = \
+            neutron_exceptions.NeutronClientException(status_code=404)
+        ctx = self._get_mock_shared_sg_ctx()
+
+        neutron_plugin.security_group.delete(neutron_client=neutron_client,
+                                             ctx=ctx)
+
+        self.assertFalse(neutron_client.cosmo_delete_resource.called)
+        self.assertEquals({}, ctx.instance.runtime_properties)
+
+    @staticmethod
+    def _get_rule(port, **kwargs):
+        return dict(neutron_plugin.security_group.DEFAULT_RULE_VALUES,
+                    port_range_min=port, port_range_max=port, **kwargs)
+
+    @staticmethod
+    def _get_mock_neutron_client(egress_rules):
+        neutron_client = mock.Mock()
+        neutron_client.create_security_group.return_value = {
+            'security_group': {'id': 'sg-id', 'name': 'sg-name'}
+        }
+        neutron_client.update_security_group.return_value = \
+            neutron_client.create_security_group.return_value
+        neutron_client.list_security_group_rules.return_value = {
+            'security_group_rules': egress_rules
+        }
+        # shared groups are found by their names
+        neutron_client.show_security_group.side_effect = lambda sg_id: {
+            'security_group': {
+                'id': sg_id,
+                'name': neutron_client.cosmo_list.call_args[1]['name']}}
+        neutron_client.get_id_from_resource = lambda r: r['id']
+        neutron_client.get_name_from_resource = lambda r: r['name']
+        return neutron_client
+
+    @staticmethod
+    def _get_mock_ctx(disable_default_egress_rules=False,
+                      share_identical_group=False, rules=(),
+                      node_name='test_node'):
+        return MockCloudifyContext(
+            node_id='test_node_id',
+            node_name=node_name,
+            properties={
+                'security_group': {'name': 'sg-name'},
+                'rules': list(rules),
+                'disable_default_egress_rules': disable_default_egress_rules,
+                'share_identical_group': share_identical_group,
+                'use_external_resource': False,
+                'resource_id': '',
+            })
+
+    @staticmethod
+    def _get_mock_shared_sg_ctx():
+        ctx = MockCloudifyContext(
+            node_id='test_node_id',
+            node_name='test_node',
+            properties={'use_external_resource': False},
+            runtime_properties={
+                OPENSTACK_ID_PROPERTY: 'shared-sg-id',
+                OPENSTACK_TYPE_PROPERTY: 'security_group',
+                OPENSTACK_NAME_PROPERTY: 'shared-sg-name',
+                neutron_plugin.security_group.CONTENT_HASH_PROPERTY: 'hash'
+            })
+        return ctx
+
+    @staticmethod
+    def _get_mock_node_instance(node_instance_id, state):
+        return NodeInstance({
+            'id': node_instance_id,
+            'state': state,
+            'runtime_properties': {
+                OPENSTACK_ID_PROPERTY: 'shared-sg-id',
+                neutron_plugin.security_group.CONTENT_HASH_PROPERTY: 'hash'
+            }
+        })
+
+    @staticmethod
+    def _get_mock_rest_client(node_instances):
+        rest_client = mock.Mock()
+        rest_client.node_instances.list.return_value = node_instances
+        return lambda: rest_client
@@ -90,6 +90,8 @@ def create(nova_client, **kwargs):
                                                RUNTIME_PROPERTIES_KEYS)
         raise
 
+    nova_client.cosmo_created(KEYPAIR_OPENSTACK_TYPE, keypair)
+
 
 @operation
 @with_nova_client
@@ -99,7 +101,8 @@ def delete(nova_client, **kwargs):
 
         _delete_private_key_file()
 
-        nova_client.keypairs.delete(
+        nova_client.cosmo_delete_resource(
+            KEYPAIR_OPENSTACK_TYPE,
             ctx.instance.runtime_properties[OPENSTACK_ID_PROPERTY])
     else:
         ctx.logger.info('not deleting keypair since an external keypair is '
@@ -20,8 +20,6 @@ import copy
 import inspect
 import itertools
 
-from novaclient import exceptions as nova_exceptions
-
 from cloudify import ctx
 from cloudify import context
 from cloudify.manager import get_rest_client
@@ -44,14 +42,17 @@ from openstack_plugin_common import (
     delete_runtime_properties,
     is_external_relationship,
     validate_resource,
+    get_retry_after,
     USE_EXTERNAL_RESOURCE_PROPERTY,
     OPENSTACK_ID_PROPERTY,
     OPENSTACK_TYPE_PROPERTY,
     OPENSTACK_NAME_PROPERTY,
     COMMON_RUNTIME_PROPERTIES_KEYS,
+    nova_exceptions,
     with_neutron_client)
 from nova_plugin.keypair import KEYPAIR_OPENSTACK_TYPE
 from openstack_plugin_common.floatingip import IP_ADDRESS_PROPERTY
+from openstack_plugin_common.retry import poll_delays
 from neutron_plugin.network import NETWORK_OPENSTACK_TYPE
 from neutron_plugin.port import PORT_OPENSTACK_TYPE
 
@@ -139,8 +140,8 @@ def create(nova_client, neutron_client, **kwargs):
             ctx.node.properties['management_network_name']
         management_network_name = rename(management_network_name)
         nc = _neutron_client()
-        management_network_id = nc.cosmo_get_named(
-            'network', management_network_name)['id']
+        management_network_id = nc.cosmo_get_record(
+            'network', name=management_network_name).id
     else:
         int_network = provider_context.int_network
         if int_network:
@@ -319,7 +320,8 @@ def start(nova_client, start_retry_interval, private_key_path, **kwargs):
             if not password:
                 return ctx.operation.retry(
                     message='Waiting for server to post generated password',
-                    retry_after=start_retry_interval)
+                    retry_after=get_retry_after(
+                        ctx, 'status_wait', floor=start_retry_interval))
 
             ctx.instance.runtime_properties[ADMIN_PASSWORD_PROPERTY] = password
             ctx.logger.info('Server has been set with a password')
@@ -343,7 +345,8 @@ def start(nova_client, start_retry_interval, private_key_path, **kwargs):
                     'state. Retrying...'.format(SERVER_STATUS_ACTIVE,
                                                 server.status,
                                                 server_task_state),
-            retry_after=start_retry_interval)
+            retry_after=get_retry_after(ctx, 'status_wait',
+                                        floor=start_retry_interval))
 
     raise NonRecoverableError(
         'Unexpected server state {0}:{1}'.format(server.status,
@@ -391,12 +394,13 @@ def _wait_for_server_to_be_deleted(nova_client,
                                    timeout=120,
                                    sleep_interval=5):
     timeout = time.time() + timeout
+    delays = poll_delays(base=sleep_interval, cap=sleep_interval * 3)
     while time.time() < timeout:
         try:
-            server = nova_client.servers.get(server)
+            server = nova_client.cosmo_get_by_id('server', server.id)
             ctx.logger.debug('Waiting for server "{}" to be deleted. current'
                              ' status: {}'.format(server.id, server.status))
-            time.sleep(sleep_interval)
+            time.sleep(next(delays))
         except nova_exceptions.NotFound:
             return
     # recoverable error
@@ -405,8 +409,8 @@ def _wait_for_server_to_be_deleted(nova_client,
 
 
 def get_server_by_context(nova_client):
-    return nova_client.servers.get(
-        ctx.instance.runtime_properties[OPENSTACK_ID_PROPERTY])
+    return nova_client.cosmo_get_by_id(
+        'server', ctx.instance.runtime_properties[OPENSTACK_ID_PROPERTY])
 
 
 def _set_network_and_ip_runtime_properties(server):
@@ -744,7 +748,7 @@ def creation_validation(nova_client, **kwargs):
             raise NonRecoverableError(err)
 
         prop_value_id = str(serv_props_copy[property_name])
-        prop_values = list(nova_client.cosmo_list(property_name))
+        prop_values = list(nova_client.cosmo_list_records(property_name))
         for f in prop_values:
             if prop_value_id == f.id:
                 ctx.logger.debug('OK: {0} exists'.format(property_name))
@@ -829,8 +833,8 @@ def _handle_image_or_flavor(server, nova_client, prop_name):
                 ' a "{0}" or "{0}_name" (deprecated) field under the "server" '
                 'property'.format(prop_name))
 
-        image_or_flavor = \
-            nova_client.cosmo_get_if_exists(prop_name, name=server[prop_name])
+        image_or_flavor = nova_client.cosmo_get_record_if_exists(
+            prop_name, name=server[prop_name])
         if image_or_flavor:
             server[prop_name] = image_or_flavor.id
     else:  # Deprecated sugar
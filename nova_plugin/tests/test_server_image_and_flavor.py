@@ -217,7 +217,7 @@ class TestServerImageAndFlavor(unittest.TestCase):
             return mock_find
 
         nova_client.cosmo_plural = lambda x: '{0}s'.format(x)
-        nova_client.cosmo_get_if_exists = mock_get_if_exists
+        nova_client.cosmo_get_record_if_exists = mock_get_if_exists
         nova_client.images.find = mock_find_generator('image')
         nova_client.flavors.find = mock_find_generator('flavor')
         return nova_client
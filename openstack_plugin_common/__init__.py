@@ -13,24 +13,82 @@
 #  * See the License for the specific language governing permissions and
 #  * limitations under the License.
 
+from contextlib import contextmanager
 from functools import wraps
+import importlib
+import inspect
 import json
 import os
+import re
 import sys
 
-from IPy import IP
-from cinderclient.v1 import client as cinder_client
-from cinderclient import exceptions as cinder_exceptions
-import keystoneclient.v2_0.client as keystone_client
-import neutronclient.v2_0.client as neutron_client
-import neutronclient.common.exceptions as neutron_exceptions
-import novaclient.v1_1.client as nova_client
-import novaclient.exceptions as nova_exceptions
-
 import cloudify
 from cloudify import context
 from cloudify.exceptions import NonRecoverableError, RecoverableError
 
+from openstack_plugin_common import coalescing
+from openstack_plugin_common import concurrency_limit
+from openstack_plugin_common import connection_pool
+from openstack_plugin_common import inventory
+from openstack_plugin_common import lazy_loading
+from openstack_plugin_common import metrics
+from openstack_plugin_common import profiling
+from openstack_plugin_common import rate_limit
+from openstack_plugin_common import response_decoding
+from openstack_plugin_common import retry
+from openstack_plugin_common import snapshot
+from openstack_plugin_common import streaming
+
+
+class _LazyModule(object):
+    """ Stands for a module which is only imported on first attribute access,
+    so that operations don't pay for importing the client libraries of
+    services they don't use """
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+
+class _LazyClientClass(object):
+    """ Stands for a sugared client class, which subclasses the client
+    library's Client class and so is only created on first use """
+
+    def __init__(self, name, client_module, sugar_class):
+        self._name = name
+        self._client_module = client_module
+        self._sugar_class = sugar_class
+        self._class = None
+
+    def _get_class(self):
+        if self._class is None:
+            self._class = type(self._name, (self._client_module.Client,
+                                            self._sugar_class), {})
+        return self._class
+
+    def __call__(self, *args, **kwargs):
+        return self._get_class()(*args, **kwargs)
+
+    def __instancecheck__(self, instance):
+        return isinstance(instance, self._get_class())
+
+    def __getattr__(self, attr):
+        return getattr(self._get_class(), attr)
+
+
+cinder_client = _LazyModule('cinderclient.v1.client')
+cinder_exceptions = _LazyModule('cinderclient.exceptions')
+keystone_client = _LazyModule('keystoneclient.v2_0.client')
+neutron_client = _LazyModule('neutronclient.v2_0.client')
+neutron_exceptions = _LazyModule('neutronclient.common.exceptions')
+nova_client = _LazyModule('novaclient.v1_1.client')
+nova_exceptions = _LazyModule('novaclient.exceptions')
+
 # properties
 USE_EXTERNAL_RESOURCE_PROPERTY = 'use_external_resource'
 
@@ -240,26 +298,27 @@ def validate_resource(ctx, sugared_client, openstack_type,
                 openstack_type, ctx.node.properties['resource_id']))
         except NonRecoverableError as e:
             ctx.logger.error('VALIDATION ERROR: ' + str(e))
-            resource_list = list(sugared_client.cosmo_list(openstack_type))
+            resource_list = list(
+                sugared_client.cosmo_list_records(openstack_type))
             if resource_list:
                 ctx.logger.info('list of existing {0}: '.format(
                     openstack_type_plural))
-                for resource in resource_list:
+                for record in resource_list:
                     ctx.logger.info('    {0:>10} - {1}'.format(
-                        sugared_client.get_id_from_resource(resource),
-                        sugared_client.get_name_from_resource(resource)))
+                        record.id, record.name))
             else:
                 ctx.logger.info('there are no existing {0}'.format(
                     openstack_type_plural))
             raise
     else:
-        if isinstance(sugared_client, NovaClientWithSugar):
+        if isinstance(sugared_client, NovaClientSugar):
             # not checking quota for Nova resources due to a bug in Nova client
             return
 
         # validate available quota for provisioning the resource
-        resource_list = list(sugared_client.cosmo_list(openstack_type))
-        resource_amount = len(resource_list)
+        # counted as they are listed, rather than held
+        resource_amount = sum(
+            1 for _ in sugared_client.cosmo_list_records(openstack_type))
 
         resource_quota = sugared_client.get_quota(openstack_type)
         if resource_amount < resource_quota:
@@ -314,6 +373,7 @@ def delete_runtime_properties(ctx, runtime_properties_keys):
 
 
 def validate_ip_or_range_syntax(ctx, address, is_range=True):
+    from IPy import IP
     range_suffix = ' range' if is_range else ''
     ctx.logger.debug('checking whether {0} is a valid address{1}...'
                      .format(address, range_suffix))
@@ -379,6 +439,11 @@ class OpenStackClient(object):
     REQUIRED_CONFIG_PARAMS = \
         ['username', 'password', 'tenant_name', 'auth_url']
 
+    SERVICE_NAME = None
+    # attribute of the client holding its HTTP client (None for the client
+    # itself)
+    HTTP_CLIENT_ATTRIBUTE = None
+
     def get(self, config=None, *args, **kw):
         cfg = Config().get()
         if config:
@@ -387,8 +452,39 @@ class OpenStackClient(object):
         self._validate_config(cfg)
         ret = self.connect(cfg, *args, **kw)
         ret.format = 'json'
+        connection_pool.share(
+            self.SERVICE_NAME, self._get_http_client(ret),
+            cfg.get(connection_pool.CONNECTION_POOL_CONFIG_KEY))
+        response_decoding.decode(
+            self.SERVICE_NAME, ret, self._get_http_client(ret),
+            cfg.get(response_decoding.RESPONSE_DECODING_CONFIG_KEY))
+        metrics.instrument(self._get_http_client(ret), self.SERVICE_NAME,
+                           cfg.get(metrics.METRICS_CONFIG_KEY))
+        # wrap the instrumented request, so waits aren't timed as latency
+        concurrency_limit.limit(
+            self._get_http_client(ret), self.SERVICE_NAME,
+            cfg.get(concurrency_limit.CONCURRENCY_LIMIT_CONFIG_KEY))
+        rate_limit.throttle(self._get_http_client(ret), self.SERVICE_NAME,
+                            cfg.get(rate_limit.RATE_LIMIT_CONFIG_KEY))
+        # outermost, so that coalesced requests don't wait for the limits
+        coalescing.coalesce(
+            self._get_http_client(ret), self.SERVICE_NAME,
+            cfg.get(coalescing.REQUEST_COALESCING_CONFIG_KEY))
+        streaming.stream(self.SERVICE_NAME, ret,
+                         cfg.get(streaming.STREAMING_LISTS_CONFIG_KEY))
+        lazy_loading.guard(self.SERVICE_NAME, ret,
+                           cfg.get(lazy_loading.LAZY_LOADING_CONFIG_KEY))
+        inventory.attach(self.SERVICE_NAME, ret, cfg,
+                         cfg.get(inventory.INVENTORY_CACHE_CONFIG_KEY))
+        snapshot.attach(self.SERVICE_NAME, ret, cfg,
+                        cfg.get(snapshot.RESOURCE_SNAPSHOT_CONFIG_KEY))
         return ret
 
+    def _get_http_client(self, client):
+        if self.HTTP_CLIENT_ATTRIBUTE is None:
+            return client
+        return getattr(client, self.HTTP_CLIENT_ATTRIBUTE)
+
     def _validate_config(self, cfg):
         missing_config_params = self._get_missing_config_params(cfg)
         if missing_config_params:
@@ -416,6 +512,8 @@ class OpenStackClient(object):
 # Clients procurers
 class KeystoneClient(OpenStackClient):
 
+    SERVICE_NAME = 'keystone'
+
     def connect(self, cfg):
         client_kwargs = {field: cfg[field] for field in
                          self.REQUIRED_CONFIG_PARAMS}
@@ -428,6 +526,9 @@ class KeystoneClient(OpenStackClient):
 
 class NovaClient(OpenStackClient):
 
+    SERVICE_NAME = 'nova'
+    HTTP_CLIENT_ATTRIBUTE = 'client'
+
     def connect(self, cfg):
         # note: 'region_name' is required regardless of whether 'bypass_url'
         # is used or not
@@ -451,6 +552,9 @@ class NovaClient(OpenStackClient):
 
 class CinderClient(OpenStackClient):
 
+    SERVICE_NAME = 'cinder'
+    HTTP_CLIENT_ATTRIBUTE = 'client'
+
     def connect(self, cfg):
         client_kwargs = dict(
             username=cfg['username'],
@@ -468,6 +572,9 @@ class CinderClient(OpenStackClient):
 
 class NeutronClient(OpenStackClient):
 
+    SERVICE_NAME = 'neutron'
+    HTTP_CLIENT_ATTRIBUTE = 'httpclient'
+
     def connect(self, cfg):
         client_kwargs = dict(
             username=cfg['username'],
@@ -506,14 +613,18 @@ def _find_context_in_kw(kw):
 def with_neutron_client(f):
     @wraps(f)
     def wrapper(*args, **kw):
-        _put_client_in_kw('neutron_client', NeutronClient, kw)
-
-        try:
-            return f(*args, **kw)
-        except neutron_exceptions.NeutronClientException, e:
-            if e.status_code in _non_recoverable_error_codes:
-                _re_raise(e, recoverable=False, status_code=e.status_code)
-            else:
+        with _operation_scope(kw):
+            _put_client_in_kw('neutron_client', NeutronClient, kw)
+
+            try:
+                return f(*args, **kw)
+            except neutron_exceptions.NeutronClientException, e:
+                if e.status_code in _non_recoverable_error_codes:
+                    _re_raise(e, recoverable=False, status_code=e.status_code)
+                _re_raise_if_transient(e, kw)
+                raise
+            except Exception, e:
+                _re_raise_if_transient(e, kw)
                 raise
     return wrapper
 
@@ -521,16 +632,19 @@ def with_neutron_client(f):
 def with_nova_client(f):
     @wraps(f)
     def wrapper(*args, **kw):
-        _put_client_in_kw('nova_client', NovaClient, kw)
-
-        try:
-            return f(*args, **kw)
-        except nova_exceptions.OverLimit, e:
-            _re_raise(e, recoverable=True, retry_after=e.retry_after)
-        except nova_exceptions.ClientException, e:
-            if e.code in _non_recoverable_error_codes:
-                _re_raise(e, recoverable=False, status_code=e.code)
-            else:
+        with _operation_scope(kw):
+            _put_client_in_kw('nova_client', NovaClient, kw)
+
+            try:
+                return f(*args, **kw)
+            except nova_exceptions.ClientException, e:
+                if e.code in _non_recoverable_error_codes:
+                    _re_raise(e, recoverable=False, status_code=e.code)
+                # e.g. OverLimit holds the response's Retry-After
+                _re_raise_if_transient(e, kw, getattr(e, 'retry_after', None))
+                raise
+            except Exception, e:
+                _re_raise_if_transient(e, kw)
                 raise
     return wrapper
 
@@ -538,14 +652,18 @@ def with_nova_client(f):
 def with_cinder_client(f):
     @wraps(f)
     def wrapper(*args, **kw):
-        _put_client_in_kw('cinder_client', CinderClient, kw)
-
-        try:
-            return f(*args, **kw)
-        except cinder_exceptions.ClientException, e:
-            if e.code in _non_recoverable_error_codes:
-                _re_raise(e, recoverable=False, status_code=e.code)
-            else:
+        with _operation_scope(kw):
+            _put_client_in_kw('cinder_client', CinderClient, kw)
+
+            try:
+                return f(*args, **kw)
+            except cinder_exceptions.ClientException, e:
+                if e.code in _non_recoverable_error_codes:
+                    _re_raise(e, recoverable=False, status_code=e.code)
+                _re_raise_if_transient(e, kw, getattr(e, 'retry_after', None))
+                raise
+            except Exception, e:
+                _re_raise_if_transient(e, kw)
                 raise
     return wrapper
 
@@ -554,29 +672,57 @@ def _put_client_in_kw(client_name, client_class, kw):
     if client_name in kw:
         return
 
-    ctx = _find_context_in_kw(kw)
+    config = _get_openstack_config(_find_context_in_kw(kw))
+    kw[client_name] = client_class().get(config=config)
+
+
+def _get_openstack_config(ctx):
+    if ctx is None:
+        return None
     if ctx.type == context.NODE_INSTANCE:
-        config = ctx.node.properties.get('openstack_config')
+        return ctx.node.properties.get('openstack_config')
     elif ctx.type == context.RELATIONSHIP_INSTANCE:
-        config = ctx.source.node.properties.get('openstack_config')
-        if not config:
-            config = ctx.target.node.properties.get('openstack_config')
-    else:
-        config = None
-    kw[client_name] = client_class().get(config=config)
+        return ctx.source.node.properties.get('openstack_config') or \
+            ctx.target.node.properties.get('openstack_config')
+    return None
+
+
+@contextmanager
+def _operation_scope(kw):
+    # nested decorated functions share the scope of the outermost one
+    ctx = _find_context_in_kw(kw)
+    with metrics.collect(ctx):
+        with profiling.profile(ctx, _get_openstack_config(ctx)):
+            with retry.scope(ctx):
+                with lazy_loading.scope(ctx):
+                    yield
+
+
+def get_retry_after(ctx, error_class, server_retry_after=None, cap=None,
+                    floor=None):
+    """ Returns the delay before retrying the current operation, e.g. when
+    waiting for a resource's status ('status_wait') """
+    return retry.retry_after(ctx, error_class, _get_openstack_config(ctx),
+                             server_retry_after, cap, floor)
 
 
 _non_recoverable_error_codes = [400, 401, 403, 404, 409]
 
 
+def _re_raise_if_transient(e, kw, server_retry_after=None):
+    error_class = retry.classify(e)
+    if error_class is not None:
+        retry_after = get_retry_after(_find_context_in_kw(kw), error_class,
+                                      server_retry_after)
+        _re_raise(e, recoverable=True, retry_after=retry_after)
+
+
 def _re_raise(e, recoverable, retry_after=None, status_code=None):
     exc_type, exc, traceback = sys.exc_info()
     message = e.message
     if status_code is not None:
         message = '{0} [status_code={1}]'.format(message, status_code)
     if recoverable:
-        if retry_after == 0:
-            retry_after = None
         raise RecoverableError(
             message=message,
             retry_after=retry_after), None, traceback
@@ -586,8 +732,46 @@ def _re_raise(e, recoverable, retry_after=None, status_code=None):
 
 # Sugar for clients
 
+# characters of names which are special in Nova's name search regexes
+_NAME_REGEX_SPECIAL = re.compile(r'([\\.^$*+?{}\[\]|()])')
+
+
+class ResourceRecord(object):
+    """ The id and name of a listed resource, for lookups which need nothing
+    else - a fraction of the size of the full resource, which `fetch`
+    returns. Read as either attributes or items, as Nova's and Neutron's
+    resources are """
+
+    __slots__ = ('id', 'name', '_fetch')
+
+    def __init__(self, id, name, fetch):
+        self.id = id
+        self.name = name
+        self._fetch = fetch
+
+    def __getitem__(self, key):
+        if key not in ('id', 'name'):
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __repr__(self):
+        return '<ResourceRecord id={0!r} name={1!r}>'.format(
+            self.id, self.name)
+
+    def fetch(self):
+        """ Gets the full resource """
+        return self._fetch(self.id)
+
+
 class ClientWithSugar(object):
 
+    # the process-wide inventory of the tenant's objects of a single type,
+    # set for the clients created by OpenStackClient.get when enabled
+    cosmo_inventory = None
+    # the snapshot of the tenant's slow-changing resources, set for the
+    # clients created by OpenStackClient.get when enabled
+    cosmo_snapshot = None
+
     def cosmo_plural(self, obj_type_single):
         return obj_type_single + 's'
 
@@ -595,13 +779,82 @@ class ClientWithSugar(object):
         return self.cosmo_get(obj_type_single, name=name, **kw)
 
     def cosmo_get(self, obj_type_single, **kw):
-        return self._cosmo_get(obj_type_single, False, **kw)
+        return self._cosmo_get_object(obj_type_single, False, **kw)
 
     def cosmo_get_if_exists(self, obj_type_single, **kw):
-        return self._cosmo_get(obj_type_single, True, **kw)
+        return self._cosmo_get_object(obj_type_single, True, **kw)
+
+    def cosmo_get_by_id(self, obj_type_single, obj_id):
+        """ Gets an object by its id - from the inventory, when it has the
+        object, or with a GET, raising the client library's not found error
+        when there's no such object """
+        matches = self._inventory_find(obj_type_single, id=obj_id)
+        if matches:
+            return matches[0]
+        return self._fetcher(obj_type_single)(obj_id)
+
+    def cosmo_get_record(self, obj_type_single, **kw):
+        return self._cosmo_get_record(obj_type_single, False, **kw)
+
+    def cosmo_get_record_if_exists(self, obj_type_single, **kw):
+        return self._cosmo_get_record(obj_type_single, True, **kw)
+
+    def cosmo_created(self, obj_type_single, obj):
+        """ Writes an object created by the operation through to the
+        snapshot, when it has objects of the type """
+        if self.cosmo_snapshot is not None:
+            self.cosmo_snapshot.add(obj_type_single,
+                                    self._snapshot_info(obj_type_single, obj))
+
+    def cosmo_list_snapshot_infos(self, obj_type_single):
+        """ Lists the fields of the objects of the given type, as kept in a
+        snapshot """
+        return [self._snapshot_info(obj_type_single, obj)
+                for obj in self.cosmo_list(obj_type_single)]
+
+    def _cosmo_get_object(self, obj_type_single, if_exists, **kw):
+        # the inventory and the snapshot are trusted with their matches only
+        matches = self._inventory_find(obj_type_single, **kw) or \
+            self._snapshot_find(obj_type_single, **kw)
+        if matches:
+            return self._single_match(obj_type_single, if_exists, kw,
+                                      matches)
+        return self._cosmo_get(obj_type_single, if_exists, **kw)
+
+    def _cosmo_get_record(self, obj_type_single, if_exists, **kw):
+        matches = self._snapshot_find(obj_type_single, **kw)
+        if matches:
+            return self._single_match(
+                obj_type_single, if_exists, kw,
+                [self._record(obj_type_single, obj) for obj in matches])
+        return self._cosmo_get(obj_type_single, if_exists,
+                               self.cosmo_list_records, **kw)
+
+    def _inventory_find(self, obj_type_single, **kw):
+        if self.cosmo_inventory is None or \
+                self.cosmo_inventory.resource_type != obj_type_single:
+            return []
+        return self.cosmo_inventory.find(
+            getattr(self, self.cosmo_plural(obj_type_single)), **kw)
+
+    def _snapshot_find(self, obj_type_single, **kw):
+        if self.cosmo_snapshot is None:
+            return []
+        return [self._from_snapshot_info(obj_type_single, info) for info in
+                self.cosmo_snapshot.find(obj_type_single, **kw)]
+
+    def _snapshot_discard(self, obj_type_single, obj_id):
+        if self.cosmo_snapshot is not None:
+            self.cosmo_snapshot.discard(obj_type_single, obj_id)
+
+    def _cosmo_get(self, obj_type_single, if_exists, list_function=None,
+                   **kw):
+        list_function = list_function or self.cosmo_list
+        return self._single_match(obj_type_single, if_exists, kw,
+                                  list(list_function(obj_type_single, **kw)))
 
-    def _cosmo_get(self, obj_type_single, if_exists, **kw):
-        ls = list(self.cosmo_list(obj_type_single, **kw))
+    @staticmethod
+    def _single_match(obj_type_single, if_exists, kw, ls):
         check = len(ls) > 1 if if_exists else len(ls) != 1
         if check:
             raise NonRecoverableError(
@@ -611,8 +864,48 @@ class ClientWithSugar(object):
                     obj_type_single, kw, len(ls)))
         return ls[0] if ls else None
 
-
-class NovaClientWithSugar(nova_client.Client, ClientWithSugar):
+    def cosmo_get_named_index(self, obj_type_single, names, **kw):
+        """ Returns a dict mapping each of the given names to the record of
+        the single object of the given type with that name, using a single
+        list call """
+        names = set(names)
+        if not names:
+            return {}
+
+        matches = dict((name, []) for name in names)
+        for obj in self.cosmo_list_named(obj_type_single, names,
+                                         records=True, **kw):
+            name = self.get_name_from_resource(obj)
+            if name in matches:
+                matches[name].append(obj)
+
+        for name, ls in matches.iteritems():
+            if len(ls) != 1:
+                raise NonRecoverableError(
+                    "Expected exactly one object of type {0} "
+                    "with match {1} but there are {2}".format(
+                        obj_type_single, dict(kw, name=name), len(ls)))
+        return dict((name, ls[0]) for name, ls in matches.iteritems())
+
+    def cosmo_list_named(self, obj_type_single, names, records=False, **kw):
+        """ Lists objects (or their records) of the given type, including at
+        least all of those named by any of the given names """
+        if records:
+            return self.cosmo_list_records(obj_type_single, **kw)
+        return self.cosmo_list(obj_type_single, **kw)
+
+    def cosmo_list_records(self, obj_type_single, **kw):
+        """ Lists the records of the objects of the given type """
+        for obj in self.cosmo_list(obj_type_single, **kw):
+            yield self._record(obj_type_single, obj)
+
+    def _record(self, obj_type_single, obj):
+        return ResourceRecord(self.get_id_from_resource(obj),
+                              self.get_name_from_resource(obj),
+                              self._fetcher(obj_type_single))
+
+
+class NovaClientSugar(ClientWithSugar):
 
     def cosmo_list(self, obj_type_single, **kw):
         """ Sugar for xxx.findall() - not using xxx.list() because findall
@@ -621,9 +914,95 @@ class NovaClientWithSugar(nova_client.Client, ClientWithSugar):
         for obj in getattr(self, obj_type_plural).findall(**kw):
             yield obj
 
+    def cosmo_list_records(self, obj_type_single, **kw):
+        """ Lists the records of the objects through the brief listing, of
+        ids and names, when the type has one and the filters are on those """
+        manager = getattr(self,
+                          self._get_nova_field_name_for_type(obj_type_single))
+        if not self._lists_briefly(manager, kw):
+            for record in super(NovaClientSugar, self).cosmo_list_records(
+                    obj_type_single, **kw):
+                yield record
+            return
+        list_kw = {'detailed': False}
+        # Nova searches server names for a regular expression
+        if kw.get('name') and \
+                'search_opts' in inspect.getargspec(manager.list).args:
+            name_regex = '^{0}$'.format(
+                _NAME_REGEX_SPECIAL.sub(r'\\\1', kw['name']))
+            list_kw['search_opts'] = {'name': name_regex}
+        for obj in manager.list(**list_kw):
+            if all(getattr(obj, k) == v for k, v in kw.iteritems()):
+                yield ResourceRecord(obj.id, obj.name, manager.get)
+
+    def _cosmo_get(self, obj_type_single, if_exists, list_function=None,
+                   **kw):
+        # gets a match by id directly, or finds the match through the brief
+        # listing, and gets the details of that match alone
+        if obj_type_single == 'keypair' and list_function is None and \
+                len(kw) == 1 and kw.keys()[0] in ('id', 'name'):
+            keypair = self._get_keypair(kw.values()[0])
+            return self._single_match(obj_type_single, if_exists, kw,
+                                      [keypair] if keypair else [])
+        manager = getattr(self,
+                          self._get_nova_field_name_for_type(obj_type_single))
+        if list_function is None and kw.keys() == ['id']:
+            try:
+                matches = [manager.get(kw['id'])]
+            except (nova_exceptions.NotFound, nova_exceptions.BadRequest):
+                # e.g. security groups' ids are numbers, and Nova rejects
+                # any other id as malformed
+                matches = []
+            return self._single_match(obj_type_single, if_exists, kw,
+                                      matches)
+        if list_function is not None or not self._lists_briefly(manager, kw):
+            return super(NovaClientSugar, self)._cosmo_get(
+                obj_type_single, if_exists, list_function, **kw)
+        record = super(NovaClientSugar, self)._cosmo_get(
+            obj_type_single, if_exists, self.cosmo_list_records, **kw)
+        return record.fetch() if record else None
+
+    def _get_keypair(self, name):
+        """ Gets a keypair by its name, which is its id, caching the result -
+        found or not - for the life of the client (an operation) """
+        keypairs = self.__dict__.setdefault('_cosmo_keypairs', {})
+        if name not in keypairs:
+            try:
+                keypairs[name] = self.keypairs.get(name)
+            except nova_exceptions.NotFound:
+                keypairs[name] = None
+        return keypairs[name]
+
+    @staticmethod
+    def _lists_briefly(manager, kw):
+        return 'detailed' in inspect.getargspec(manager.list).args and \
+            set(kw).issubset(('id', 'name'))
+
+    def _fetcher(self, obj_type_single):
+        return getattr(self,
+                       self._get_nova_field_name_for_type(obj_type_single)).get
+
     def cosmo_delete_resource(self, obj_type_single, obj_id):
         obj_type_plural = self._get_nova_field_name_for_type(obj_type_single)
         getattr(self, obj_type_plural).delete(obj_id)
+        if obj_type_single == 'keypair':
+            self.__dict__.get('_cosmo_keypairs', {}).pop(obj_id, None)
+        self._snapshot_discard(obj_type_single, obj_id)
+
+    def _snapshot_info(self, obj_type_single, obj):
+        info = obj._info
+        if obj_type_single == 'keypair':
+            # keypairs are listed wrapped, and are identified by their names;
+            # the private keys of created keypairs are never written
+            info = dict(info.get('keypair', info))
+            info['id'] = info['name']
+            info.pop('private_key', None)
+        return info
+
+    def _from_snapshot_info(self, obj_type_single, info):
+        manager = getattr(self,
+                          self._get_nova_field_name_for_type(obj_type_single))
+        return manager.resource_class(manager, info, loaded=True)
 
     def get_id_from_resource(self, resource):
         return resource.id
@@ -657,17 +1036,60 @@ class NovaClientWithSugar(nova_client.Client, ClientWithSugar):
         return self.cosmo_plural(obj_type_single)
 
 
-class NeutronClientWithSugar(neutron_client.Client, ClientWithSugar):
+NovaClientWithSugar = _LazyClientClass('NovaClientWithSugar', nova_client,
+                                       NovaClientSugar)
+
+
+class NeutronClientSugar(ClientWithSugar):
+
+    # the size of the chunks in which list responses are streamed, set for
+    # the clients created by OpenStackClient.get (see streaming)
+    stream_chunk_size = None
 
     def cosmo_list(self, obj_type_single, **kw):
-        """ Sugar for list_XXXs()['XXXs'] """
+        """ Sugar for list_XXXs()['XXXs'], streamed when enabled """
         obj_type_plural = self.cosmo_plural(obj_type_single)
-        for obj in getattr(self, 'list_' + obj_type_plural)(**kw)[
-                obj_type_plural]:
+        path = getattr(self, obj_type_plural + '_path', None)
+        if self.stream_chunk_size and path:
+            objs = streaming.list_items(self, obj_type_plural, path,
+                                        self.stream_chunk_size, **kw)
+        else:
+            objs = getattr(self, 'list_' + obj_type_plural)(**kw)[
+                obj_type_plural]
+        for obj in objs:
             yield obj
 
+    def cosmo_list_named(self, obj_type_single, names, records=False, **kw):
+        # Neutron matches any of multiple values given for the same filter
+        list_function = self.cosmo_list_records if records else \
+            self.cosmo_list
+        try:
+            return list(list_function(obj_type_single, name=list(names),
+                                      **kw))
+        except neutron_exceptions.RequestURITooLong:
+            return list_function(obj_type_single, **kw)
+
+    def cosmo_list_records(self, obj_type_single, **kw):
+        """ Lists the records of the objects, having Neutron return only
+        their ids and names """
+        fetch = self._fetcher(obj_type_single)
+        for obj in self.cosmo_list(obj_type_single, fields=['id', 'name'],
+                                   **kw):
+            yield ResourceRecord(obj['id'], obj.get('name'), fetch)
+
+    def _fetcher(self, obj_type_single):
+        show = getattr(self, 'show_' + obj_type_single)
+        return lambda obj_id: show(obj_id)[obj_type_single]
+
     def cosmo_delete_resource(self, obj_type_single, obj_id):
         getattr(self, 'delete_' + obj_type_single)(obj_id)
+        self._snapshot_discard(obj_type_single, obj_id)
+
+    def _snapshot_info(self, obj_type_single, obj):
+        return obj
+
+    def _from_snapshot_info(self, obj_type_single, info):
+        return info
 
     def get_id_from_resource(self, resource):
         return resource['id']
@@ -713,12 +1135,64 @@ class NeutronClientWithSugar(neutron_client.Client, ClientWithSugar):
         return ls[0]
 
 
-class CinderClientWithSugar(cinder_client.Client, ClientWithSugar):
+NeutronClientWithSugar = _LazyClientClass('NeutronClientWithSugar',
+                                          neutron_client, NeutronClientSugar)
+
+
+class CinderClientSugar(ClientWithSugar):
+
+    # the filters of volume listings which Cinder applies itself
+    SEARCH_OPTS = ('display_name', 'status')
 
     def cosmo_list(self, obj_type_single, **kw):
+        """ Sugar for xxx.findall(), but of the tenant's objects only, and
+        having Cinder apply the filters it supports """
         obj_type_plural = self.cosmo_plural(obj_type_single)
-        for obj in getattr(self, obj_type_plural).findall(**kw):
-                yield obj
+        for obj in self._cosmo_search(getattr(self, obj_type_plural), True,
+                                      kw):
+            yield obj
+
+    def cosmo_list_records(self, obj_type_single, **kw):
+        """ Lists the records of the objects through the brief listing """
+        manager = getattr(self, self.cosmo_plural(obj_type_single))
+        for obj in self._cosmo_search(manager, False, kw):
+            yield ResourceRecord(obj.id, obj.display_name, manager.get)
+
+    def _cosmo_get(self, obj_type_single, if_exists, list_function=None,
+                   **kw):
+        # gets the details of the single match alone
+        manager = getattr(self, self.cosmo_plural(obj_type_single))
+        if list_function is not None or \
+                not set(kw).issubset(('id', 'display_name')):
+            return super(CinderClientSugar, self)._cosmo_get(
+                obj_type_single, if_exists, list_function, **kw)
+        if kw.keys() == ['id']:
+            try:
+                matches = [manager.get(kw['id'])]
+            except cinder_exceptions.NotFound:
+                matches = []
+            return self._single_match(obj_type_single, if_exists, kw,
+                                      matches)
+        record = super(CinderClientSugar, self)._cosmo_get(
+            obj_type_single, if_exists, self.cosmo_list_records, **kw)
+        return record.fetch() if record else None
+
+    def _cosmo_search(self, manager, detailed, kw):
+        if 'search_opts' not in inspect.getargspec(manager.list).args:
+            return manager.findall(**kw)
+        # findall lists the objects of all tenants (with all_tenants=1)
+        # when used by an admin; all_tenants=0 isn't sent by cinderclient
+        # at all, which scopes the listing to the tenant on any Cinder
+        search_opts = dict((k, v) for k, v in kw.iteritems()
+                           if k in self.SEARCH_OPTS)
+        search_opts['all_tenants'] = 0
+        return [obj for obj in manager.list(detailed=detailed,
+                                            search_opts=search_opts)
+                if all(getattr(obj, k, None) == v
+                       for k, v in kw.iteritems())]
+
+    def _fetcher(self, obj_type_single):
+        return getattr(self, self.cosmo_plural(obj_type_single)).get
 
     def cosmo_delete_resource(self, obj_type_single, obj_id):
         obj_type_plural = self.cosmo_plural(obj_type_single)
@@ -740,3 +1214,7 @@ class CinderClientWithSugar(cinder_client.Client, ClientWithSugar):
         tenant_id = self.client.service_catalog.get_token()['tenant_id']
         quotas = self.quotas.get(tenant_id)
         return getattr(quotas, self.cosmo_plural(obj_type_single))
+
+
+CinderClientWithSugar = _LazyClientClass('CinderClientWithSugar',
+                                         cinder_client, CinderClientSugar)
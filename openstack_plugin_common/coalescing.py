@@ -0,0 +1,110 @@
+#########
+# Copyright (c) 2014 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+"""
+Coalescing of identical concurrent GET requests, made through the clients
+created by OpenStackClient.get by any thread of the process, into a single
+call whose response (or error) they share. Disabled by default, and
+configurable through openstack_config:
+
+    request_coalescing:
+        enabled: false
+"""
+
+import copy
+import sys
+import threading
+
+from openstack_plugin_common import streaming
+
+REQUEST_COALESCING_CONFIG_KEY = 'request_coalescing'
+
+COALESCED_METHODS = ('GET', 'HEAD')
+
+
+class _Call(object):
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.followers = 0
+        self.result = None
+        self.exc_info = None
+
+
+class SingleFlight(object):
+    """ Runs a single call of each key at a time, sharing its outcome with
+    the callers of the key which arrive while it is in flight """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, function):
+        """ Returns the result of the function, and whether it is shared
+        with other callers """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                call.followers += 1
+
+        if not leader:
+            call.done.wait()
+            if call.exc_info:
+                raise call.exc_info[0], call.exc_info[1], call.exc_info[2]
+            return call.result, True
+
+        try:
+            call.result = function()
+        except BaseException:
+            call.exc_info = sys.exc_info()
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, call.followers > 0
+
+
+_single_flight = SingleFlight()
+
+
+def coalesce(http_client, service, request_coalescing_config):
+    """ Wraps the request method of a client library's HTTP client, so that
+    its read requests are coalesced with identical ones in flight """
+    if not (request_coalescing_config or {}).get('enabled', False):
+        return
+
+    request = http_client.request
+
+    def coalesced_request(url, method, *args, **kwargs):
+        # streamed responses are read by their callers, so can't be shared
+        if method.upper() not in COALESCED_METHODS or args or \
+                kwargs.get('body') or kwargs.get('data') or \
+                streaming.is_streamed(url):
+            return request(url, method, *args, **kwargs)
+
+        headers = kwargs.get('headers') or {}
+        key = (service, method.upper(), url, headers.get('X-Auth-Token'),
+               headers.get('Accept'))
+        (resp, body), shared = _single_flight.do(
+            key, lambda: request(url, method, *args, **kwargs))
+        if shared:
+            # each caller gets a copy, as callers may modify their bodies
+            body = copy.deepcopy(body)
+        return resp, body
+
+    http_client.request = coalesced_request
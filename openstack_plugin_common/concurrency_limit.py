@@ -0,0 +1,153 @@
+#########
+# Copyright (c) 2014 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+"""
+Adaptive limiting of the in-flight calls made through the clients created by
+OpenStackClient.get, per service endpoint: the limit grows by one per limit's
+worth of healthy responses, and is multiplied by backoff on responses
+signalling overload (413, 429, 503 and timeouts). Enabled through
+openstack_config, e.g.:
+
+    concurrency_limit:
+        enabled: true
+        # optional - the initial, minimal and maximal limits
+        initial: 8
+        min: 1
+        max: 64
+        # optional - the factor the limit is multiplied by on overload
+        backoff: 0.5
+        # optional - seconds; slower responses (not counting the wait for a
+        # free slot) are treated as overload too
+        latency_target: 5
+"""
+
+from functools import wraps
+import threading
+import time
+import urlparse
+
+from openstack_plugin_common import metrics
+
+CONCURRENCY_LIMIT_CONFIG_KEY = 'concurrency_limit'
+
+LIMIT_GAUGE = 'openstack_api_concurrency_limit'
+
+OVERLOAD_STATUSES = (408, 413, 429, 503, 504)
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+class AIMDLimiter(object):
+
+    def __init__(self, initial=8, minimum=1, maximum=64, backoff=0.5):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.backoff = backoff
+        self.in_flight = 0
+        # requests are numbered in the order they acquire their slots
+        self._requests = 0
+        self._last_saturated = 0
+        self._last_decrease = 0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        """ Waits for a free slot, returning the request's number """
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+            self._requests += 1
+            if self.in_flight >= int(self.limit):
+                self._last_saturated = self._requests
+            return self._requests
+
+    def release(self, request, overloaded):
+        """ Frees the slot of a request, returning the updated limit """
+        with self._condition:
+            self.in_flight -= 1
+            if overloaded:
+                # a burst of failing requests, which were all in flight
+                # before the limit was decreased, decreases it once
+                if request > self._last_decrease:
+                    self.limit = max(self.minimum, self.limit * self.backoff)
+                    self._last_decrease = self._requests
+            elif self._last_saturated >= request:
+                # only grows when the limit held back requests made along
+                # with this one
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self._condition.notify_all()
+            return self.limit
+
+
+def get_limiter(service, endpoint, config):
+    """ Returns the process-wide limiter of an endpoint """
+    params = dict(initial=config.get('initial', 8),
+                  minimum=config.get('min', 1),
+                  maximum=config.get('max', 64),
+                  backoff=config.get('backoff', 0.5))
+    key = (service, endpoint) + tuple(sorted(params.iteritems()))
+    with _limiters_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            limiter = _limiters[key] = AIMDLimiter(**params)
+    return limiter
+
+
+def is_overload(status):
+    return status in OVERLOAD_STATUSES
+
+
+def _is_timeout(e):
+    # the client libraries wrap the timeouts of requests in exceptions of
+    # their own, e.g. neutronclient's ConnectionFailed
+    return 'timeout' in type(e).__name__.lower() or \
+        'timed out' in str(e).lower()
+
+
+def limit(http_client, service, concurrency_limit_config):
+    """ Wraps the request method of a client library's HTTP client, so that
+    its calls wait for a free slot of their endpoint's limiter """
+    config = concurrency_limit_config or {}
+    if not config.get('enabled'):
+        return
+    latency_target = config.get('latency_target')
+
+    request = http_client.request
+
+    @wraps(request)
+    def limited_request(url, method, *args, **kwargs):
+        endpoint = urlparse.urlsplit(url).netloc
+        limiter = get_limiter(service, endpoint, config)
+        request_number = limiter.acquire()
+        # the latency of the response, not of the wait for the slot
+        started = time.time()
+        overloaded = True
+        try:
+            resp, body = request(url, method, *args, **kwargs)
+            overloaded = is_overload(resp.status_code)
+            return resp, body
+        except Exception as e:
+            overloaded = is_overload(metrics.status_of_exception(e)) or \
+                _is_timeout(e)
+            raise
+        finally:
+            if latency_target and time.time() - started > latency_target:
+                overloaded = True
+            metrics.gauge(LIMIT_GAUGE,
+                          limiter.release(request_number, overloaded),
+                          service=service, endpoint=endpoint)
+
+    http_client.request = limited_request
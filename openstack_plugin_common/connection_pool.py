@@ -0,0 +1,114 @@
+#########
+# Copyright (c) 2014 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+"""
+A pool of keep-alive HTTP connections shared by the Nova, Neutron and Cinder
+clients created by OpenStackClient.get in the process, rather than a new
+connection per request (Neutron and Cinder) or per client (Nova). Clients
+verifying certificates differently use separate pools. Disabled by default, and
+configurable through openstack_config:
+
+    connection_pool:
+        enabled: false
+        # the maximal number of connections kept open per host
+        maxsize: 10
+        # whether requests wait for a connection when all of the host's
+        # connections are in use (rather than opening another one, which
+        # isn't kept)
+        block: false
+"""
+
+import threading
+import types
+
+import requests
+from requests.adapters import HTTPAdapter
+
+CONNECTION_POOL_CONFIG_KEY = 'connection_pool'
+
+DEFAULT_MAXSIZE = 10
+
+# service -> the method of its HTTP client making the requests through the
+# requests module's request function
+_REQUEST_METHODS = {
+    'neutron': '_request',
+    'cinder': 'request',
+}
+
+# the clients' certificate verification setting -> session
+_sessions = {}
+_lock = threading.Lock()
+
+
+class _SessionRequests(object):
+    """ Stands for the requests module in a copy of a request method, making
+    its requests through a session """
+
+    def __init__(self, session):
+        self.session = session
+
+    def request(self, method, url, **kwargs):
+        return self.session.request(method, url, **kwargs)
+
+    def __getattr__(self, attr):
+        return getattr(requests, attr)
+
+
+def get_session(maxsize=DEFAULT_MAXSIZE, block=False, verify=True):
+    """ Returns the shared session of the clients of the given certificate
+    verification setting, created on first use with the given pool
+    parameters """
+    with _lock:
+        if verify not in _sessions:
+            session = requests.Session()
+            # one pool per host, of up to `maxsize` connections
+            adapter = HTTPAdapter(pool_connections=maxsize,
+                                  pool_maxsize=maxsize, pool_block=block)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _sessions[verify] = session
+        return _sessions[verify]
+
+
+def share(service, http_client, connection_pool_config):
+    """ Makes a client library's HTTP client use the shared session """
+    config = connection_pool_config or {}
+    if not config.get('enabled', False):
+        return
+    session = get_session(config.get('maxsize', DEFAULT_MAXSIZE),
+                          config.get('block', False),
+                          getattr(http_client, 'verify_cert', True))
+
+    if service in _REQUEST_METHODS:
+        # a copy of the client's own request method, of this client alone,
+        # whose requests module is the session
+        method = getattr(http_client, _REQUEST_METHODS[service])
+        function = method.__func__
+        pooled_function = types.FunctionType(
+            function.__code__,
+            dict(function.__globals__, requests=_SessionRequests(session)),
+            function.__name__, function.__defaults__, function.__closure__)
+        setattr(http_client, _REQUEST_METHODS[service],
+                types.MethodType(pooled_function, http_client))
+    elif service == 'nova':
+        # novaclient gets the session of each request from its http method
+        http_client.http = lambda url: session
+
+
+def reset():
+    """ Closes the shared sessions' connections """
+    with _lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
@@ -0,0 +1,143 @@
+#########
+# Copyright (c) 2014 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+
+"""
+A process-wide inventory of the servers and volumes of tenants, serving the
+lookups and status polls of the Nova and Cinder sugar of the clients created
+by OpenStackClient.get. It is brought up to date when older than
+max_staleness, listing servers changed since the last listing (and all of
+them every full_sync_interval listings) and all volumes. Resources not in it
+are looked up as without it. Disabled by default, and configurable through
+openstack_config:
+
+    inventory_cache:
+        enabled: false
+        # seconds an inventory is served for before being brought up to date
+        max_staleness: 5
+        # seconds before the start of a listing of servers that the next
+        # listing lists the changes since
+        changes_since_margin: 60
+        # the servers are listed in full once every this many listings
+        full_sync_interval: 10
+"""
+
+import copy
+import threading
+import time
+
+INVENTORY_CACHE_CONFIG_KEY = 'inventory_cache'
+
+DEFAULT_MAX_STALENESS = 5
+DEFAULT_CHANGES_SINCE_MARGIN = 60
+DEFAULT_FULL_SYNC_INTERVAL = 10
+
+# service -> the type of its inventoried resources, and whether they can be
+# listed by changes-since
+_RESOURCE_TYPES = {
+    'nova': ('server', True),
+    'cinder': ('volume', False),
+}
+
+# (service, auth URL, region, tenant, user) -> inventory
+_inventories = {}
+_inventories_lock = threading.Lock()
+
+
+class Inventory(object):
+    """ The resources of a single type of a tenant, as of the last time the
+    inventory was brought up to date """
+
+    def __init__(self, resource_type, incremental, max_staleness,
+                 changes_since_margin=DEFAULT_CHANGES_SINCE_MARGIN,
+                 full_sync_interval=DEFAULT_FULL_SYNC_INTERVAL):
+        self.resource_type = resource_type
+        self.incremental = incremental
+        self.max_staleness = max_staleness
+        self.changes_since_margin = changes_since_margin
+        self.full_sync_interval = full_sync_interval
+        # resource id -> the resource's fields
+        self._resources = None
+        self._synced_at = 0
+        # listings since the last full one
+        self._incremental_syncs = 0
+        self._lock = threading.Lock()
+
+    def find(self, manager, **kw):
+        """ Returns the resources whose fields match the given ones, as
+        resources of the given client library manager """
+        with self._lock:
+            if self._resources is None or \
+                    time.time() - self._synced_at > self.max_staleness:
+                self._sync(manager)
+            if 'id' in kw:
+                resource = self._resources.get(kw['id'])
+                resources = [resource] if resource else []
+            else:
+                resources = self._resources.itervalues()
+            matches = [copy.deepcopy(r) for r in resources
+                       if all(r.get(k) == v for k, v in kw.iteritems())]
+        return [manager.resource_class(manager, info, loaded=True)
+                for info in matches]
+
+    def _sync(self, manager):
+        synced_at = time.time()
+        if self.incremental and self._resources is not None and \
+                self._incremental_syncs < self.full_sync_interval:
+            # by the local clock, which the margin covers the skew of too
+            changes_since = time.strftime(
+                '%Y-%m-%dT%H:%M:%SZ',
+                time.gmtime(self._synced_at - self.changes_since_margin))
+            changes = manager.list(
+                detailed=True,
+                search_opts={'changes-since': changes_since})
+            self._incremental_syncs += 1
+        else:
+            changes = manager.list(detailed=True)
+            self._resources = {}
+            self._incremental_syncs = 0
+        for resource in changes:
+            info = resource._info
+            if info.get('status') == 'DELETED':
+                self._resources.pop(info['id'], None)
+            else:
+                self._resources[info['id']] = info
+        self._synced_at = synced_at
+
+
+def attach(service, client, openstack_config, inventory_cache_config):
+    """ Gives a client the inventory of its tenant's resources, shared by
+    the clients of the process with the same configuration """
+    config = inventory_cache_config or {}
+    if service not in _RESOURCE_TYPES or not config.get('enabled', False):
+        return
+    key = (service, openstack_config.get('auth_url'),
+           openstack_config.get('region'), openstack_config.get('tenant_name'),
+           openstack_config.get('username'))
+    with _inventories_lock:
+        if key not in _inventories:
+            resource_type, incremental = _RESOURCE_TYPES[service]
+            _inventories[key] = Inventory(
+                resource_type, incremental,
+                config.get('max_staleness', DEFAULT_MAX_STALENESS),
+                config.get('changes_since_margin',
+                           DEFAULT_CHANGES_SINCE_MARGIN),
+                config.get('full_sync_interval', DEFAULT_FULL_SYNC_INTERVAL))
+        client.cosmo_inventory = _inventories[key]
+
+
+def reset():
+    """ Drops the inventories """
+    with _inventories_lock:
+        _inventories.clear()
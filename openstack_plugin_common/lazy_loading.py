@@ -0,0 +1,115 @@
+#########
+# Copyright (c) 2014 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+
+"""
+Counting, and in strict mode refusing, the implicit loads of the novaclient
+resources of the clients created by OpenStackClient.get - a GET made when an
+attribute a resource lacks is accessed - reported by a log line at the end of
+the operation. Configurable through openstack_config:
+
+    lazy_loading:
+        enabled: true
+        # refuse implicit loads, rather than only reporting them
+        strict: false
+"""
+
+import collections
+from contextlib import contextmanager
+import json
+import sys
+import threading
+
+from openstack_plugin_common import metrics
+
+LAZY_LOADING_CONFIG_KEY = 'lazy_loading'
+
+IMPLICIT_LOADS_GAUGE = 'openstack_implicit_loads'
+
+# the implicit loads made within the operation in progress in the thread
+_local = threading.local()
+
+
+def _call_site():
+    """ The plugin code making the implicit load, as module:line (function) """
+    frame = sys._getframe(2)
+    while frame.f_back is not None and \
+            frame.f_globals.get('__name__', '').startswith('novaclient.'):
+        frame = frame.f_back
+    return '{0}:{1} ({2})'.format(frame.f_globals.get('__name__'),
+                                  frame.f_lineno, frame.f_code.co_name)
+
+
+def _guarded_getattr(original_getattr):
+    def __getattr__(self, k):
+        api = getattr(self.__dict__.get('manager'), 'api', None)
+        strict = getattr(api, 'strict_lazy_loading', None)
+        if strict is None or k in self.__dict__ or \
+                self.__dict__.get('_loaded', True):
+            return original_getattr(self, k)
+        call_site = _call_site()
+        loads = getattr(_local, 'loads', None)
+        if loads is not None:
+            loads[call_site] += 1
+            metrics.gauge(IMPLICIT_LOADS_GAUGE, loads[call_site],
+                          call_site=call_site)
+        if strict:
+            raise AttributeError(k)
+        return original_getattr(self, k)
+    __getattr__.guarded = True
+    return __getattr__
+
+
+def guard(service, client, lazy_loading_config):
+    """ Makes the implicit loads of a Nova client's resources counted, or
+    refused in strict mode """
+    config = lazy_loading_config or {}
+    if service != 'nova' or not config.get('enabled', True):
+        return
+    client.strict_lazy_loading = bool(config.get('strict', False))
+    # the library module is imported by the creation of the client
+    module = sys.modules.get('novaclient.base')
+    if module is None:
+        return
+    resource_class = module.Resource
+    if not getattr(resource_class.__getattr__, 'guarded', False):
+        resource_class.__getattr__ = _guarded_getattr(
+            resource_class.__getattr__.im_func)
+
+
+def ensure_loaded(resource):
+    """ Explicitly loads a novaclient resource which wasn't loaded yet,
+    returning it """
+    if not resource.is_loaded():
+        resource.get()
+    return resource
+
+
+@contextmanager
+def scope(ctx):
+    """ Counts the implicit loads made within the outermost of nested
+    scopes, and reports them for the given context when it ends """
+    if getattr(_local, 'loads', None) is not None:
+        yield
+        return
+
+    _local.loads = collections.Counter()
+    try:
+        yield
+    finally:
+        loads, _local.loads = _local.loads, None
+        if ctx is not None and loads:
+            ctx.logger.warning(
+                'Implicit novaclient loads, by call site: {0}'.format(
+                    json.dumps(loads, sort_keys=True)))
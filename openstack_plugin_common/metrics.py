@@ -0,0 +1,279 @@
+#########
+# Copyright (c) 2014 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+"""
+Metrics of the OpenStack API calls made by plugin operations.
+
+The calls made through the clients created by OpenStackClient.get are timed
+and aggregated per operation, and reported by a single log line at the end
+of the operation. Enabled through openstack_config, e.g.:
+
+    metrics:
+        enabled: true
+        # optional - Prometheus text format file, which may contain
+        # {deployment_id}, {node_instance_id} and {operation} fields
+        prometheus_file: /var/lib/node_exporter/{node_instance_id}.prom
+"""
+
+import bisect
+from contextlib import contextmanager
+from functools import wraps
+import json
+import os
+import re
+import threading
+import time
+import urlparse
+
+from cloudify import context
+
+from openstack_plugin_common import streaming
+
+METRICS_CONFIG_KEY = 'metrics'
+
+# upper bounds, in seconds, of the latency histogram buckets
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# URL path segments which are resource ids (UUIDs, hex tenant ids, numbers)
+_ID_SEGMENT_RE = re.compile(
+    r'^([0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-'
+    r'[0-9a-fA-F]{12}|[0-9a-fA-F]{32}|[0-9]+)(\.[a-z]+)?$')
+
+_local = threading.local()
+
+
+class _CallStats(object):
+
+    def __init__(self):
+        self.count = 0
+        self.bytes = 0
+        self.latency_sum = 0.0
+        self.latency_max = 0.0
+        # the last bucket is for latencies above all bounds
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+
+    def add(self, size, latency):
+        self.count += 1
+        self.bytes += size
+        self.latency_sum += latency
+        self.latency_max = max(self.latency_max, latency)
+        self.buckets[bisect.bisect_left(LATENCY_BUCKETS, latency)] += 1
+
+
+class OperationMetrics(object):
+    """ The API calls of a single operation, aggregated by service, method,
+    URL template and status """
+
+    def __init__(self):
+        self.prometheus_file = None
+        self._calls = {}
+        self._gauges = {}
+        # calls may be made from several threads
+        self._lock = threading.Lock()
+
+    def record(self, service, method, url, status, size, latency):
+        key = (service, method.upper(), url_template(url), str(status))
+        with self._lock:
+            stats = self._calls.get(key)
+            if stats is None:
+                stats = self._calls[key] = _CallStats()
+            stats.add(size, latency)
+
+    def set_gauge(self, name, labels, value):
+        with self._lock:
+            self._gauges[(name, tuple(sorted(labels.iteritems())))] = value
+
+    def gauges(self):
+        return [{'name': name, 'labels': dict(labels), 'value': value}
+                for (name, labels), value in sorted(self._gauges.iteritems())]
+
+    def summary(self):
+        """ Returns the aggregated calls, slowest in total first """
+        calls = [{
+            'service': service,
+            'method': method,
+            'url': url,
+            'status': status,
+            'count': stats.count,
+            'bytes': stats.bytes,
+            'latency_sum': round(stats.latency_sum, 6),
+            'latency_max': round(stats.latency_max, 6),
+            'latency_buckets': stats.buckets,
+        } for (service, method, url, status), stats in
+            self._calls.iteritems()]
+        return sorted(calls, key=lambda call: -call['latency_sum'])
+
+    def prometheus_text(self, labels):
+        lines = [
+            '# HELP openstack_api_request_duration_seconds Latency of '
+            'OpenStack API calls',
+            '# TYPE openstack_api_request_duration_seconds histogram',
+        ]
+        bytes_lines = [
+            '# HELP openstack_api_response_bytes_total Size of OpenStack '
+            'API responses',
+            '# TYPE openstack_api_response_bytes_total counter',
+        ]
+        for (service, method, url, status), stats in \
+                sorted(self._calls.iteritems()):
+            call_labels = dict(labels, service=service, method=method,
+                               url=url, status=status)
+            cumulative_count = 0
+            for bound, count in zip(LATENCY_BUCKETS + ('+Inf',),
+                                    stats.buckets):
+                cumulative_count += count
+                lines.append('openstack_api_request_duration_seconds_bucket'
+                             '{0} {1}'.format(
+                                 _format_labels(dict(call_labels, le=bound)),
+                                 cumulative_count))
+            lines.append('openstack_api_request_duration_seconds_sum{0} '
+                         '{1!r}'.format(_format_labels(call_labels),
+                                        stats.latency_sum))
+            lines.append('openstack_api_request_duration_seconds_count{0} '
+                         '{1}'.format(_format_labels(call_labels),
+                                      stats.count))
+            bytes_lines.append('openstack_api_response_bytes_total{0} '
+                               '{1}'.format(_format_labels(call_labels),
+                                            stats.bytes))
+        gauge_lines = []
+        for (name, gauge_labels), value in sorted(self._gauges.iteritems()):
+            if '# TYPE {0} gauge'.format(name) not in gauge_lines:
+                gauge_lines.append('# TYPE {0} gauge'.format(name))
+            gauge_lines.append('{0}{1} {2!r}'.format(
+                name, _format_labels(dict(labels, **dict(gauge_labels))),
+                value))
+        return '\n'.join(lines + bytes_lines + gauge_lines) + '\n'
+
+    def __len__(self):
+        return len(self._calls)
+
+
+def url_template(url):
+    """ Returns the URL's path, with resource ids replaced by '{id}' """
+    segments = urlparse.urlsplit(url).path.split('/')
+    return '/'.join(_ID_SEGMENT_RE.sub(
+        lambda match: '{id}' + (match.group(2) or ''), segment)
+        for segment in segments)
+
+
+@contextmanager
+def collect(ctx):
+    """ Collects the metrics of the API calls made within the outermost of
+    nested scopes, and reports them for the given context when it ends """
+    if getattr(_local, 'metrics', None) is not None:
+        yield
+        return
+
+    _local.metrics = OperationMetrics()
+    try:
+        yield
+    finally:
+        operation_metrics, _local.metrics = _local.metrics, None
+        if ctx is not None and operation_metrics:
+            _report(ctx, operation_metrics)
+
+
+def gauge(name, value, **labels):
+    """ Sets a gauge (e.g. a limit of the client) in the metrics of the
+    current operation """
+    operation_metrics = getattr(_local, 'metrics', None)
+    if operation_metrics is not None:
+        operation_metrics.set_gauge(name, labels, value)
+
+
+def instrument(http_client, service, metrics_config):
+    """ Wraps the request method of a client library's HTTP client, so that
+    its calls are recorded in the metrics of the current operation """
+    operation_metrics = getattr(_local, 'metrics', None)
+    if operation_metrics is None or not (metrics_config or {}).get('enabled'):
+        return
+    operation_metrics.prometheus_file = metrics_config.get('prometheus_file')
+
+    request = http_client.request
+
+    @wraps(request)
+    def timed_request(url, method, *args, **kwargs):
+        status = 'error'
+        size = 0
+        start = time.time()
+        try:
+            resp, body = request(url, method, *args, **kwargs)
+            status = resp.status_code
+            size = _response_size(url, resp)
+            return resp, body
+        except Exception as e:
+            status = status_of_exception(e)
+            raise
+        finally:
+            operation_metrics.record(service, method, url, status, size,
+                                     time.time() - start)
+
+    http_client.request = timed_request
+
+
+def _response_size(url, resp):
+    # the body of a streamed response is read by the caller, after the call
+    # is recorded - its size is taken as declared, rather than by reading it
+    if streaming.is_streamed(url):
+        return int(resp.headers.get('Content-Length') or 0)
+    return len(resp.content or '')
+
+
+def status_of_exception(e):
+    # the client libraries raise exceptions for error statuses, which hold
+    # the status under different names
+    for attribute in 'code', 'status_code', 'http_status':
+        status = getattr(e, attribute, None)
+        if isinstance(status, int):
+            return status
+    return 'error'
+
+
+def operation_labels(ctx):
+    """ Returns the deployment, node instance and operation of a context """
+    if ctx.type == context.RELATIONSHIP_INSTANCE:
+        node_instance_id = ctx.source.instance.id
+    else:
+        node_instance_id = ctx.instance.id
+    return {
+        'deployment_id': ctx.deployment.id,
+        'node_instance_id': node_instance_id,
+        'operation': ctx.operation.name,
+    }
+
+
+def _format_labels(labels):
+    return '{{{0}}}'.format(','.join(
+        '{0}="{1}"'.format(name, str(value).replace('\\', '\\\\')
+                           .replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in sorted(labels.iteritems())))
+
+
+def _report(ctx, operation_metrics):
+    labels = operation_labels(ctx)
+    ctx.logger.info('OpenStack API calls: {0}'.format(json.dumps(
+        dict(labels, calls=operation_metrics.summary(),
+             gauges=operation_metrics.gauges()), sort_keys=True)))
+
+    if not operation_metrics.prometheus_file:
+        return
+    path = operation_metrics.prometheus_file.format(**labels)
+    try:
+        # written atomically, as the file may be read at any time
+        with open(path + '.tmp', 'w') as f:
+            f.write(operation_metrics.prometheus_text(labels))
+        os.rename(path + '.tmp', path)
+    except (IOError, OSError) as e:
+        ctx.logger.warning('Failed writing API call metrics to {0}: '
+                           '{1}'.format(path, e))
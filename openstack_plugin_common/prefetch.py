@@ -0,0 +1,66 @@
+#########
+# Copyright (c) 2014 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+
+from multiprocessing.pool import ThreadPool
+
+from cloudify import ctx
+from cloudify.decorators import operation
+
+from openstack_plugin_common import (
+    with_neutron_client,
+    with_nova_client
+)
+from openstack_plugin_common.snapshot import RESOURCE_TYPES
+
+
+@operation
+@with_neutron_client
+@with_nova_client
+def prefetch(nova_client, neutron_client, **kwargs):
+    """ Writes a snapshot of the tenant's slow-changing resources, listing
+    each type of them in parallel (see openstack_plugin_common.snapshot) """
+    if nova_client.cosmo_snapshot is None:
+        ctx.logger.warning('Not prefetching the tenant\'s resources, since '
+                           'resource_snapshot is not enabled, or its '
+                           'directory is not private to the user')
+        return
+
+    listings = [(client, obj_type_single)
+                for service, client in (('neutron', neutron_client),
+                                        ('nova', nova_client))
+                for obj_type_single in RESOURCE_TYPES[service]]
+    # authenticated first, rather than by each of the parallel listings
+    neutron_client.httpclient.authenticate_and_fetch_endpoint_url()
+    nova_client.client.authenticate()
+    pool = ThreadPool(len(listings))
+    try:
+        infos = pool.map(_list_snapshot_infos, listings)
+    finally:
+        pool.close()
+        pool.join()
+
+    resources = dict((obj_type_single, type_infos) for
+                     (_, obj_type_single), type_infos in zip(listings, infos))
+    nova_client.cosmo_snapshot.write(resources)
+    ctx.logger.info('Prefetched {0} to {1}'.format(
+        ', '.join('{0} {1}s'.format(len(type_infos), obj_type_single)
+                  for obj_type_single, type_infos in
+                  sorted(resources.iteritems())),
+        nova_client.cosmo_snapshot.path))
+
+
+def _list_snapshot_infos(listing):
+    client, obj_type_single = listing
+    return client.cosmo_list_snapshot_infos(obj_type_single)
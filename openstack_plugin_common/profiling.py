@@ -0,0 +1,183 @@
+#########
+# Copyright (c) 2014 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+"""
+Opt-in profiling of plugin operations.
+
+When enabled, each operation decorated by one of the with_*_client
+decorators runs under cProfile, and its profile is written to a .prof file
+named by deployment, node instance and operation. Only the newest profiles
+are kept. The profiles directory is created private to the user, and is not
+used if owned by another user or writable by others. Enabled either by
+setting the OPENSTACK_PLUGIN_PROFILE_DIR environment variable to the
+profiles directory, or through openstack_config:
+
+    profiling:
+        enabled: true
+        # optional, /tmp/cloudify-openstack-profiles-<user> by default
+        directory: /var/log/cloudify/profiles
+        max_files: 100  # optional, at least 1
+
+The profiles can be merged into a single hotspots report with:
+
+    python -m openstack_plugin_common.profiling [--top N] PATH [PATH ...]
+"""
+
+import argparse
+import cProfile
+from contextlib import contextmanager
+import errno
+from getpass import getuser
+import glob
+import os
+import pstats
+import re
+import sys
+import tempfile
+import threading
+import time
+
+from cloudify.exceptions import NonRecoverableError
+
+from openstack_plugin_common.metrics import operation_labels
+from openstack_plugin_common.snapshot import private_directory
+
+PROFILING_CONFIG_KEY = 'profiling'
+PROFILE_DIR_ENV_VAR = 'OPENSTACK_PLUGIN_PROFILE_DIR'
+DEFAULT_PROFILE_DIR = os.path.join(tempfile.gettempdir(),
+                                   'cloudify-openstack-profiles-' + getuser())
+DEFAULT_MAX_FILES = 100
+PROFILE_FILE_EXTENSION = '.prof'
+
+_local = threading.local()
+
+
+@contextmanager
+def profile(ctx, openstack_config):
+    """ Profiles the outermost of nested scopes, if profiling is enabled """
+    directory, max_files = _get_settings(openstack_config)
+    if ctx is None or directory is None or getattr(_local, 'active', False):
+        yield
+        return
+
+    profiler = cProfile.Profile()
+    _local.active = True
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        _local.active = False
+        _save(ctx, profiler, directory, max_files)
+
+
+def merge(paths, output=sys.stdout, top=30, sort='cumulative'):
+    """ Prints the top hotspots of the profiles in the given files and
+    directories, merged """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(
+                path, '*' + PROFILE_FILE_EXTENSION))))
+        elif os.path.isfile(path):
+            files.append(path)
+        else:
+            raise ValueError('No such profile file or directory: {0}'.format(
+                path))
+    if not files:
+        raise ValueError('No profiles found in {0}'.format(', '.join(paths)))
+
+    output.write('Merged {0} profiles\n'.format(len(files)))
+    stats = pstats.Stats(*files, stream=output)
+    stats.sort_stats(sort).print_stats(top)
+
+
+def _get_settings(openstack_config):
+    config = (openstack_config or {}).get(PROFILING_CONFIG_KEY) or {}
+    max_files = config.get('max_files', DEFAULT_MAX_FILES)
+    if max_files < 1:
+        # the profile just written would be rotated away
+        raise NonRecoverableError(
+            'profiling max_files must be at least 1, got {0}'.format(
+                max_files))
+    if os.environ.get(PROFILE_DIR_ENV_VAR):
+        return os.environ[PROFILE_DIR_ENV_VAR], max_files
+    if config.get('enabled'):
+        return config.get('directory') or DEFAULT_PROFILE_DIR, max_files
+    return None, max_files
+
+
+def _profile_file_name(ctx):
+    labels = operation_labels(ctx)
+    name = '.'.join(str(part) for part in (
+        labels['deployment_id'], labels['node_instance_id'],
+        labels['operation'], time.strftime('%Y%m%dT%H%M%S'), os.getpid()))
+    return re.sub(r'[^\w.-]', '_', name) + PROFILE_FILE_EXTENSION
+
+
+def _save(ctx, profiler, directory, max_files):
+    path = os.path.join(directory, _profile_file_name(ctx))
+    if not private_directory(directory):
+        ctx.logger.warning('Not saving operation profile, since {0} is not '
+                           'private to the user'.format(directory))
+        return
+    try:
+        profiler.dump_stats(path)
+        _rotate(directory, max_files)
+    except (IOError, OSError) as e:
+        ctx.logger.warning('Failed saving operation profile {0}: {1}'.format(
+            path, e))
+        return
+    ctx.logger.info('Operation profile saved to {0}'.format(path))
+
+
+def _rotate(directory, max_files):
+    profiles = []
+    for path in glob.glob(os.path.join(directory,
+                                       '*' + PROFILE_FILE_EXTENSION)):
+        mtime = _unless_removed(os.path.getmtime, path)
+        if mtime is not None:
+            profiles.append((mtime, path))
+    profiles.sort()
+    for _, path in profiles[:max(len(profiles) - max_files, 0)]:
+        _unless_removed(os.remove, path)
+
+
+def _unless_removed(f, path):
+    # other processes may be rotating the same directory concurrently
+    try:
+        return f(path)
+    except OSError as e:
+        if e.errno != errno.ENOENT:
+            raise
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Merges operation profiles into a hotspots report')
+    parser.add_argument('paths', nargs='+', metavar='PATH',
+                        help='profile files or directories of profiles')
+    parser.add_argument('--top', type=int, default=30,
+                        help='number of functions to report')
+    parser.add_argument('--sort', default='cumulative',
+                        help='pstats sort key (e.g. cumulative, tottime)')
+    args = parser.parse_args(argv)
+    try:
+        merge(args.paths, top=args.top, sort=args.sort)
+    except ValueError as e:
+        parser.error(str(e))
+
+
+if __name__ == '__main__':
+    main()
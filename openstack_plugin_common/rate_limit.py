@@ -0,0 +1,161 @@
+#########
+# Copyright (c) 2014 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+"""
+Client-side rate limiting of the calls made through the clients created by
+OpenStackClient.get, by token buckets per service endpoint and method class
+(reads are GET and HEAD requests, writes are the rest), shared by the
+operations of the process. Enabled through openstack_config, e.g.:
+
+    rate_limit:
+        # requests per second, by method class (either may be omitted)
+        read: 20
+        write: 5
+        # optional - the number of requests which may be made at once after
+        # an idle period (defaults to a second's worth)
+        burst: 10
+        # optional - a directory in which the buckets are kept, so that they
+        # are shared by all of the processes (e.g. agents) on the host
+        shared_dir: /var/run/cloudify-openstack-rate-limit
+"""
+
+from functools import wraps
+import json
+import os
+import re
+import threading
+import time
+import urlparse
+
+RATE_LIMIT_CONFIG_KEY = 'rate_limit'
+
+READ_METHODS = ('GET', 'HEAD')
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+class TokenBucket(object):
+    """ A token bucket, filled at `rate` tokens per second up to `burst`
+    tokens. Tokens are reserved ahead - when the bucket is empty, a caller
+    takes the next token to be added and waits until it is """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.time()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """ Takes a token, returning the seconds to wait before using it """
+        with self._lock:
+            self._tokens, self._updated, delay = _take(
+                self._tokens, self._updated, time.time(), self.rate,
+                self.burst)
+        return delay
+
+
+class SharedTokenBucket(object):
+    """ A token bucket kept in a file, which is shared by all of the
+    processes using the file """
+
+    def __init__(self, path, rate, burst):
+        self.path = path
+        self.rate = rate
+        self.burst = burst
+
+    def reserve(self):
+        import fcntl
+
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            state = os.read(fd, 1024)
+            now = time.time()
+            try:
+                tokens, updated = json.loads(state)
+            except ValueError:
+                # a new (or corrupt) bucket starts full
+                tokens, updated = self.burst, now
+            tokens, updated, delay = _take(tokens, updated, now, self.rate,
+                                           self.burst)
+            os.lseek(fd, 0, os.SEEK_SET)
+            os.ftruncate(fd, 0)
+            os.write(fd, json.dumps([tokens, updated]))
+        finally:
+            os.close(fd)
+        return delay
+
+
+def _take(tokens, updated, now, rate, burst):
+    tokens = min(burst, tokens + (now - updated) * rate) - 1
+    return tokens, now, max(0.0, -tokens / rate)
+
+
+def get_bucket(service, endpoint, method_class, rate, burst, shared_dir=None):
+    """ Returns the process-wide bucket of an endpoint and method class """
+    key = (service, endpoint, method_class, rate, burst, shared_dir)
+    with _buckets_lock:
+        bucket = _buckets.get(key)
+        if bucket is None:
+            if shared_dir:
+                name = re.sub(r'[^\w.-]', '_', '{0}-{1}-{2}'.format(
+                    service, endpoint, method_class))
+                bucket = SharedTokenBucket(os.path.join(shared_dir, name),
+                                           rate, burst)
+            else:
+                bucket = TokenBucket(rate, burst)
+            _buckets[key] = bucket
+    return bucket
+
+
+def method_class(method):
+    return 'read' if method.upper() in READ_METHODS else 'write'
+
+
+def throttle(http_client, service, rate_limit_config):
+    """ Wraps the request method of a client library's HTTP client, so that
+    its calls wait for the rate limit of their endpoint and method class """
+    rate_limit_config = rate_limit_config or {}
+    rates = dict((name, float(rate_limit_config[name]))
+                 for name in ('read', 'write') if rate_limit_config.get(name))
+    if not rates:
+        return
+    burst = rate_limit_config.get('burst')
+    shared_dir = rate_limit_config.get('shared_dir')
+    if shared_dir and not os.path.isdir(shared_dir):
+        try:
+            os.makedirs(shared_dir)
+        except OSError:
+            # may have been created by another process meanwhile
+            if not os.path.isdir(shared_dir):
+                raise
+
+    request = http_client.request
+
+    @wraps(request)
+    def throttled_request(url, method, *args, **kwargs):
+        name = method_class(method)
+        if name in rates:
+            bucket = get_bucket(service, urlparse.urlsplit(url).netloc, name,
+                                rates[name],
+                                float(burst or max(rates[name], 1)),
+                                shared_dir)
+            delay = bucket.reserve()
+            if delay:
+                time.sleep(delay)
+        return request(url, method, *args, **kwargs)
+
+    http_client.request = throttled_request
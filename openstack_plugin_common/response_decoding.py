@@ -0,0 +1,144 @@
+#########
+# Copyright (c) 2014 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+
+"""
+Cheaper transfer and decoding of the responses of the clients created by
+OpenStackClient.get: gzip-compressed responses, JSON bodies without a
+declared charset decoded as UTF-8 rather than by a guessed charset, and
+parsed with the fastest JSON library installed (ujson, then simplejson with
+its C extension, then json). Note that these may parse strings as str
+rather than unicode, and floats differently. Disabled by default, and
+configurable through openstack_config:
+
+    response_decoding:
+        enabled: false
+        # whether to ask for gzip-compressed responses, or for uncompressed
+        # ones (e.g. for agents short of CPU rather than bandwidth)
+        gzip: true
+        fast_json: true
+"""
+
+import importlib
+import json
+import types
+
+RESPONSE_DECODING_CONFIG_KEY = 'response_decoding'
+
+# service -> the method of its HTTP client parsing the response bodies with
+# its module's json module (neutronclient's client parses them instead)
+_PARSING_METHODS = {
+    'nova': 'request',
+    'cinder': 'request',
+}
+
+_json_module = None
+
+
+def _import_json_module():
+    for name in ('ujson', 'simplejson'):
+        try:
+            module = importlib.import_module(name)
+        except ImportError:
+            continue
+        # simplejson's pure Python decoder is slower than the standard
+        # library's
+        if name == 'simplejson' and \
+                module.scanner.c_make_scanner is None:
+            continue
+        return module
+    return json
+
+
+def get_json_module():
+    """ Returns the fastest installed JSON module """
+    global _json_module
+    if _json_module is None:
+        _json_module = _import_json_module()
+    return _json_module
+
+
+def default_to_utf8(response, *args, **kwargs):
+    """ A requests response hook, decoding JSON bodies without a declared
+    charset as UTF-8 (which RFC 7159 makes the default) """
+    if response.encoding is None and \
+            'json' in response.headers.get('Content-Type', ''):
+        response.encoding = 'utf-8'
+    return response
+
+
+class _FastLoads(object):
+    """ Stands in for a client module's json module, parsing with the
+    fastest one """
+
+    def __init__(self, module, json_module):
+        self._module = module
+        self._json_module = json_module
+
+    def loads(self, s, *args, **kwargs):
+        return self._json_module.loads(s, *args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._module, name)
+
+
+def decode(service, client, http_client, response_decoding_config):
+    """ Makes a client ask for compressed responses and decode them
+    faster """
+    config = response_decoding_config or {}
+    if not config.get('enabled', False):
+        return
+    # requests asks for "gzip, deflate" by default
+    accept_encoding = 'gzip' if config.get('gzip', True) else 'identity'
+    fast_json = config.get('fast_json', True)
+    if fast_json:
+        _parse_fast(service, client, http_client)
+    request = http_client.request
+
+    def decoded_request(url, method, **kwargs):
+        headers = dict(kwargs.get('headers') or {})
+        headers.setdefault('Accept-Encoding', accept_encoding)
+        kwargs['headers'] = headers
+        if fast_json:
+            kwargs.setdefault('hooks', {'response': default_to_utf8})
+        return request(url, method, **kwargs)
+    http_client.request = decoded_request
+
+
+def _parse_fast(service, client, http_client):
+    json_module = get_json_module()
+    if service in _PARSING_METHODS:
+        # a copy of the client's own method, of this client alone, whose
+        # json module is the fastest one
+        method = getattr(http_client, _PARSING_METHODS[service])
+        function = method.__func__
+        fast_function = types.FunctionType(
+            function.__code__,
+            dict(function.__globals__, json=_FastLoads(
+                function.__globals__['json'], json_module)),
+            function.__name__, function.__defaults__, function.__closure__)
+        setattr(http_client, _PARSING_METHODS[service],
+                types.MethodType(fast_function, http_client))
+    elif service == 'neutron':
+        deserialize = client.deserialize
+
+        def fast_deserialize(data, status_code):
+            if status_code == 204 or client.format != 'json':
+                return deserialize(data, status_code)
+            try:
+                return json_module.loads(data)
+            except ValueError:
+                # raises the library's own error
+                return deserialize(data, status_code)
+        client.deserialize = fast_deserialize
@@ -0,0 +1,177 @@
+#########
+# Copyright (c) 2014 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+"""
+The policy of retrying operations which failed on transient errors, or which
+wait for a resource to reach a status.
+
+The delay before each retry is an exponential backoff with decorrelated
+jitter - a random delay between the policy's base and three times the
+previous delay, capped - so that operations failing together don't retry
+together. The previous delays are kept per error class in the runtime
+properties of the node instance, and cleared once the operation succeeds.
+A Retry-After given by the server is the least delay. Configurable through
+openstack_config, e.g.:
+
+    retry_policy:
+        server_error:
+            base: 1
+            cap: 30
+"""
+
+from contextlib import contextmanager
+import random
+import sys
+import threading
+
+from cloudify import context
+
+from openstack_plugin_common import metrics
+
+RETRY_POLICY_CONFIG_KEY = 'retry_policy'
+
+RETRY_STATE_PROPERTY = 'openstack_retry_state'
+
+# error class -> the base and cap of its delays, in seconds
+DEFAULT_POLICIES = {
+    # 413 OverLimit and 429 Too Many Requests
+    'rate_limit': {'base': 5, 'cap': 120},
+    # 5xx responses
+    'server_error': {'base': 2, 'cap': 60},
+    # connection failures and timeouts
+    'connection': {'base': 2, 'cap': 60},
+    # waiting for a resource to reach a status
+    'status_wait': {'base': 2, 'cap': 30},
+}
+
+RATE_LIMIT_STATUSES = (413, 429)
+
+# module -> its exceptions of connection failures and timeouts; a module is
+# only looked at if loaded, as it is by then if one of its exceptions is
+# raised
+CONNECTION_EXCEPTIONS = {
+    'requests.exceptions': ('ConnectionError', 'Timeout'),
+    'keystoneclient.exceptions': ('ConnectionError',),
+    'neutronclient.common.exceptions': ('ConnectionFailed',),
+    'novaclient.exceptions': ('ConnectionRefused',),
+    'cinderclient.exceptions': ('ConnectionError',),
+}
+
+_local = threading.local()
+
+
+def classify(e):
+    """ Returns the class of a transient error, or None for other errors """
+    status = metrics.status_of_exception(e)
+    if status in RATE_LIMIT_STATUSES:
+        return 'rate_limit'
+    if isinstance(status, int) and status >= 500:
+        return 'server_error'
+    if isinstance(e, _connection_exceptions()):
+        return 'connection'
+    return None
+
+
+def _connection_exceptions():
+    return tuple(getattr(sys.modules[module], name)
+                 for module, names in CONNECTION_EXCEPTIONS.iteritems()
+                 if module in sys.modules
+                 for name in names)
+
+
+def next_delay(previous_delay, base, cap):
+    """ The decorrelated jitter backoff """
+    return min(cap, random.uniform(base, max(base, previous_delay * 3)))
+
+
+def poll_delays(base, cap):
+    """ Yields the delays between polls of a resource's status """
+    delay = 0
+    while True:
+        delay = next_delay(delay, base, cap)
+        yield delay
+
+
+def get_policy(error_class, openstack_config=None):
+    policy = dict(DEFAULT_POLICIES[error_class])
+    policy.update(((openstack_config or {}).get(RETRY_POLICY_CONFIG_KEY) or
+                   {}).get(error_class) or {})
+    return policy
+
+
+def retry_after(ctx, error_class, openstack_config=None,
+                server_retry_after=None, cap=None, floor=None):
+    """ Returns the delay before retrying the current operation on an error
+    of the given class, recording it in the node instance. A floor (e.g. a
+    configured retry interval) is the least delay """
+    policy = get_policy(error_class, openstack_config)
+    if cap is not None:
+        policy['cap'] = cap
+    if floor is not None:
+        policy['base'] = max(policy['base'], floor)
+        policy['cap'] = max(policy['cap'], policy['base'])
+
+    runtime_properties = _runtime_properties(ctx)
+    operation = ctx.operation.name if ctx is not None else None
+    state = {}
+    if runtime_properties is not None:
+        state = runtime_properties.get(RETRY_STATE_PROPERTY) or {}
+        # a previous operation's state (e.g. of a failed install) is stale
+        if state.get('operation') != operation:
+            state = {}
+    class_state = state.get(error_class) or {'attempts': 0, 'delay': 0}
+
+    delay = next_delay(class_state['delay'], policy['base'], policy['cap'])
+    delay = max(delay, server_retry_after or 0)
+    state = dict(state, operation=operation)
+    state[error_class] = {'attempts': class_state['attempts'] + 1,
+                          'delay': delay}
+    if runtime_properties is not None:
+        runtime_properties[RETRY_STATE_PROPERTY] = state
+    _local.retrying = True
+    return max(1, int(round(delay)))
+
+
+@contextmanager
+def scope(ctx):
+    """ Clears the retry state of the node instance once the outermost of
+    nested scopes ends without asking for a retry """
+    if getattr(_local, 'depth', 0):
+        _local.depth += 1
+        try:
+            yield
+        finally:
+            _local.depth -= 1
+        return
+
+    _local.depth = 1
+    _local.retrying = False
+    try:
+        yield
+    finally:
+        _local.depth = 0
+    if not _local.retrying:
+        runtime_properties = _runtime_properties(ctx)
+        if runtime_properties and RETRY_STATE_PROPERTY in runtime_properties:
+            del runtime_properties[RETRY_STATE_PROPERTY]
+
+
+def _runtime_properties(ctx):
+    if ctx is None:
+        return None
+    if ctx.type == context.NODE_INSTANCE:
+        return ctx.instance.runtime_properties
+    if ctx.type == context.RELATIONSHIP_INSTANCE:
+        return ctx.source.instance.runtime_properties
+    return None
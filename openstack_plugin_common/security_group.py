@@ -14,6 +14,8 @@
 #  * limitations under the License.
 
 import copy
+import hashlib
+import json
 import re
 
 from cloudify import ctx
@@ -38,6 +40,12 @@ RUNTIME_PROPERTIES_KEYS = COMMON_RUNTIME_PROPERTIES_KEYS
 
 NODE_NAME_RE = re.compile('^(.*)_.*$')  # Anything before last underscore
 
+# rule fields holding the protocol, for Neutron and Nova rules respectively
+PROTOCOL_FIELD_NAMES = ('protocol', 'ip_protocol')
+# protocols for which the min/max port fields hold an actual port range (for
+# ICMP, for example, they hold the ICMP type and code)
+PORT_RANGE_PROTOCOLS = ('tcp', 'udp', '6', '17')
+
 
 def build_sg_data():
     security_group = {
@@ -53,14 +61,94 @@ def process_rules(client, sgr_default_values, cidr_field_name,
                   remote_group_field_name, min_port_field_name,
                   max_port_field_name):
     rules_to_apply = ctx.node.properties['rules']
+    # resolving all remote group names at once rather than one by one
+    remote_groups_by_name = client.cosmo_get_named_index(
+        SECURITY_GROUP_OPENSTACK_TYPE,
+        [rule['remote_group_name'] for rule in rules_to_apply
+         if rule.get('remote_group_name') and
+         not rule.get(remote_group_field_name) and
+         not rule.get('remote_group_node')])
     security_group_rules = []
     for rule in rules_to_apply:
         security_group_rules.append(
-            _process_rule(rule, client, sgr_default_values, cidr_field_name,
+            _process_rule(rule, client, remote_groups_by_name,
+                          sgr_default_values, cidr_field_name,
                           remote_group_field_name, min_port_field_name,
                           max_port_field_name))
 
-    return security_group_rules
+    compiled_rules = compile_rules(security_group_rules, cidr_field_name,
+                                   min_port_field_name, max_port_field_name)
+    if len(compiled_rules) < len(security_group_rules):
+        ctx.logger.info(
+            'Compiled {0} security group rules into {1} equivalent rules'
+            .format(len(security_group_rules), len(compiled_rules)))
+    return compiled_rules
+
+
+def compile_rules(rules, cidr_field_name, min_port_field_name,
+                  max_port_field_name):
+    """ Returns a minimal list of rules allowing exactly the same traffic as
+    the given (already processed) rules: duplicate rules are removed, and
+    rules which differ only by their CIDR or only by their port range are
+    merged whenever their CIDRs or port ranges are adjacent or overlapping.
+    Rules are returned in order of first appearance of the group of rules
+    they were merged from. """
+    rules = _unique_rules(
+        [_normalize_rule(rule, cidr_field_name, min_port_field_name,
+                         max_port_field_name) for rule in rules])
+
+    # merging port ranges may create rules with equal port ranges and
+    # mergeable CIDRs and vice versa, hence repeating until nothing changes
+    while True:
+        rules_amount = len(rules)
+        rules = _merge_port_ranges(rules, min_port_field_name,
+                                   max_port_field_name)
+        rules = _merge_cidrs(rules, cidr_field_name)
+        if len(rules) == rules_amount:
+            return rules
+
+
+def diff_rules(declared_rules, live_rules, rule_fields, cidr_field_name,
+               min_port_field_name, max_port_field_name):
+    """ Returns the declared rules which are missing from the live rules, and
+    the live rules which aren't declared (including duplicates). Rules are
+    compared by the given fields only, after normalization """
+
+    def key(rule):
+        return _rule_key(_normalize_rule(
+            dict((field, rule.get(field)) for field in rule_fields),
+            cidr_field_name, min_port_field_name, max_port_field_name))
+
+    declared_keys = set(key(rule) for rule in declared_rules)
+    live_keys = set()
+    rules_to_remove = []
+    for rule in live_rules:
+        rule_key = key(rule)
+        if rule_key in declared_keys and rule_key not in live_keys:
+            live_keys.add(rule_key)
+        else:
+            rules_to_remove.append(rule)
+
+    rules_to_add = []
+    for rule in declared_rules:
+        rule_key = key(rule)
+        if rule_key not in live_keys:
+            live_keys.add(rule_key)
+            rules_to_add.append(rule)
+    return rules_to_add, rules_to_remove
+
+
+def rules_content_hash(security_group, compiled_rules, **extra_content):
+    """ Returns a hash identifying the content of a security group - i.e.
+    its description, its compiled rules (regardless of their order) and any
+    other given content affecting the group - but not its name """
+    content = {
+        'description': security_group.get('description'),
+        'rules': sorted(json.dumps(rule, sort_keys=True)
+                        for rule in compiled_rules),
+    }
+    content.update(extra_content)
+    return hashlib.sha1(json.dumps(content, sort_keys=True)).hexdigest()
 
 
 def use_external_sg(client):
@@ -92,9 +180,9 @@ def sg_creation_validation(client, cidr_field_name, **kwargs):
             validate_ip_or_range_syntax(ctx, rule[cidr_field_name])
 
 
-def _process_rule(rule, client, sgr_default_values, cidr_field_name,
-                  remote_group_field_name, min_port_field_name,
-                  max_port_field_name):
+def _process_rule(rule, client, remote_groups_by_name, sgr_default_values,
+                  cidr_field_name, remote_group_field_name,
+                  min_port_field_name, max_port_field_name):
     ctx.logger.debug(
         "Security group rule before transformations: {0}".format(rule))
 
@@ -114,10 +202,8 @@ def _process_rule(rule, client, sgr_default_values, cidr_field_name,
         del sgr['remote_group_node']
         sgr[cidr_field_name] = None
     elif ('remote_group_name' in sgr) and sgr['remote_group_name']:
-        sgr[remote_group_field_name] = \
-            client.get_id_from_resource(
-                client.cosmo_get_named(
-                    SECURITY_GROUP_OPENSTACK_TYPE, sgr['remote_group_name']))
+        sgr[remote_group_field_name] = client.get_id_from_resource(
+            remote_groups_by_name[sgr['remote_group_name']])
         del sgr['remote_group_name']
         sgr[cidr_field_name] = None
 
@@ -144,3 +230,120 @@ def _capabilities_of_node_named(node_name):
             "Could not find node named '{0}' "
             "in capabilities".format(node_name))
     return result
+
+
+def _normalize_rule(rule, cidr_field_name, min_port_field_name,
+                    max_port_field_name):
+    rule = dict(rule)
+    for protocol_field_name in PROTOCOL_FIELD_NAMES:
+        if isinstance(rule.get(protocol_field_name), basestring):
+            rule[protocol_field_name] = rule[protocol_field_name].lower()
+    for port_field_name in min_port_field_name, max_port_field_name:
+        port = rule.get(port_field_name)
+        if isinstance(port, basestring) and port.isdigit():
+            rule[port_field_name] = int(port)
+    cidr = _parse_cidr(rule.get(cidr_field_name))
+    if cidr is not None:
+        rule[cidr_field_name] = _format_cidr(cidr)
+    return rule
+
+
+def _parse_cidr(cidr):
+    from IPy import IP
+    # invalid CIDRs are kept as-is for Openstack to report
+    if not isinstance(cidr, basestring):
+        return None
+    try:
+        return IP(cidr)
+    except ValueError:
+        return None
+
+
+def _format_cidr(ip):
+    return '{0}/{1}'.format(ip.strNormal(0), ip.prefixlen())
+
+
+def _rule_key(rule, *excluded_fields):
+    # JSON-encoding the values so that str and unicode values (e.g. of rules
+    # returned by Openstack) are equal
+    return tuple(sorted((k, json.dumps(v, sort_keys=True))
+                        for k, v in rule.iteritems()
+                        if k not in excluded_fields))
+
+
+def _unique_rules(rules):
+    keys = set()
+    unique_rules = []
+    for rule in rules:
+        key = _rule_key(rule)
+        if key not in keys:
+            keys.add(key)
+            unique_rules.append(rule)
+    return unique_rules
+
+
+def _group_rules(rules, *excluded_fields):
+    # groups rules which are equal except for the excluded fields, keeping
+    # the order of first appearance of the groups
+    groups = {}
+    ordered_groups = []
+    for rule in rules:
+        key = _rule_key(rule, *excluded_fields)
+        if key not in groups:
+            groups[key] = []
+            ordered_groups.append(groups[key])
+        groups[key].append(rule)
+    return ordered_groups
+
+
+def _has_port_range(rule, min_port_field_name, max_port_field_name):
+    protocol = None
+    for protocol_field_name in PROTOCOL_FIELD_NAMES:
+        protocol = protocol or rule.get(protocol_field_name)
+    return protocol in PORT_RANGE_PROTOCOLS and \
+        isinstance(rule.get(min_port_field_name), int) and \
+        isinstance(rule.get(max_port_field_name), int)
+
+
+def _merge_port_ranges(rules, min_port_field_name, max_port_field_name):
+    merged_rules = []
+    for group in _group_rules(rules, min_port_field_name,
+                              max_port_field_name):
+        if not all(_has_port_range(rule, min_port_field_name,
+                                   max_port_field_name) for rule in group):
+            merged_rules.extend(group)
+            continue
+
+        ranges = sorted((rule[min_port_field_name], rule[max_port_field_name])
+                        for rule in group)
+        merged_ranges = [list(ranges[0])]
+        for min_port, max_port in ranges[1:]:
+            if min_port <= merged_ranges[-1][1] + 1:
+                merged_ranges[-1][1] = max(merged_ranges[-1][1], max_port)
+            else:
+                merged_ranges.append([min_port, max_port])
+
+        for min_port, max_port in merged_ranges:
+            rule = dict(group[0])
+            rule[min_port_field_name] = min_port
+            rule[max_port_field_name] = max_port
+            merged_rules.append(rule)
+    return merged_rules
+
+
+def _merge_cidrs(rules, cidr_field_name):
+    from IPy import IPSet
+    merged_rules = []
+    for group in _group_rules(rules, cidr_field_name):
+        cidrs = [_parse_cidr(rule.get(cidr_field_name)) for rule in group]
+        if len(group) == 1 or None in cidrs:
+            merged_rules.extend(group)
+            continue
+
+        for version in 4, 6:
+            for ip in IPSet([cidr for cidr in cidrs
+                             if cidr.version() == version]):
+                rule = dict(group[0])
+                rule[cidr_field_name] = _format_cidr(ip)
+                merged_rules.append(rule)
+    return merged_rules
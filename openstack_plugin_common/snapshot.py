@@ -0,0 +1,195 @@
+#########
+# Copyright (c) 2014 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+
+"""
+Per-tenant snapshot files of networks, subnets, security groups, images,
+flavors and keypairs, written by the prefetch operation (see
+openstack_plugin_common.prefetch) and serving the lookups of the Neutron and
+Nova sugar of the clients created by OpenStackClient.get until older than
+ttl. Resources not in a snapshot are looked up as without it. The directory
+is private to the user, and isn't used otherwise. Disabled by default, and
+configurable through openstack_config:
+
+    resource_snapshot:
+        enabled: false
+        directory: /tmp/cloudify-openstack-snapshots-<user>  # optional
+        # seconds a snapshot is served for after being prefetched
+        ttl: 600
+"""
+
+import copy
+from contextlib import contextmanager
+from getpass import getuser
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+RESOURCE_SNAPSHOT_CONFIG_KEY = 'resource_snapshot'
+DEFAULT_SNAPSHOT_DIR = os.path.join(tempfile.gettempdir(),
+                                    'cloudify-openstack-snapshots-' +
+                                    getuser())
+DEFAULT_TTL = 600
+
+# snapshots of other versions (e.g. written by an older plugin) are ignored
+SNAPSHOT_VERSION = 1
+
+# service -> the types of its snapshotted resources
+RESOURCE_TYPES = {
+    'neutron': ('network', 'subnet', 'security_group'),
+    'nova': ('image', 'flavor', 'keypair'),
+}
+
+# path -> ((inode, mtime, size), snapshot) of the snapshot files last read,
+# so that a file is parsed once per change rather than once per lookup
+_read_snapshots = {}
+_read_snapshots_lock = threading.Lock()
+
+
+class Snapshot(object):
+    """ The snapshot file of a tenant's resources, of which a client sees
+    the resources of its service's types only """
+
+    def __init__(self, path, ttl, resource_types):
+        self.path = path
+        self.ttl = ttl
+        self.resource_types = resource_types
+
+    def find(self, resource_type, **kw):
+        """ Returns the fields of the snapshotted resources of the given type
+        matching the given fields - none when the snapshot is missing or
+        expired """
+        if resource_type not in self.resource_types:
+            return []
+        snapshot = _read(self.path)
+        if snapshot is None or \
+                time.time() - snapshot['created_at'] > self.ttl:
+            return []
+        return [copy.deepcopy(info) for info in
+                snapshot['resources'].get(resource_type, ())
+                if all(info.get(k) == v for k, v in kw.iteritems())]
+
+    def write(self, resources):
+        """ Writes a new snapshot of the given resources, by type """
+        with self._locked():
+            _write(self.path, {'version': SNAPSHOT_VERSION,
+                               'created_at': time.time(),
+                               'resources': resources})
+
+    def add(self, resource_type, info):
+        """ Writes a created resource through to the snapshot """
+        self._update(resource_type, info['id'], info)
+
+    def discard(self, resource_type, resource_id):
+        """ Writes a deleted resource through to the snapshot """
+        self._update(resource_type, resource_id, None)
+
+    def _update(self, resource_type, resource_id, info):
+        if resource_type not in self.resource_types:
+            return
+        with self._locked():
+            snapshot = _read(self.path)
+            if snapshot is None or \
+                    resource_type not in snapshot['resources']:
+                return
+            # the snapshot read is shared with the process' lookups
+            infos = [i for i in snapshot['resources'][resource_type]
+                     if i['id'] != resource_id]
+            if info is not None:
+                infos.append(info)
+            resources = dict(snapshot['resources'])
+            resources[resource_type] = infos
+            _write(self.path, dict(snapshot, resources=resources))
+
+    @contextmanager
+    def _locked(self):
+        # the snapshot's writers (of any process) take turns, so that no
+        # write-through is lost
+        import fcntl
+
+        _makedirs(os.path.dirname(self.path))
+        fd = os.open(self.path + '.lock', os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)
+
+
+def attach(service, client, openstack_config, resource_snapshot_config):
+    """ Gives a client the snapshot of its tenant's resources, shared by the
+    clients with the same configuration """
+    config = resource_snapshot_config or {}
+    if service not in RESOURCE_TYPES or not config.get('enabled', False):
+        return
+    # keypairs are the user's own
+    key = json.dumps([openstack_config.get(k) for k in (
+        'auth_url', 'region', 'tenant_name', 'username')])
+    directory = config.get('directory') or DEFAULT_SNAPSHOT_DIR
+    if not private_directory(directory):
+        return
+    path = os.path.join(directory, hashlib.sha1(key).hexdigest() + '.json')
+    client.cosmo_snapshot = Snapshot(path, config.get('ttl', DEFAULT_TTL),
+                                     RESOURCE_TYPES[service])
+
+
+def _read(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    version = (stat.st_ino, stat.st_mtime, stat.st_size)
+    with _read_snapshots_lock:
+        read_version, snapshot = _read_snapshots.get(path, (None, None))
+        if read_version == version:
+            return snapshot
+    try:
+        with open(path) as f:
+            snapshot = json.load(f)
+    except (IOError, ValueError):
+        return None
+    if snapshot.get('version') != SNAPSHOT_VERSION:
+        snapshot = None
+    with _read_snapshots_lock:
+        _read_snapshots[path] = (version, snapshot)
+    return snapshot
+
+
+def _write(path, snapshot):
+    # written atomically, as the file may be read at any time
+    with open(path + '.tmp', 'w') as f:
+        json.dump(snapshot, f, separators=(',', ':'))
+    os.rename(path + '.tmp', path)
+
+
+def private_directory(directory):
+    """ Creates the directory private to the user if missing, and returns
+    whether it is owned by the user and not writable by others """
+    try:
+        _makedirs(directory)
+        stat = os.stat(directory)
+    except OSError:
+        return False
+    return stat.st_uid == os.getuid() and not stat.st_mode & 0o022
+
+
+def _makedirs(directory):
+    try:
+        os.makedirs(directory, 0o700)
+    except OSError:
+        if not os.path.isdir(directory):
+            raise
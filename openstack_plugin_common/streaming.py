@@ -0,0 +1,240 @@
+#########
+# Copyright (c) 2014 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+
+"""
+Streaming of Neutron list responses: NeutronClientSugar's cosmo_list, of the
+clients created by OpenStackClient.get, reads the responses of neutronclient's
+list in chunks and yields the listed objects as they are parsed, rather than
+holding and parsing each response whole. Disabled by default, and
+configurable through openstack_config:
+
+    streaming_lists:
+        enabled: false
+        # the size of the chunks in which responses are read, in bytes
+        chunk_size: 65536
+"""
+
+import codecs
+import json
+import re
+import threading
+import urlparse
+
+from openstack_plugin_common import response_decoding
+
+STREAMING_LISTS_CONFIG_KEY = 'streaming_lists'
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+# the list being streamed in the thread: (the path of its requests, the
+# collection, the chunk size)
+_local = threading.local()
+
+
+class _Reader(object):
+    """ Reads JSON values from a stream of UTF-8 encoded chunks """
+
+    def __init__(self, chunks, decoder):
+        self._chunks = iter(chunks)
+        self._decoder = decoder
+        self._text_decoder = codecs.getincrementaldecoder('utf-8')()
+        self._buffer = u''
+        self._pos = 0
+        self._eof = False
+
+    def _read(self):
+        """ Appends the next chunk to the buffer, dropping what was consumed.
+        Returns False at the end of the stream """
+        if self._eof:
+            return False
+        try:
+            chunk = next(self._chunks)
+        except StopIteration:
+            self._eof = True
+            chunk = ''
+        self._buffer = self._buffer[self._pos:] + \
+            self._text_decoder.decode(chunk, final=self._eof)
+        self._pos = 0
+        return True
+
+    def peek(self):
+        """ Returns the next non-whitespace character, or '' at the end of
+        the stream """
+        while True:
+            self._pos = WHITESPACE.match(self._buffer, self._pos).end()
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._read():
+                return ''
+
+    def expect(self, chars):
+        """ Consumes the next non-whitespace character, one of `chars` """
+        char = self.peek()
+        if not char or char not in chars:
+            raise ValueError('Expected one of {0!r} but found {1!r}'.format(
+                chars, char or 'the end of the response'))
+        self._pos += 1
+        return char
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer,
+                                                      self._pos)
+            except ValueError:
+                # the value continues in the next chunk
+                if not self._read():
+                    raise
+                continue
+            # as may a number
+            if end == len(self._buffer) and self._read():
+                continue
+            self._pos = end
+            return value
+
+
+def _iter_array(reader):
+    reader.expect('[')
+    if reader.peek() == ']':
+        reader.expect(']')
+        return
+    while True:
+        yield reader.value()
+        if reader.expect(',]') == ']':
+            return
+
+
+def iter_items(chunks, collection, members):
+    """ Yields the items of the `collection` array member of the JSON object
+    read from `chunks` as they are parsed, storing the object's other members
+    in the `members` dict """
+    json_module = response_decoding.get_json_module()
+    decoder = getattr(json_module, 'JSONDecoder', json.JSONDecoder)()
+    reader = _Reader(chunks, decoder)
+    reader.expect('{')
+    if reader.peek() == '}':
+        return
+    while True:
+        key = reader.value()
+        reader.expect(':')
+        if key == collection:
+            for item in _iter_array(reader):
+                yield item
+        else:
+            members[key] = reader.value()
+        if reader.expect(',}') == '}':
+            return
+
+
+class _StreamedPage(dict):
+    """ A page of a streamed list, whose collection is read as it's iterated,
+    and whose other members once it's been """
+
+    def __init__(self, resp, collection, chunk_size):
+        super(_StreamedPage, self).__init__()
+        self.resp = resp
+        self.items = iter_items(resp.iter_content(chunk_size), collection,
+                                self)
+
+    def close(self):
+        if self.resp.raw is None:
+            return
+        # a partly read body is discarded, with its connection
+        self.resp.raw.close()
+        self.resp.raw.release_conn()
+
+
+class _StreamedResponse(object):
+    """ A response whose body is left to be read by its page, which stands
+    for its text """
+
+    def __init__(self, resp, page):
+        self._resp = resp
+        self.text = page
+
+    def __getattr__(self, attr):
+        return getattr(self._resp, attr)
+
+
+def _stream_response(resp, *args, **kwargs):
+    # a requests response hook, run before neutronclient reads the body.
+    # Error responses are read and handled by neutronclient as any other
+    if resp.status_code != 200 or not is_streamed(resp.url):
+        return None
+    _, collection, chunk_size = _local.streamed
+    return _StreamedResponse(resp, _StreamedPage(resp, collection,
+                                                 chunk_size))
+
+
+def is_streamed(url):
+    """ Whether the request of the URL is streamed - its response isn't read
+    by the HTTP client, but by its caller """
+    streamed = getattr(_local, 'streamed', None)
+    return streamed is not None and \
+        urlparse.urlsplit(url).path.endswith(streamed[0])
+
+
+def stream(service, client, streaming_lists_config):
+    """ Makes cosmo_list of a sugared Neutron client stream the responses """
+    config = streaming_lists_config or {}
+    if service != 'neutron' or not config.get('enabled', False):
+        return
+    client.stream_chunk_size = config.get('chunk_size', DEFAULT_CHUNK_SIZE)
+    http_client = client.httpclient
+    request = http_client.request
+
+    def streamed_request(url, method, **kwargs):
+        if method.upper() == 'GET' and is_streamed(url):
+            hooks = dict(kwargs.get('hooks') or {})
+            response_hooks = hooks.get('response') or []
+            if callable(response_hooks):
+                response_hooks = [response_hooks]
+            hooks['response'] = list(response_hooks) + [_stream_response]
+            kwargs.update(hooks=hooks, stream=True)
+        return request(url, method, **kwargs)
+    http_client.request = streamed_request
+
+    deserialize = client.deserialize
+
+    def streamed_deserialize(data, status_code):
+        if isinstance(data, _StreamedPage):
+            return data
+        return deserialize(data, status_code)
+    client.deserialize = streamed_deserialize
+
+
+def list_items(client, collection, path, chunk_size, **params):
+    """ Yields the listed objects of the collection, as listed by the
+    client's list (so following pagination links) """
+    streamed = ('{0}{1}.{2}'.format(client.action_prefix, path,
+                                    client.format),
+                collection, chunk_size)
+    pages = client.list(collection, path, retrieve_all=False, **params)
+    while True:
+        _local.streamed = streamed
+        try:
+            page = next(pages)
+        except StopIteration:
+            return
+        finally:
+            _local.streamed = None
+        try:
+            for item in page.items:
+                yield item
+        finally:
+            page.close()
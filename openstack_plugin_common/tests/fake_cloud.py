@@ -0,0 +1,1295 @@
+#########
+# Copyright (c) 2014 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+
+"""
+An in-memory OpenStack cloud, serving the subset of the Keystone, Nova,
+Neutron and Cinder APIs used by the plugin, for tests and benchmarks.
+
+All services are served under a single base URL, by path prefix (the
+Keystone service catalog points the clients at them):
+
+    /identity/v2.0, /compute/v2/<tenant>, /network, /volume/v1/<tenant>
+
+The cloud is served either in-process - while `FakeCloud.patch_requests()` is
+active, requests made through the requests library (which all of the client
+libraries use) to the base URL are served without any networking - or over
+HTTP by a `FakeCloudServer`, which can also be run on its own:
+
+    python -m openstack_plugin_common.tests.fake_cloud --port 5000
+
+Each served request is recorded in `FakeCloud.calls` as
+'<METHOD> <URL template>'.
+
+Servers and volumes go through their transitional states (e.g. BUILD,
+creating) for `transition_time` seconds. Request latency, injected faults
+(e.g. 413 OverLimit, 409, 500), list pagination and quotas are configurable.
+"""
+
+import argparse
+import base64
+import BaseHTTPServer
+import collections
+from contextlib import contextmanager
+import itertools
+import json
+import math
+import random
+import re
+import socket
+import SocketServer
+import ssl
+import threading
+import time
+import urllib
+import urlparse
+import uuid
+import zlib
+
+from IPy import IP
+import requests
+from requests.adapters import HTTPAdapter
+
+from openstack_plugin_common.metrics import url_template
+
+BASE_URL = 'http://openstack.fake'
+TENANT_ID = 'c0ffee00c0ffee00c0ffee00c0ffee00'
+TENANT_NAME = 'tenant'
+USER_ID = 'user-id'
+TOKEN = 'fake-token'
+
+IMAGES = [{'id': '1e2f0c6a-3b4d-4f5e-8a9b-0c1d2e3f4a5b', 'name': 'ubuntu'},
+          {'id': '2f3a1d7b-4c5e-4a6f-9b0c-1d2e3f4a5b6c', 'name': 'centos'}]
+FLAVORS = [{'id': '1', 'name': 'm1.tiny', 'ram': 512, 'vcpus': 1, 'disk': 1},
+           {'id': '2', 'name': 'm1.small', 'ram': 2048, 'vcpus': 1,
+            'disk': 20}]
+
+# Neutron URL collection -> resource type (which is also the singular key)
+NEUTRON_COLLECTIONS = {
+    'networks': 'network',
+    'subnets': 'subnet',
+    'ports': 'port',
+    'routers': 'router',
+    'floatingips': 'floatingip',
+    'security-groups': 'security_group',
+    'security-group-rules': 'security_group_rule',
+}
+
+FLOATING_IP_RANGE = IP('172.24.0.0/16')
+
+# quota name -> resource type
+NOVA_QUOTAS = {
+    'instances': 'server',
+    'key_pairs': 'keypair',
+    'floating_ips': 'floatingip',
+    'security_groups': 'security_group',
+    'security_group_rules': 'security_group_rule',
+}
+CINDER_QUOTAS = {
+    'volumes': 'volume',
+}
+
+# the fault names of Nova and Cinder errors, by status code
+FAULT_NAMES = {
+    400: 'badRequest',
+    404: 'itemNotFound',
+    409: 'conflictingRequest',
+    413: 'overLimit',
+    500: 'computeFault',
+    503: 'serviceUnavailable',
+}
+
+
+def constant_latency(seconds):
+    return lambda: seconds
+
+
+def uniform_latency(low, high):
+    return lambda: random.uniform(low, high)
+
+
+def lognormal_latency(median, sigma=0.5):
+    # API latencies are typically long-tailed
+    return lambda: random.lognormvariate(math.log(median), sigma)
+
+
+class FakeCloudError(Exception):
+
+    def __init__(self, status, message, neutron_type='', retry_after=None):
+        super(FakeCloudError, self).__init__(message)
+        self.status = status
+        self.message = message
+        self.neutron_type = neutron_type
+        self.retry_after = retry_after
+
+
+class NotFound(FakeCloudError):
+
+    def __init__(self, message):
+        super(NotFound, self).__init__(404, message)
+
+
+class BadRequest(FakeCloudError):
+
+    def __init__(self, message):
+        super(BadRequest, self).__init__(400, message)
+
+
+class OverQuota(FakeCloudError):
+
+    def __init__(self, resource_type):
+        super(OverQuota, self).__init__(
+            413, 'Quota exceeded for resources: [{0}]'.format(resource_type),
+            'OverQuota')
+
+
+class FakeCloud(object):
+
+    def __init__(self, base_url=BASE_URL, transition_time=0, latency=None,
+                 quotas=None, max_limit=None):
+        """
+        :param transition_time: seconds servers and volumes spend in their
+            transitional states
+        :param latency: a function returning the latency (in seconds) of a
+            request, e.g. `lognormal_latency(0.05)`
+        :param quotas: resource type (e.g. 'server', 'port') -> the maximal
+            number of resources of the type
+        :param max_limit: the maximal number of resources returned by a list
+            request, with any more returned by following requests
+        """
+        self.base_url = base_url.rstrip('/')
+        self.transition_time = transition_time
+        self.latency = latency
+        self.quotas = quotas or {}
+        self.max_limit = max_limit
+        self.calls = []
+        self._resources = collections.defaultdict(collections.OrderedDict)
+        # the servers done deleting, listed by changes-since listings
+        self._deleted_servers = collections.OrderedDict()
+        self._faults = []
+        self._ids = itertools.count(1)
+        self._floating_ips = itertools.count()
+        self._lock = threading.RLock()
+
+    @property
+    def auth_url(self):
+        return self.base_url + '/identity/v2.0'
+
+    def openstack_config(self):
+        """ Returns an openstack_config pointing at this cloud """
+        return {
+            'username': 'user',
+            'password': 'password',
+            'tenant_name': TENANT_NAME,
+            'auth_url': self.auth_url,
+        }
+
+    def pop_calls(self):
+        with self._lock:
+            calls, self.calls = self.calls, []
+        return calls
+
+    def add(self, resource_type, **attributes):
+        """ Adds a Neutron resource directly, without recording a call """
+        with self._lock:
+            return self._show(resource_type,
+                              self._create(resource_type, attributes))
+
+    def add_volume(self, tenant_id=TENANT_ID, **attributes):
+        """ Adds a Cinder volume directly, without recording a call. The
+        volumes of other tenants are listed only for all_tenants listings,
+        as Cinder lists them for an admin """
+        with self._lock:
+            return self._show_volume(self._create_volume(attributes,
+                                                         tenant_id))
+
+    def resources(self, resource_type):
+        with self._lock:
+            return [self._show(resource_type, r) for r in
+                    self._resources[resource_type].values()]
+
+    def inject_fault(self, status, method=None, url_pattern=None, rate=1.0,
+                     count=None, retry_after=None):
+        """ Makes a `rate` fraction of the matching requests (up to `count`
+        of them, if given) fail with the given status. Requests are matched
+        by method, and by a regular expression searched for in their URL
+        template (e.g. 'POST', '/servers$') """
+        with self._lock:
+            self._faults.append({
+                'status': status,
+                'method': method,
+                'url_pattern': re.compile(url_pattern) if url_pattern
+                else None,
+                'rate': rate,
+                'count': count,
+                'retry_after': retry_after,
+            })
+
+    def clear_faults(self):
+        with self._lock:
+            self._faults = []
+
+    def handle(self, method, url, body=None):
+        """ Serves a request, returning the response's status, body and
+        headers """
+        if self.latency:
+            time.sleep(self.latency())
+
+        url = urlparse.urlsplit(url)
+        path = url.path[len(urlparse.urlsplit(self.base_url).path):]
+        query = urlparse.parse_qs(url.query, keep_blank_values=True)
+        if body:
+            body = json.loads(body)
+
+        segments = [s for s in path.split('/') if s]
+        handlers = {
+            'identity': self._identity,
+            'compute': self._compute,
+            'network': self._network,
+            'volume': self._volume,
+        }
+        with self._lock:
+            template = url_template(path)
+            self.calls.append('{0} {1}'.format(method, template))
+            try:
+                if not segments or segments[0] not in handlers:
+                    raise NotFound('No such service: {0}'.format(path))
+                self._inject_fault(method, template)
+                self._remove_deleted()
+                status, body = handlers[segments[0]](method, segments[1:],
+                                                     query, body)
+                return status, body, {}
+            except FakeCloudError as e:
+                return _error_response(segments, e)
+
+    def _inject_fault(self, method, template):
+        for fault in self._faults:
+            if fault['method'] not in (None, method) or \
+                    fault['url_pattern'] and \
+                    not fault['url_pattern'].search(template):
+                continue
+            if fault['count'] is not None and fault['count'] <= 0:
+                continue
+            if random.random() >= fault['rate']:
+                continue
+            if fault['count'] is not None:
+                fault['count'] -= 1
+            raise FakeCloudError(fault['status'], 'Injected fault',
+                                 retry_after=fault['retry_after'])
+
+    def _remove_deleted(self):
+        # servers and volumes are removed once they're done deleting
+        for resource_type in 'server', 'volume':
+            resources = self._resources[resource_type]
+            for resource in resources.values():
+                if resource.get('_deleted') and \
+                        not self._in_transition(resource):
+                    del resources[resource['id']]
+                    if resource_type == 'server':
+                        self._deleted_servers[resource['id']] = {
+                            'id': resource['id'], 'name': resource['name'],
+                            'status': 'DELETED', 'links': [],
+                            'updated': _timestamp(self._server_updated(
+                                resource))}
+
+    @contextmanager
+    def patch_requests(self):
+        """ Serves the requests made to the base URL through the requests
+        library """
+        original_send = HTTPAdapter.send
+        cloud = self
+
+        def send(adapter, request, **kwargs):
+            if not request.url.startswith(cloud.base_url):
+                return original_send(adapter, request, **kwargs)
+            status, body, headers = cloud.handle(request.method, request.url,
+                                                 request.body)
+            return _build_response(request, status, body, headers)
+
+        HTTPAdapter.send = send
+        try:
+            yield self
+        finally:
+            HTTPAdapter.send = original_send
+
+    # Keystone
+
+    def _identity(self, method, segments, query, body):
+        if method != 'POST' or segments != ['v2.0', 'tokens']:
+            raise NotFound('Unsupported identity request')
+        catalog = [
+            self._catalog_entry('identity', 'keystone', '/identity/v2.0'),
+            self._catalog_entry('compute', 'nova',
+                                '/compute/v2/' + TENANT_ID),
+            self._catalog_entry('network', 'neutron', '/network'),
+            self._catalog_entry('volume', 'cinder', '/volume/v1/' + TENANT_ID),
+        ]
+        return 200, {'access': {
+            'token': {
+                'id': TOKEN,
+                'expires': '2099-01-01T00:00:00Z',
+                'tenant': {'id': TENANT_ID, 'name': TENANT_NAME},
+            },
+            'serviceCatalog': catalog,
+            'user': {'id': USER_ID, 'name': 'user', 'roles': []},
+        }}
+
+    def _catalog_entry(self, service_type, name, path):
+        url = self.base_url + path
+        return {
+            'type': service_type,
+            'name': name,
+            'endpoints': [{
+                'region': 'RegionOne',
+                'publicURL': url,
+                'internalURL': url,
+                'adminURL': url,
+            }],
+            'endpoints_links': [],
+        }
+
+    # Neutron
+
+    def _network(self, method, segments, query, body):
+        if segments[:1] != ['v2.0'] or len(segments) < 2:
+            raise NotFound('Unsupported network request')
+        segments = [s[:-len('.json')] if s.endswith('.json') else s
+                    for s in segments[1:]]
+        try:
+            return self._network_request(method, segments, query, body)
+        except OverQuota as e:
+            raise FakeCloudError(409, e.message, e.neutron_type)
+
+    def _network_request(self, method, segments, query, body):
+        collection = segments[0]
+        if collection == 'quotas' and method == 'GET':
+            return 200, self._network_quotas(segments[1:])
+        if collection not in NEUTRON_COLLECTIONS:
+            raise NotFound('Unsupported network resource {0}'.format(
+                collection))
+        resource_type = NEUTRON_COLLECTIONS[collection]
+        plural = collection.replace('-', '_')
+
+        if len(segments) == 1 and method == 'GET':
+            resources, next_marker = self._paginate(
+                self._list(resource_type, query), query)
+            if 'fields' in query:
+                resources = [dict((k, v) for k, v in r.iteritems()
+                                  if k in query['fields'])
+                             for r in resources]
+            return 200, {
+                plural: resources,
+                plural + '_links': self._links(
+                    '/network/v2.0/{0}.json'.format(collection), query,
+                    next_marker)}
+        if len(segments) == 1 and method == 'POST':
+            if plural in body:
+                return 201, {plural: [self._show(
+                    resource_type, self._create(resource_type, attributes))
+                    for attributes in body[plural]]}
+            return 201, {resource_type: self._show(
+                resource_type, self._create(resource_type,
+                                            body[resource_type]))}
+
+        resource_id = segments[1]
+        if len(segments) == 2 and method == 'GET':
+            return 200, {resource_type: self._show(
+                resource_type, self._get(resource_type, resource_id))}
+        if len(segments) == 2 and method == 'PUT':
+            return 200, {resource_type: self._show(
+                resource_type, self._update(resource_type, resource_id,
+                                            body[resource_type]))}
+        if len(segments) == 2 and method == 'DELETE':
+            self._delete(resource_type, resource_id)
+            return 204, None
+        if resource_type == 'router' and method == 'PUT' and \
+                segments[2] == 'add_router_interface':
+            return 200, self._add_router_interface(resource_id, body)
+        if resource_type == 'router' and method == 'PUT' and \
+                segments[2] == 'remove_router_interface':
+            return 200, self._remove_router_interface(resource_id, body)
+        raise NotFound('Unsupported network request')
+
+    def _network_quotas(self, segments):
+        if segments == ['tenant']:
+            return {'tenant': {'tenant_id': TENANT_ID}}
+        if segments != [TENANT_ID]:
+            raise NotFound('Unsupported quotas request')
+        return {'quota': dict(
+            (resource_type, self.quotas.get(resource_type, -1))
+            for resource_type in NEUTRON_COLLECTIONS.values())}
+
+    def _list(self, resource_type, query):
+        filters = dict((k, v) for k, v in query.iteritems()
+                       if k not in ('fields', 'limit', 'marker'))
+        resources = [self._show(resource_type, r) for r in
+                     self._resources[resource_type].values()]
+        return [r for r in resources if all(
+            _str(r.get(field)) in values
+            for field, values in filters.iteritems())]
+
+    def _paginate(self, resources, query):
+        """ Returns the page of the resources selected by the 'limit' and
+        'marker' query parameters, and the marker of the next page (None for
+        the last page) """
+        limit = int(query['limit'][0]) if query.get('limit') else None
+        if self.max_limit:
+            limit = min(limit or self.max_limit, self.max_limit)
+        start = 0
+        if query.get('marker'):
+            ids = [r['id'] for r in resources]
+            if query['marker'][0] not in ids:
+                raise BadRequest('Marker {0} could not be found'.format(
+                    query['marker'][0]))
+            start = ids.index(query['marker'][0]) + 1
+        if limit is None:
+            return resources[start:], None
+        page = resources[start:start + limit]
+        has_next = start + limit < len(resources)
+        return page, page[-1]['id'] if has_next else None
+
+    def _links(self, path, query, next_marker):
+        if next_marker is None:
+            return []
+        query = dict(query, marker=[next_marker])
+        return [{'rel': 'next', 'href': '{0}{1}?{2}'.format(
+            self.base_url, path, urllib.urlencode(query, doseq=True))}]
+
+    def _check_quota(self, resource_type):
+        limit = self.quotas.get(resource_type, -1)
+        if 0 <= limit <= len(self._resources[resource_type]):
+            raise OverQuota(resource_type)
+
+    def _in_transition(self, resource):
+        return time.time() < resource.get('_transition_until', 0)
+
+    def _new_id(self):
+        return str(uuid.UUID(int=next(self._ids)))
+
+    def _get(self, resource_type, resource_id):
+        resource = self._resources[resource_type].get(resource_id)
+        if resource is None:
+            raise NotFound('{0} {1} could not be found'.format(
+                resource_type, resource_id))
+        return resource
+
+    def _create(self, resource_type, attributes):
+        self._check_quota(resource_type)
+        resource = {
+            'id': self._new_id(),
+            'tenant_id': TENANT_ID,
+        }
+        defaults = getattr(self, '_{0}_defaults'.format(resource_type),
+                           lambda attributes: {})
+        resource.update(defaults(attributes))
+        resource.update(attributes)
+        self._resources[resource_type][resource['id']] = resource
+        created = getattr(self, '_{0}_created'.format(resource_type), None)
+        if created:
+            created(resource)
+        return resource
+
+    def _update(self, resource_type, resource_id, attributes):
+        resource = self._get(resource_type, resource_id)
+        resource.update(attributes)
+        if resource_type == 'floatingip':
+            self._associate_floatingip(resource, attributes.get('port_id'))
+        return resource
+
+    def _delete(self, resource_type, resource_id):
+        self._get(resource_type, resource_id)
+        del self._resources[resource_type][resource_id]
+        if resource_type == 'security_group':
+            for rule in self._list('security_group_rule', {
+                    'security_group_id': [resource_id]}):
+                del self._resources['security_group_rule'][rule['id']]
+
+    def _show(self, resource_type, resource):
+        show = getattr(self, '_show_{0}'.format(resource_type), None)
+        resource = show(resource) if show else dict(resource)
+        return dict((k, v) for k, v in resource.iteritems()
+                    if not k.startswith('_'))
+
+    def _network_defaults(self, attributes):
+        return {'name': '', 'admin_state_up': True, 'status': 'ACTIVE',
+                'shared': False, 'router:external': False}
+
+    def _show_network(self, network):
+        network = dict(network)
+        network['subnets'] = [s['id'] for s in self._resources[
+            'subnet'].values() if s['network_id'] == network['id']]
+        return network
+
+    def _subnet_defaults(self, attributes):
+        if 'cidr' not in attributes:
+            raise BadRequest('cidr is required')
+        self._get('network', attributes.get('network_id'))
+        cidr = IP(attributes['cidr'])
+        return {'name': '', 'ip_version': cidr.version(),
+                'gateway_ip': str(cidr[1]), 'enable_dhcp': True,
+                'allocation_pools': [{'start': str(cidr[2]),
+                                      'end': str(cidr[-2])}],
+                '_next_address': 2}
+
+    def _allocate_fixed_ip(self, network_id, subnet_id=None):
+        subnets = [s for s in self._resources['subnet'].values()
+                   if s['network_id'] == network_id and
+                   subnet_id in (None, s['id'])]
+        if not subnets:
+            return []
+        subnet = subnets[0]
+        address = IP(subnet['cidr'])[subnet['_next_address']]
+        subnet['_next_address'] += 1
+        return [{'subnet_id': subnet['id'], 'ip_address': str(address)}]
+
+    def _port_defaults(self, attributes):
+        network_id = attributes.get('network_id')
+        self._get('network', network_id)
+        fixed_ips = []
+        for fixed_ip in attributes.get('fixed_ips') or [{}]:
+            if 'ip_address' in fixed_ip:
+                fixed_ips.append(fixed_ip)
+            else:
+                fixed_ips.extend(self._allocate_fixed_ip(
+                    network_id, fixed_ip.get('subnet_id')))
+        attributes['fixed_ips'] = fixed_ips
+        return {'name': '', 'admin_state_up': True, 'status': 'ACTIVE',
+                'device_id': '', 'device_owner': '', 'security_groups': [],
+                'mac_address': 'fa:16:3e:00:00:{0:02x}'.format(
+                    len(self._resources['port']) % 256)}
+
+    def _router_defaults(self, attributes):
+        return {'name': '', 'admin_state_up': True, 'status': 'ACTIVE',
+                'external_gateway_info': None}
+
+    def _add_router_interface(self, router_id, body):
+        self._get('router', router_id)
+        if 'port_id' in body:
+            port = self._update('port', body['port_id'], {})
+        else:
+            subnet = self._get('subnet', body['subnet_id'])
+            port = self._create('port', {
+                'network_id': subnet['network_id'],
+                'fixed_ips': [{'subnet_id': subnet['id'],
+                               'ip_address': subnet['gateway_ip']}]})
+        port.update(device_id=router_id,
+                    device_owner='network:router_interface')
+        return {'id': router_id, 'tenant_id': TENANT_ID, 'port_id': port['id'],
+                'subnet_id': port['fixed_ips'][0]['subnet_id']}
+
+    def _remove_router_interface(self, router_id, body):
+        for port in self._resources['port'].values():
+            if port['device_id'] == router_id and (
+                    port['id'] == body.get('port_id') or
+                    body.get('subnet_id') in [ip['subnet_id'] for ip in
+                                              port['fixed_ips']]):
+                del self._resources['port'][port['id']]
+                return {'id': router_id, 'tenant_id': TENANT_ID,
+                        'port_id': port['id'],
+                        'subnet_id': port['fixed_ips'][0]['subnet_id']}
+        raise NotFound('Router {0} has no such interface'.format(router_id))
+
+    def _floatingip_defaults(self, attributes):
+        address = FLOATING_IP_RANGE[
+            next(self._floating_ips) % (FLOATING_IP_RANGE.len() - 3) + 2]
+        return {'floating_ip_address': str(address), 'port_id': None,
+                'fixed_ip_address': None, 'router_id': None,
+                'floating_network_id': attributes.get('floating_network_id'),
+                'status': 'ACTIVE'}
+
+    def _floatingip_created(self, floatingip):
+        self._associate_floatingip(floatingip, floatingip['port_id'])
+
+    def _associate_floatingip(self, floatingip, port_id):
+        if port_id:
+            port = self._get('port', port_id)
+            floatingip['fixed_ip_address'] = \
+                port['fixed_ips'][0]['ip_address']
+        else:
+            floatingip['fixed_ip_address'] = None
+
+    def _security_group_defaults(self, attributes):
+        return {'name': '', 'description': ''}
+
+    def _security_group_created(self, security_group):
+        for ethertype in 'IPv4', 'IPv6':
+            self._create('security_group_rule', {
+                'security_group_id': security_group['id'],
+                'direction': 'egress',
+                'ethertype': ethertype})
+
+    def _show_security_group(self, security_group):
+        security_group = dict(security_group)
+        security_group['security_group_rules'] = self._list(
+            'security_group_rule', {'security_group_id': [
+                security_group['id']]})
+        return security_group
+
+    def _security_group_rule_defaults(self, attributes):
+        self._get('security_group', attributes.get('security_group_id'))
+        return {'direction': 'ingress', 'ethertype': 'IPv4',
+                'protocol': None, 'port_range_min': None,
+                'port_range_max': None, 'remote_ip_prefix': None,
+                'remote_group_id': None}
+
+    # Nova
+
+    def _compute(self, method, segments, query, body):
+        if segments[:2] != ['v2', TENANT_ID] or len(segments) < 3:
+            raise NotFound('Unsupported compute request')
+        collection, segments = segments[2], segments[3:]
+        handler = getattr(self, '_compute_{0}'.format(
+            collection.replace('-', '_')), None)
+        if handler is None:
+            raise NotFound('Unsupported compute resource {0}'.format(
+                collection))
+        return handler(method, segments, query, body)
+
+    def _compute_images(self, method, segments, query, body):
+        return self._static_collection('image', IMAGES, method, segments)
+
+    def _compute_flavors(self, method, segments, query, body):
+        return self._static_collection('flavor', FLAVORS, method, segments)
+
+    def _static_collection(self, resource_type, resources, method, segments):
+        plural = resource_type + 's'
+        if method == 'GET' and not segments:
+            return 200, {plural: [{'id': r['id'], 'name': r['name'],
+                                   'links': []} for r in resources]}
+        if method == 'GET' and segments == ['detail']:
+            return 200, {plural: [dict(r, links=[]) for r in resources]}
+        if method == 'GET' and len(segments) == 1:
+            for resource in resources:
+                if resource['id'] == segments[0]:
+                    return 200, {resource_type: dict(resource, links=[])}
+            raise NotFound('{0} {1} could not be found'.format(
+                resource_type, segments[0]))
+        raise NotFound('Unsupported {0} request'.format(resource_type))
+
+    def _compute_servers(self, method, segments, query, body):
+        if not segments and method == 'POST':
+            server = self._create_server(body['server'])
+            return 202, {'server': {'id': server['id'], 'links': [],
+                                    'adminPass': 'password'}}
+        if segments in ([], ['detail']) and method == 'GET':
+            servers = self._resources['server'].values()
+            # Nova searches the names for a regular expression
+            if query.get('name'):
+                name_re = re.compile(query['name'][0])
+                servers = [s for s in servers if name_re.search(s['name'])]
+            # and lists the deleted servers too, when listing changes
+            deleted_servers = []
+            if query.get('changes-since'):
+                since = query['changes-since'][0]
+                servers = [s for s in servers if
+                           _timestamp(self._server_updated(s)) >= since]
+                deleted_servers = [s for s in self._deleted_servers.values()
+                                   if s['updated'] >= since]
+            servers, next_marker = self._paginate(servers, query)
+            if segments:
+                servers = [self._show_server(s) for s in servers]
+            else:
+                servers = [{'id': s['id'], 'name': s['name'], 'links': []}
+                           for s in servers]
+            servers += deleted_servers
+            return 200, {
+                'servers': servers,
+                'servers_links': self._links(
+                    '/'.join(['/compute/v2', TENANT_ID, 'servers'] +
+                             segments), query, next_marker)}
+
+        server = self._get('server', segments[0])
+        segments = segments[1:]
+        if not segments and method == 'GET':
+            return 200, {'server': self._show_server(server)}
+        if not segments and method == 'DELETE':
+            self._delete_server(server)
+            return 204, None
+        if segments == ['action'] and method == 'POST':
+            self._server_action(server, body)
+            return 202, None
+        if segments == ['os-security-groups'] and method == 'GET':
+            return 200, {'security_groups': [
+                self._show_nova_security_group(sg)
+                for sg in self._server_security_groups(server)]}
+        if segments[:1] == ['os-volume_attachments']:
+            return self._volume_attachments(server, method, segments[1:],
+                                            body)
+        raise NotFound('Unsupported server request')
+
+    def _create_server(self, attributes):
+        self._check_quota('server')
+        for resource_type, resources, ref in (('image', IMAGES, 'imageRef'),
+                                              ('flavor', FLAVORS,
+                                               'flavorRef')):
+            if attributes.get(ref) not in [r['id'] for r in resources]:
+                raise BadRequest('Can not find requested {0}'.format(
+                    resource_type))
+        if attributes.get('key_name') and attributes['key_name'] not in \
+                self._resources['keypair']:
+            raise BadRequest('Invalid key_name provided.')
+
+        networks = attributes.get('networks')
+        if not networks:
+            candidates = [n for n in self._resources['network'].values()
+                          if not n['router:external']]
+            if len(candidates) > 1:
+                raise BadRequest('Multiple possible networks found, use a '
+                                 'Network ID to be more specific.')
+            networks = [{'uuid': n['id']} for n in candidates]
+
+        server = {
+            'id': self._new_id(),
+            'name': attributes['name'],
+            'image': {'id': attributes['imageRef'], 'links': []},
+            'flavor': {'id': attributes['flavorRef'], 'links': []},
+            'key_name': attributes.get('key_name'),
+            'metadata': attributes.get('metadata') or {},
+        }
+        self._transition_server(server, 'BUILD', 'spawning', 'ACTIVE')
+        self._resources['server'][server['id']] = server
+
+        for network in networks:
+            if network.get('port'):
+                port = self._get('port', network['port'])
+            else:
+                port = self._create('port', {'network_id': network['uuid']})
+                port['_created_by_nova'] = True
+            port.update(device_id=server['id'], device_owner='compute:nova')
+
+        security_groups = [sg['name'] for sg in
+                           attributes.get('security_groups', [])]
+        for name in security_groups:
+            self._add_server_security_group(server, name)
+        return server
+
+    def _server_ports(self, server):
+        return [p for p in self._resources['port'].values()
+                if p['device_id'] == server['id']]
+
+    def _transition_server(self, server, status, task_state, final_status):
+        server.update(_status=final_status, _transition_status=status,
+                      _task_state=task_state, _updated=time.time(),
+                      _transition_until=time.time() + self.transition_time)
+
+    def _server_updated(self, server):
+        """ Returns the time of the server's last change """
+        if self._in_transition(server):
+            return server['_updated']
+        return max(server['_updated'], server['_transition_until'])
+
+    def _server_state(self, server):
+        """ Returns the server's status and task state """
+        if self._in_transition(server):
+            return server['_transition_status'], server['_task_state']
+        return server['_status'], None
+
+    def _show_server(self, server):
+        addresses = collections.defaultdict(list)
+        for port in self._server_ports(server):
+            network_name = self._get('network', port['network_id'])['name']
+            for fixed_ip in port['fixed_ips']:
+                addresses[network_name].append({
+                    'addr': fixed_ip['ip_address'], 'version': 4,
+                    'OS-EXT-IPS:type': 'fixed'})
+            for fip in self._resources['floatingip'].values():
+                if fip['port_id'] == port['id']:
+                    addresses[network_name].append({
+                        'addr': fip['floating_ip_address'], 'version': 4,
+                        'OS-EXT-IPS:type': 'floating'})
+        status, task_state = self._server_state(server)
+        server = dict(server)
+        server.update({
+            'status': status,
+            'addresses': dict(addresses),
+            'security_groups': [{'name': sg['name']} for sg in
+                                self._server_security_groups(server)],
+            'OS-EXT-STS:task_state': task_state,
+            'OS-EXT-STS:vm_state': status.lower(),
+            'updated': _timestamp(self._server_updated(server)),
+            'tenant_id': TENANT_ID,
+            'user_id': USER_ID,
+            'hostId': '',
+            'accessIPv4': '',
+            'accessIPv6': '',
+            'links': [],
+        })
+        return dict((k, v) for k, v in server.iteritems()
+                    if not k.startswith('_'))
+
+    def _delete_server(self, server):
+        for port in self._server_ports(server):
+            if port.get('_created_by_nova'):
+                del self._resources['port'][port['id']]
+            else:
+                port.update(device_id='', device_owner='')
+        for volume in self._resources['volume'].values():
+            volume['attachments'] = [a for a in volume['attachments']
+                                     if a['server_id'] != server['id']]
+            if not volume['attachments']:
+                volume['status'] = 'available'
+        status, _ = self._server_state(server)
+        self._transition_server(server, status, 'deleting', status)
+        server['_deleted'] = True
+
+    def _server_action(self, server, body):
+        (action, arguments), = body.items()
+        _, task_state = self._server_state(server)
+        if action in ('os-start', 'os-stop') and task_state:
+            raise FakeCloudError(
+                409, 'Cannot {0} instance while it is in task_state {1}'
+                .format(action, task_state))
+        if action == 'os-start':
+            self._transition_server(server, 'SHUTOFF', 'powering-on',
+                                    'ACTIVE')
+        elif action == 'os-stop':
+            self._transition_server(server, 'ACTIVE', 'powering-off',
+                                    'SHUTOFF')
+        elif action == 'addFloatingIp':
+            fip = self._floatingip_by_address(arguments['address'])
+            ports = self._server_ports(server)
+            if arguments.get('fixed_address'):
+                ports = [p for p in ports if arguments['fixed_address'] in
+                         [ip['ip_address'] for ip in p['fixed_ips']]]
+            if not ports:
+                raise BadRequest('No nic to associate the floating ip with')
+            self._update('floatingip', fip['id'], {'port_id': ports[0]['id']})
+        elif action == 'removeFloatingIp':
+            fip = self._floatingip_by_address(arguments['address'])
+            self._update('floatingip', fip['id'], {'port_id': None})
+        elif action == 'addSecurityGroup':
+            self._add_server_security_group(server, arguments['name'])
+        elif action == 'removeSecurityGroup':
+            security_group = self._security_group_by_name(arguments['name'])
+            for port in self._server_ports(server):
+                port['security_groups'] = [
+                    sg for sg in port['security_groups']
+                    if sg != security_group['id']]
+        else:
+            raise BadRequest('Unsupported server action {0}'.format(action))
+        server['_updated'] = time.time()
+
+    def _floatingip_by_address(self, address):
+        for fip in self._resources['floatingip'].values():
+            if fip['floating_ip_address'] == address:
+                return fip
+        raise NotFound('Floating ip {0} not found'.format(address))
+
+    def _security_group_by_name(self, name):
+        for security_group in self._resources['security_group'].values():
+            if security_group['name'] == name:
+                return security_group
+        raise NotFound('Security group {0} not found'.format(name))
+
+    def _add_server_security_group(self, server, name):
+        security_group = self._security_group_by_name(name)
+        for port in self._server_ports(server):
+            if security_group['id'] not in port['security_groups']:
+                port['security_groups'] = \
+                    port['security_groups'] + [security_group['id']]
+
+    def _server_security_groups(self, server):
+        ids = set(sg_id for port in self._server_ports(server)
+                  for sg_id in port['security_groups'])
+        return [sg for sg in self._resources['security_group'].values()
+                if sg['id'] in ids]
+
+    def _volume_attachments(self, server, method, segments, body):
+        if not segments and method == 'POST':
+            attachment = body['volumeAttachment']
+            volume = self._get('volume', attachment['volumeId'])
+            if volume['attachments']:
+                raise FakeCloudError(409, 'Volume is already attached')
+            device = attachment.get('device') or '/dev/vdb'
+            volume['attachments'] = [{
+                'id': volume['id'], 'volume_id': volume['id'],
+                'server_id': server['id'], 'device': device}]
+            self._transition_volume(volume, 'attaching', 'in-use')
+            return 200, {'volumeAttachment': {
+                'id': volume['id'], 'volumeId': volume['id'],
+                'serverId': server['id'], 'device': device}}
+        if len(segments) == 1 and method == 'DELETE':
+            volume = self._get('volume', segments[0])
+            volume['attachments'] = []
+            self._transition_volume(volume, 'detaching', 'available')
+            return 202, None
+        raise NotFound('Unsupported volume attachment request')
+
+    def _compute_os_keypairs(self, method, segments, query, body):
+        if not segments and method == 'GET':
+            return 200, {'keypairs': [{'keypair': k} for k in
+                                      self._resources['keypair'].values()]}
+        if not segments and method == 'POST':
+            keypair = dict(body['keypair'])
+            self._check_quota('keypair')
+            if keypair['name'] in self._resources['keypair']:
+                raise FakeCloudError(409, 'Key pair already exists')
+            response = dict(keypair, user_id=USER_ID, fingerprint='00:00')
+            if not keypair.get('public_key'):
+                keypair['public_key'] = 'ssh-rsa AAAA fake'
+                response['public_key'] = keypair['public_key']
+                response['private_key'] = base64.b64encode(keypair['name'])
+            self._resources['keypair'][keypair['name']] = dict(
+                keypair, user_id=USER_ID, fingerprint='00:00')
+            return 200, {'keypair': response}
+        keypair = self._get('keypair', segments[0])
+        if method == 'GET':
+            return 200, {'keypair': keypair}
+        if method == 'DELETE':
+            del self._resources['keypair'][keypair['name']]
+            return 202, None
+        raise NotFound('Unsupported keypair request')
+
+    def _compute_os_floating_ips(self, method, segments, query, body):
+        if not segments and method == 'GET':
+            return 200, {'floating_ips': [
+                self._show_nova_floating_ip(fip)
+                for fip in self._resources['floatingip'].values()]}
+        if not segments and method == 'POST':
+            networks = [n for n in self._resources['network'].values()
+                        if n['router:external'] and
+                        body.get('pool') in (None, n['name'])]
+            fip = self._create('floatingip', {
+                'floating_network_id': networks[0]['id'] if networks
+                else None})
+            return 200, {'floating_ip': self._show_nova_floating_ip(fip)}
+        fip = self._get('floatingip', segments[0])
+        if method == 'GET':
+            return 200, {'floating_ip': self._show_nova_floating_ip(fip)}
+        if method == 'DELETE':
+            self._delete('floatingip', fip['id'])
+            return 202, None
+        raise NotFound('Unsupported floating ip request')
+
+    def _show_nova_floating_ip(self, fip):
+        port = self._resources['port'].get(fip['port_id'])
+        network = self._resources['network'].get(fip['floating_network_id'])
+        return {
+            'id': fip['id'],
+            'ip': fip['floating_ip_address'],
+            'pool': network['name'] if network else None,
+            'fixed_ip': fip['fixed_ip_address'],
+            'instance_id': port['device_id'] if port else None,
+        }
+
+    def _compute_os_security_groups(self, method, segments, query, body):
+        if not segments and method == 'GET':
+            return 200, {'security_groups': [
+                self._show_nova_security_group(sg)
+                for sg in self._resources['security_group'].values()]}
+        if not segments and method == 'POST':
+            security_group = self._create('security_group',
+                                          body['security_group'])
+            return 200, {'security_group': self._show_nova_security_group(
+                security_group)}
+        security_group = self._get('security_group', segments[0])
+        if method == 'GET':
+            return 200, {'security_group': self._show_nova_security_group(
+                security_group)}
+        if method == 'DELETE':
+            self._delete('security_group', security_group['id'])
+            return 202, None
+        raise NotFound('Unsupported security group request')
+
+    def _show_nova_security_group(self, security_group):
+        rules = [{
+            'id': rule['id'],
+            'parent_group_id': security_group['id'],
+            'ip_protocol': rule['protocol'],
+            'from_port': rule['port_range_min'],
+            'to_port': rule['port_range_max'],
+            'ip_range': {'cidr': rule['remote_ip_prefix']}
+            if rule['remote_ip_prefix'] else {},
+            'group': {'id': rule['remote_group_id']}
+            if rule['remote_group_id'] else {},
+        } for rule in self._list('security_group_rule', {
+            'security_group_id': [security_group['id']],
+            'direction': ['ingress']})]
+        return {'id': security_group['id'], 'name': security_group['name'],
+                'description': security_group['description'],
+                'tenant_id': TENANT_ID, 'rules': rules}
+
+    def _compute_os_security_group_rules(self, method, segments, query,
+                                         body):
+        if not segments and method == 'POST':
+            attributes = body['security_group_rule']
+            rule = self._create('security_group_rule', {
+                'security_group_id': attributes['parent_group_id'],
+                'protocol': attributes.get('ip_protocol'),
+                'port_range_min': attributes.get('from_port'),
+                'port_range_max': attributes.get('to_port'),
+                'remote_ip_prefix': attributes.get('cidr'),
+                'remote_group_id': attributes.get('group_id'),
+            })
+            return 200, {'security_group_rule': {
+                'id': rule['id'],
+                'parent_group_id': rule['security_group_id'],
+                'ip_protocol': rule['protocol'],
+                'from_port': rule['port_range_min'],
+                'to_port': rule['port_range_max']}}
+        if len(segments) == 1 and method == 'DELETE':
+            self._delete('security_group_rule', segments[0])
+            return 202, None
+        raise NotFound('Unsupported security group rule request')
+
+    def _compute_os_quota_sets(self, method, segments, query, body):
+        return 200, self._quota_set(NOVA_QUOTAS, method, segments)
+
+    def _quota_set(self, quota_names, method, segments):
+        if method != 'GET' or segments != [TENANT_ID]:
+            raise NotFound('Unsupported quota sets request')
+        quota_set = dict((name, self.quotas.get(resource_type, -1))
+                         for name, resource_type in quota_names.iteritems())
+        quota_set['id'] = TENANT_ID
+        return {'quota_set': quota_set}
+
+    # Cinder
+
+    def _volume(self, method, segments, query, body):
+        if segments[:2] != ['v1', TENANT_ID] or len(segments) < 3:
+            raise NotFound('Unsupported volume request')
+        if segments[2] == 'os-quota-sets':
+            return 200, self._quota_set(CINDER_QUOTAS, method, segments[3:])
+        if segments[2] != 'volumes':
+            raise NotFound('Unsupported volume request')
+        segments = segments[3:]
+        if not segments and method == 'POST':
+            self._check_quota('volume')
+            return 200, {'volume': self._show_volume(
+                self._create_volume(body['volume']))}
+        if segments in ([], ['detail']) and method == 'GET':
+            filters = dict((k, v) for k, v in query.iteritems()
+                           if k not in ('all_tenants', 'limit', 'marker'))
+            # some Cinder releases take any all_tenants value as true
+            volumes = [self._show_volume(v) for v in
+                       self._resources['volume'].values()
+                       if 'all_tenants' in query or
+                       v['_tenant_id'] == TENANT_ID]
+            volumes, _ = self._paginate([v for v in volumes if all(
+                _str(v.get(field)) in values
+                for field, values in filters.iteritems())], query)
+            return 200, {'volumes': volumes}
+
+        volume = self._get('volume', segments[0])
+        if len(segments) == 1 and method == 'GET':
+            return 200, {'volume': self._show_volume(volume)}
+        if len(segments) == 1 and method == 'DELETE':
+            if volume['attachments']:
+                raise BadRequest('Volume is attached')
+            self._transition_volume(volume, 'deleting', 'deleting')
+            volume['_deleted'] = True
+            return 202, None
+        raise NotFound('Unsupported volume request')
+
+    def _create_volume(self, attributes, tenant_id=TENANT_ID):
+        volume = dict(attributes, id=self._new_id(), attachments=[],
+                      metadata={}, created_at='2015-01-01T00:00:00.000000',
+                      availability_zone='nova', bootable='false',
+                      volume_type='None', _tenant_id=tenant_id)
+        self._transition_volume(volume, 'creating', 'available')
+        self._resources['volume'][volume['id']] = volume
+        return volume
+
+    def _transition_volume(self, volume, status, final_status):
+        volume.update(status=final_status, _transition_status=status,
+                      _transition_until=time.time() + self.transition_time)
+
+    def _show_volume(self, volume):
+        volume = dict(volume)
+        if self._in_transition(volume):
+            volume['status'] = volume['_transition_status']
+        return dict((k, v) for k, v in volume.iteritems()
+                    if not k.startswith('_'))
+
+
+def _timestamp(t):
+    # Nova's timestamps are of a second's resolution
+    return time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(t))
+
+
+def _str(value):
+    # query string values are compared with the resource values as strings
+    return value if isinstance(value, basestring) else str(value)
+
+
+def _error_response(segments, error):
+    headers = {}
+    if error.retry_after is not None:
+        headers['Retry-After'] = str(error.retry_after)
+    if segments[:1] == ['network']:
+        body = {'NeutronError': {'type': error.neutron_type,
+                                 'message': error.message, 'detail': ''}}
+    else:
+        fault = {'message': error.message, 'code': error.status}
+        if error.retry_after is not None:
+            fault['retryAfter'] = str(error.retry_after)
+        body = {FAULT_NAMES.get(error.status, 'computeFault'): fault}
+    return error.status, body, headers
+
+
+def _build_response(request, status, body, headers):
+    response = requests.Response()
+    response.status_code = status
+    response.reason = requests.status_codes._codes[status][0].upper()
+    response._content = json.dumps(body) if body is not None else ''
+    response.headers['Content-Type'] = 'application/json'
+    response.headers.update(headers)
+    response.encoding = 'utf-8'
+    # so that the content may also be streamed
+    response._content_consumed = True
+    response.url = request.url
+    response.request = request
+    return response
+
+
+def _gzip(content):
+    # the gzip format, rather than zlib's
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(content) + compressor.flush()
+
+
+class FakeCloudServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """ Serves a FakeCloud over HTTP, or HTTPS given a certificate (and key)
+    file. The cloud's base URL is set to the server's address """
+
+    daemon_threads = True
+
+    def __init__(self, cloud, host='127.0.0.1', port=0, certfile=None,
+                 compress=False):
+        BaseHTTPServer.HTTPServer.__init__(self, (host, port),
+                                           _FakeCloudRequestHandler)
+        self.cloud = cloud
+        self.certfile = certfile
+        # whether bodies are gzip-compressed for clients accepting it
+        self.compress = compress
+        # the number of connections accepted (and TLS handshakes made)
+        self.connections = 0
+        # the total size of the response bodies sent
+        self.bytes_sent = 0
+        cloud.base_url = '{0}://{1}:{2}'.format(
+            'https' if certfile else 'http', *self.server_address[:2])
+        self._thread = None
+
+    def finish_request(self, request, client_address):
+        # runs in the connection's thread, so handshakes are concurrent
+        with self.cloud._lock:
+            self.connections += 1
+        if self.certfile:
+            request = ssl.wrap_socket(request, certfile=self.certfile,
+                                      server_side=True)
+        BaseHTTPServer.HTTPServer.finish_request(self, request,
+                                                 client_address)
+
+    def start(self):
+        """ Serves requests in a background thread """
+        self._thread = threading.Thread(target=self.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        self._thread.join()
+
+
+class _FakeCloudRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+    # the headers and body are written separately, so Nagle's algorithm
+    # would delay every keep-alive response by the client's delayed ACK
+    disable_nagle_algorithm = True
+
+    def handle(self):
+        try:
+            BaseHTTPServer.BaseHTTPRequestHandler.handle(self)
+        except socket.error:
+            # clients may close kept-alive connections at any time
+            pass
+
+    def finish(self):
+        try:
+            BaseHTTPServer.BaseHTTPRequestHandler.finish(self)
+        except socket.error:
+            # or leave responses partly read
+            pass
+
+    def _serve(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else None
+        cloud = self.server.cloud
+        status, body, headers = cloud.handle(
+            self.command, cloud.base_url + self.path, body)
+        content = json.dumps(body) if body is not None else ''
+        compress = self.server.compress and content and \
+            'gzip' in self.headers.get('Accept-Encoding', '')
+        if compress:
+            content = _gzip(content)
+        with cloud._lock:
+            self.server.bytes_sent += len(content)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        if compress:
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(content)))
+        for name, value in headers.iteritems():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(content)
+
+    do_GET = do_POST = do_PUT = do_DELETE = _serve
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Serves an in-memory OpenStack cloud over HTTP')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--latency-ms', type=float, default=0,
+                        help='median request latency')
+    parser.add_argument('--latency-sigma', type=float, default=0.5,
+                        help='sigma of the log-normal request latency')
+    parser.add_argument('--transition-time', type=float, default=0,
+                        help='seconds servers and volumes spend in their '
+                             'transitional states')
+    parser.add_argument('--max-limit', type=int, default=None,
+                        help='maximal number of resources listed per request')
+    parser.add_argument('--gzip', action='store_true',
+                        help='compress the responses of clients accepting '
+                             'gzip')
+    args = parser.parse_args(argv)
+
+    latency = None
+    if args.latency_ms:
+        latency = lognormal_latency(args.latency_ms / 1000.0,
+                                    args.latency_sigma)
+    cloud = FakeCloud(transition_time=args.transition_time, latency=latency,
+                      max_limit=args.max_limit)
+    cloud.add('network', name='ext-net', **{'router:external': True})
+    server = FakeCloudServer(cloud, args.host, args.port,
+                             compress=args.gzip)
+    print json.dumps(cloud.openstack_config(), indent=2)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,203 @@
+#########
+# Copyright (c) 2014 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+
+"""
+The install and uninstall of a deployment using each of the plugin's node and
+relationship types, running the real operations with mock contexts (e.g.
+against a `fake_cloud.FakeCloud`).
+"""
+
+import copy
+import os
+
+from cloudify.context import ContextCapabilities
+from cloudify.mocks import (MockCloudifyContext,
+                            MockContext,
+                            MockNodeContext,
+                            MockNodeInstanceContext)
+
+import cinder_plugin.volume
+import neutron_plugin.floatingip
+import neutron_plugin.network
+import neutron_plugin.port
+import neutron_plugin.router
+import neutron_plugin.security_group
+import neutron_plugin.subnet
+import nova_plugin.floatingip
+import nova_plugin.keypair
+import nova_plugin.security_group
+import nova_plugin.server
+import openstack_plugin_common.prefetch
+
+
+class Node(object):
+
+    def __init__(self, node_id, properties):
+        self.id = node_id
+        self.properties = dict({'use_external_resource': False,
+                                'resource_id': ''}, **properties)
+        self.runtime_properties = {}
+
+
+class Lifecycle(object):
+    """ Runs the operations one after the other. Subclasses may override
+    `run` to e.g. measure each operation """
+
+    def __init__(self, openstack_config, provider_context, deployment_id,
+                 tmpdir):
+        self.openstack_config = openstack_config
+        self.provider_context = copy.deepcopy(provider_context)
+        self.deployment_id = deployment_id
+
+        self.resource_snapshot = self._node('resource_snapshot')
+        self.network = self._node('network', network={})
+        self.subnet = self._node('subnet', subnet={'ip_version': 4,
+                                                   'cidr': '10.0.0.0/24'})
+        self.router = self._node('router', router={}, external_network='',
+                                 default_to_managers_external_network=True)
+        self.security_group = self._node(
+            'security_group', security_group={}, description='',
+            rules=[{'port': 22}, {'port': 80}],
+            disable_default_egress_rules=False)
+        self.port = self._node('port', port={}, fixed_ip='')
+        self.keypair = self._node('keypair', keypair={}, private_key_path=(
+            os.path.join(tmpdir, '{0}.pem'.format(deployment_id))))
+        self.server = self._node('server', server={}, image='ubuntu',
+                                 flavor='m1.small',
+                                 management_network_name='',
+                                 use_password=False)
+        self.floatingip = self._node('floatingip', floatingip={})
+        self.volume = self._node('volume', volume={'size': 1},
+                                 device_name='auto')
+        self.nova_floatingip = self._node('nova_floatingip', floatingip={})
+        self.nova_security_group = self._node(
+            'nova_security_group', security_group={}, description='',
+            rules=[{'port': 22}])
+
+    def install(self):
+        self.run(openstack_plugin_common.prefetch.prefetch,
+                 self.resource_snapshot)
+        self.run(neutron_plugin.network.create, self.network)
+        self.run(neutron_plugin.network.start, self.network)
+        self.provider_context['resources']['int_network'] = {
+            'id': self.network.runtime_properties['external_id'],
+            'name': self.network.runtime_properties['external_name']}
+        self.run(neutron_plugin.subnet.create, self.subnet,
+                 connected=[self.network])
+        self.run(neutron_plugin.router.create, self.router)
+        self.run(neutron_plugin.router.connect_subnet, self.subnet,
+                 self.router)
+        self.run(neutron_plugin.security_group.create, self.security_group)
+        self.run(neutron_plugin.security_group.reconcile_rules,
+                 self.security_group)
+        self.run(neutron_plugin.port.create, self.port,
+                 connected=[self.network])
+        self.run(neutron_plugin.port.connect_security_group, self.port,
+                 self.security_group)
+        self.run(nova_plugin.keypair.create, self.keypair)
+        self.run(nova_plugin.server.create, self.server,
+                 connected=[self.port, self.keypair])
+        self.run(nova_plugin.server.start, self.server,
+                 start_retry_interval=30, private_key_path='')
+        self.run(nova_plugin.server.connect_security_group, self.server,
+                 self.security_group)
+        self.run(neutron_plugin.floatingip.create, self.floatingip)
+        self.run(nova_plugin.server.connect_floatingip, self.server,
+                 self.floatingip, fixed_ip='')
+        self.run(cinder_plugin.volume.create, self.volume)
+        self.run(nova_plugin.server.attach_volume, self.volume, self.server)
+        self.run(nova_plugin.floatingip.create, self.nova_floatingip)
+        self.run(nova_plugin.security_group.create, self.nova_security_group)
+
+    def uninstall(self):
+        self.run(nova_plugin.security_group.delete, self.nova_security_group)
+        self.run(nova_plugin.floatingip.delete, self.nova_floatingip)
+        self.run(nova_plugin.server.detach_volume, self.volume, self.server)
+        self.run(cinder_plugin.volume.delete, self.volume)
+        self.run(nova_plugin.server.disconnect_floatingip, self.server,
+                 self.floatingip)
+        self.run(neutron_plugin.floatingip.connect_port, self.port,
+                 self.floatingip)
+        self.run(neutron_plugin.floatingip.disconnect_port, self.port,
+                 self.floatingip)
+        self.run(neutron_plugin.floatingip.delete, self.floatingip)
+        self.run(nova_plugin.server.disconnect_security_group, self.server,
+                 self.security_group)
+        self.run(nova_plugin.server.stop, self.server)
+        self.run(neutron_plugin.port.detach, self.server, self.port)
+        self.run(nova_plugin.server.delete, self.server)
+        self.run(nova_plugin.keypair.delete, self.keypair)
+        self.run(neutron_plugin.port.delete, self.port)
+        self.run(neutron_plugin.security_group.delete, self.security_group)
+        self.run(neutron_plugin.router.disconnect_subnet, self.subnet,
+                 self.router)
+        self.run(neutron_plugin.router.delete, self.router)
+        self.run(neutron_plugin.subnet.delete, self.subnet)
+        self.run(neutron_plugin.network.stop, self.network)
+        self.run(neutron_plugin.network.delete, self.network)
+
+    def run(self, operation, node, target=None, connected=(), **kwargs):
+        """ Runs an operation of the node, or of its relationship to the
+        target node if given """
+        name = operation_name(operation)
+        if target is None:
+            ctx = self._node_ctx(name, node, connected)
+        else:
+            ctx = self._relationship_ctx(name, node, target)
+
+        try:
+            return operation(ctx=ctx, **kwargs)
+        finally:
+            if target is None:
+                node.runtime_properties = ctx.instance.runtime_properties
+
+    def _node(self, node_id, **properties):
+        properties['openstack_config'] = self.openstack_config
+        return Node(node_id, properties)
+
+    def _node_ctx(self, name, node, connected):
+        relationships = [MockContext({'target': MockContext({
+            'instance': MockNodeInstanceContext(n.id, n.runtime_properties),
+            'node': MockNodeContext(n.id, n.properties)})})
+            for n in connected]
+        return MockCloudifyContext(
+            node_id=node.id,
+            node_name=node.id,
+            deployment_id=self.deployment_id,
+            operation={'name': name},
+            properties=node.properties,
+            runtime_properties=node.runtime_properties,
+            capabilities=ContextCapabilities(None, MockContext({
+                'relationships': relationships})),
+            provider_context=self.provider_context)
+
+    def _relationship_ctx(self, name, source, target):
+        return MockCloudifyContext(
+            deployment_id=self.deployment_id,
+            operation={'name': name},
+            source=_subject(source),
+            target=_subject(target),
+            provider_context=self.provider_context)
+
+
+def operation_name(operation):
+    return '{0}.{1}'.format(operation.__module__, operation.__name__)
+
+
+def _subject(node):
+    return MockContext({
+        'node': MockNodeContext(node.id, node.properties),
+        'instance': MockNodeInstanceContext(node.id,
+                                            node.runtime_properties)})
@@ -0,0 +1,308 @@
+#########
+# Copyright (c) 2014 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+
+"""
+Runs the lifecycle operations of the plugin's node and relationship types
+against a fake OpenStack cloud, verifying that no operation makes more
+OpenStack API calls than its budget.
+"""
+
+import collections
+import difflib
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+from openstack_plugin_common import Config
+from openstack_plugin_common.tests.fake_cloud import FakeCloud
+from openstack_plugin_common.tests.lifecycle import (Lifecycle,
+                                                     operation_name)
+
+TOKEN_CALL = 'POST /identity/v2.0/tokens'
+
+# The budget of each operation is the sequence of calls it is expected to
+# make; an operation exceeds its budget when it makes more calls than that
+CALL_BUDGETS = {
+    # the listings are made in parallel, and so in any order
+    'openstack_plugin_common.prefetch.prefetch': [
+        TOKEN_CALL,
+        TOKEN_CALL,
+        'GET /network/v2.0/networks.json',
+        'GET /network/v2.0/subnets.json',
+        'GET /network/v2.0/security-groups.json',
+        'GET /compute/v2/{id}/images/detail',
+        'GET /compute/v2/{id}/flavors/detail',
+        'GET /compute/v2/{id}/os-keypairs',
+    ],
+    'neutron_plugin.network.create': [
+        TOKEN_CALL,
+        'POST /network/v2.0/networks.json',
+    ],
+    'neutron_plugin.network.start': [
+        TOKEN_CALL,
+        'PUT /network/v2.0/networks/{id}.json',
+    ],
+    'neutron_plugin.subnet.create': [
+        TOKEN_CALL,
+        'POST /network/v2.0/subnets.json',
+    ],
+    'neutron_plugin.router.create': [
+        TOKEN_CALL,
+        'POST /network/v2.0/routers.json',
+    ],
+    'neutron_plugin.router.connect_subnet': [
+        TOKEN_CALL,
+        'PUT /network/v2.0/routers/{id}/add_router_interface.json',
+    ],
+    'neutron_plugin.security_group.create': [
+        TOKEN_CALL,
+        'POST /network/v2.0/security-groups.json',
+        'POST /network/v2.0/security-group-rules.json',
+    ],
+    'neutron_plugin.security_group.reconcile_rules': [
+        TOKEN_CALL,
+        'GET /network/v2.0/security-group-rules.json',
+    ],
+    'neutron_plugin.port.create': [
+        TOKEN_CALL,
+        'POST /network/v2.0/ports.json',
+    ],
+    'neutron_plugin.port.connect_security_group': [
+        TOKEN_CALL,
+        'GET /network/v2.0/ports.json',
+        'PUT /network/v2.0/ports/{id}.json',
+    ],
+    'nova_plugin.keypair.create': [
+        TOKEN_CALL,
+        'POST /compute/v2/{id}/os-keypairs',
+    ],
+    'nova_plugin.server.create': [
+        TOKEN_CALL,
+        'GET /network/v2.0/ports/{id}.json',
+        TOKEN_CALL,
+        'POST /compute/v2/{id}/servers',
+    ],
+    'nova_plugin.server.start': [
+        TOKEN_CALL,
+        'GET /compute/v2/{id}/servers/{id}',
+    ],
+    'nova_plugin.server.connect_security_group': [
+        TOKEN_CALL,
+        'GET /compute/v2/{id}/servers/{id}',
+        'POST /compute/v2/{id}/servers/{id}/action',
+        'GET /compute/v2/{id}/servers/{id}',
+        'GET /compute/v2/{id}/servers/{id}/os-security-groups',
+    ],
+    'neutron_plugin.floatingip.create': [
+        TOKEN_CALL,
+        'POST /network/v2.0/floatingips.json',
+    ],
+    'nova_plugin.server.connect_floatingip': [
+        TOKEN_CALL,
+        'GET /compute/v2/{id}/servers/{id}',
+        'POST /compute/v2/{id}/servers/{id}/action',
+    ],
+    'cinder_plugin.volume.create': [
+        TOKEN_CALL,
+        'POST /volume/v1/{id}/volumes',
+        'GET /volume/v1/{id}/volumes/{id}',
+    ],
+    'nova_plugin.server.attach_volume': [
+        TOKEN_CALL,
+        'POST /compute/v2/{id}/servers/{id}/os-volume_attachments',
+        TOKEN_CALL,
+        'GET /volume/v1/{id}/volumes/{id}',
+        'GET /volume/v1/{id}/volumes/{id}',
+    ],
+    'nova_plugin.floatingip.create': [
+        TOKEN_CALL,
+        'POST /compute/v2/{id}/os-floating-ips',
+    ],
+    'nova_plugin.security_group.create': [
+        TOKEN_CALL,
+        'POST /compute/v2/{id}/os-security-groups',
+        'POST /compute/v2/{id}/os-security-group-rules',
+    ],
+    'nova_plugin.security_group.delete': [
+        TOKEN_CALL,
+        'DELETE /compute/v2/{id}/os-security-groups/{id}',
+    ],
+    'nova_plugin.floatingip.delete': [
+        TOKEN_CALL,
+        'DELETE /compute/v2/{id}/os-floating-ips/{id}',
+    ],
+    'nova_plugin.server.detach_volume': [
+        TOKEN_CALL,
+        'GET /volume/v1/{id}/volumes/{id}',
+        TOKEN_CALL,
+        'DELETE /compute/v2/{id}/servers/{id}/os-volume_attachments/{id}',
+        'GET /volume/v1/{id}/volumes/{id}',
+    ],
+    'cinder_plugin.volume.delete': [
+        TOKEN_CALL,
+        'DELETE /volume/v1/{id}/volumes/{id}',
+    ],
+    'nova_plugin.server.disconnect_floatingip': [
+        TOKEN_CALL,
+        'GET /compute/v2/{id}/servers/{id}',
+        'POST /compute/v2/{id}/servers/{id}/action',
+    ],
+    'neutron_plugin.floatingip.connect_port': [
+        TOKEN_CALL,
+        'PUT /network/v2.0/floatingips/{id}.json',
+    ],
+    'neutron_plugin.floatingip.disconnect_port': [
+        TOKEN_CALL,
+        'PUT /network/v2.0/floatingips/{id}.json',
+    ],
+    'neutron_plugin.floatingip.delete': [
+        TOKEN_CALL,
+        'DELETE /network/v2.0/floatingips/{id}.json',
+    ],
+    'nova_plugin.server.disconnect_security_group': [
+        TOKEN_CALL,
+        'GET /compute/v2/{id}/servers/{id}',
+        'POST /compute/v2/{id}/servers/{id}/action',
+        'GET /compute/v2/{id}/servers/{id}',
+        'GET /compute/v2/{id}/servers/{id}/os-security-groups',
+    ],
+    'nova_plugin.server.stop': [
+        TOKEN_CALL,
+        'GET /compute/v2/{id}/servers/{id}',
+        'POST /compute/v2/{id}/servers/{id}/action',
+    ],
+    'neutron_plugin.port.detach': [
+        TOKEN_CALL,
+        'GET /network/v2.0/floatingips.json',
+        'PUT /network/v2.0/ports/{id}.json',
+    ],
+    'nova_plugin.server.delete': [
+        TOKEN_CALL,
+        'GET /compute/v2/{id}/servers/{id}',
+        'DELETE /compute/v2/{id}/servers/{id}',
+        'GET /compute/v2/{id}/servers/{id}',
+    ],
+    'nova_plugin.keypair.delete': [
+        TOKEN_CALL,
+        'DELETE /compute/v2/{id}/os-keypairs/keypair_deployment_keypair',
+    ],
+    'neutron_plugin.port.delete': [
+        TOKEN_CALL,
+        'DELETE /network/v2.0/ports/{id}.json',
+    ],
+    'neutron_plugin.security_group.delete': [
+        TOKEN_CALL,
+        'DELETE /network/v2.0/security-groups/{id}.json',
+    ],
+    'neutron_plugin.router.disconnect_subnet': [
+        TOKEN_CALL,
+        'PUT /network/v2.0/routers/{id}/remove_router_interface.json',
+    ],
+    'neutron_plugin.router.delete': [
+        TOKEN_CALL,
+        'DELETE /network/v2.0/routers/{id}.json',
+    ],
+    'neutron_plugin.subnet.delete': [
+        TOKEN_CALL,
+        'DELETE /network/v2.0/subnets/{id}.json',
+    ],
+    'neutron_plugin.network.stop': [
+        TOKEN_CALL,
+        'PUT /network/v2.0/networks/{id}.json',
+    ],
+    'neutron_plugin.network.delete': [
+        TOKEN_CALL,
+        'DELETE /network/v2.0/networks/{id}.json',
+    ],
+}
+
+
+class TestApiCallBudgets(unittest.TestCase):
+
+    def setUp(self):
+        self.cloud = FakeCloud()
+        self.ext_network = self.cloud.add('network', name='ext-net', **{
+            'router:external': True})
+        self.provider_context = {'resources': {
+            'ext_network': {'id': self.ext_network['id'],
+                            'name': self.ext_network['name']}}}
+        self.calls = collections.OrderedDict()
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+
+        # only the nodes' openstack_config should point at the fake cloud
+        environ = dict((k, v) for k, v in os.environ.iteritems()
+                       if not k.startswith('OS_'))
+        environ[Config.OPENSTACK_CONFIG_PATH_ENV_VAR] = os.path.join(
+            self.tmpdir, 'openstack_config.json')
+        environ_patch = mock.patch.dict(os.environ, environ, clear=True)
+        environ_patch.start()
+        self.addCleanup(environ_patch.stop)
+
+    def test_lifecycle_operations_within_budget(self):
+        lifecycle = _BudgetedLifecycle(
+            self.calls, self.cloud, self.provider_context, self.tmpdir)
+        with self.cloud.patch_requests():
+            lifecycle.install()
+            lifecycle.uninstall()
+
+        self.assertEquals(sorted(CALL_BUDGETS), sorted(self.calls),
+                          'Every operation should have a budget')
+        failures = [self._budget_failure(name, calls) for name, calls in
+                    self.calls.iteritems()
+                    if len(calls) > len(CALL_BUDGETS[name])]
+        if failures:
+            self.fail('\n\n'.join(failures))
+
+    def test_budget_failure_shows_call_sequence_diff(self):
+        calls = list(CALL_BUDGETS['neutron_plugin.port.create'])
+        calls.insert(1, 'GET /network/v2.0/networks/{id}.json')
+
+        failure = self._budget_failure('neutron_plugin.port.create', calls)
+
+        self.assertIn('neutron_plugin.port.create made 3 API calls, '
+                      'exceeding its budget of 2', failure)
+        self.assertIn('\n+GET /network/v2.0/networks/{id}.json', failure)
+
+    @staticmethod
+    def _budget_failure(name, calls):
+        diff = difflib.unified_diff(CALL_BUDGETS[name], calls,
+                                    'budget', 'actual', lineterm='')
+        return '{0} made {1} API calls, exceeding its budget of {2}:\n' \
+               '{3}'.format(name, len(calls), len(CALL_BUDGETS[name]),
+                            '\n'.join(diff))
+
+
+class _BudgetedLifecycle(Lifecycle):
+    """ Records the calls made by each operation """
+
+    def __init__(self, calls, cloud, provider_context, tmpdir):
+        # implicit loads of novaclient resources are hidden calls, and the
+        # deployment's resources are prefetched as a deployment would
+        super(_BudgetedLifecycle, self).__init__(
+            dict(cloud.openstack_config(), lazy_loading={'strict': True},
+                 resource_snapshot={'enabled': True, 'directory': tmpdir}),
+            provider_context, 'deployment', tmpdir)
+        self.calls = calls
+        self.cloud = cloud
+
+    def run(self, operation, node, target=None, connected=(), **kwargs):
+        self.cloud.pop_calls()
+        super(_BudgetedLifecycle, self).run(operation, node, target,
+                                            connected, **kwargs)
+        self.calls[operation_name(operation)] = self.cloud.pop_calls()
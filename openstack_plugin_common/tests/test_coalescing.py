@@ -0,0 +1,135 @@
+#########
+# Copyright (c) 2014 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+
+import os
+import threading
+import unittest
+
+import mock
+
+import openstack_plugin_common as common
+from openstack_plugin_common import coalescing
+from openstack_plugin_common.tests.fake_cloud import (constant_latency,
+                                                      FakeCloud)
+
+
+def _run_concurrently(function, count):
+    results = [None] * count
+
+    def run(i):
+        try:
+            results[i] = function()
+        except Exception as e:
+            results[i] = e
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+class TestSingleFlight(unittest.TestCase):
+
+    def setUp(self):
+        self.single_flight = coalescing.SingleFlight()
+        self.release = threading.Event()
+        self.calls = 0
+
+    def _call(self, outcome):
+        self.calls += 1
+        self.release.wait()
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    def _do_concurrently(self, outcome, count=5):
+        def do():
+            return self.single_flight.do('key',
+                                         lambda: self._call(outcome))
+        threading.Timer(0.1, self.release.set).start()
+        return _run_concurrently(do, count)
+
+    def test_concurrent_calls_share_result(self):
+        results = self._do_concurrently('result')
+
+        self.assertEquals(1, self.calls)
+        self.assertEquals([('result', True)] * 5, results)
+
+    def test_concurrent_calls_share_error(self):
+        error = ValueError('failed')
+        results = self._do_concurrently(error)
+
+        self.assertEquals(1, self.calls)
+        self.assertEquals([error] * 5, results)
+
+    def test_sequential_calls_not_shared(self):
+        self.release.set()
+        self.assertEquals(('result', False),
+                          self.single_flight.do('key', lambda: 'result'))
+        self.assertEquals(('result', False),
+                          self.single_flight.do('key', lambda: 'result'))
+        self.assertEquals({}, self.single_flight._calls)
+
+
+class TestCoalesce(unittest.TestCase):
+
+    def setUp(self):
+        self.cloud = FakeCloud()
+        self.network = self.cloud.add('network', name='net')
+        environ_patch = mock.patch.dict(os.environ, {}, clear=True)
+        environ_patch.start()
+        self.addCleanup(environ_patch.stop)
+
+    def _clients(self, count, **config):
+        clients = [common.NeutronClient().get(
+            config=dict(self.cloud.openstack_config(), **config))
+            for _ in range(count)]
+        for client in clients:
+            client.list_networks()
+        self.cloud.latency = constant_latency(0.1)
+        self.cloud.pop_calls()
+        return iter(clients)
+
+    def test_identical_reads_coalesced(self):
+        with self.cloud.patch_requests():
+            clients = self._clients(5, request_coalescing={'enabled': True})
+            networks = _run_concurrently(
+                lambda: next(clients).show_network(self.network['id']), 5)
+
+        self.assertEquals(['GET /network/v2.0/networks/{id}.json'],
+                          self.cloud.calls)
+        self.assertEquals([{'network': self.network}] * 5, networks)
+        # every caller has a body of its own
+        self.assertEquals(5, len(set(id(n['network']) for n in networks)))
+
+    def test_writes_not_coalesced(self):
+        with self.cloud.patch_requests():
+            clients = self._clients(3, request_coalescing={'enabled': True})
+            _run_concurrently(lambda: next(clients).create_network(
+                {'network': {'name': 'net'}}), 3)
+
+        self.assertEquals(['POST /network/v2.0/networks.json'] * 3,
+                          self.cloud.calls)
+
+    def test_disabled_by_default(self):
+        with self.cloud.patch_requests():
+            clients = self._clients(3)
+            _run_concurrently(
+                lambda: next(clients).show_network(self.network['id']), 3)
+
+        self.assertEquals(['GET /network/v2.0/networks/{id}.json'] * 3,
+                          self.cloud.calls)
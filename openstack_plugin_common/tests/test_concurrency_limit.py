@@ -0,0 +1,177 @@
+#########
+# Copyright (c) 2014 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+
+import os
+import threading
+import time
+import unittest
+
+import mock
+import requests
+
+import openstack_plugin_common as common
+from openstack_plugin_common import concurrency_limit
+from openstack_plugin_common import metrics
+from openstack_plugin_common.tests.fake_cloud import FakeCloud
+
+NEUTRON_URL = 'http://neutron:9696/v2.0/ports.json'
+
+
+class _HTTPClient(object):
+
+    def __init__(self, side_effect):
+        self.request = mock.Mock(side_effect=side_effect)
+        self.request.__name__ = 'request'
+
+
+def _response(status_code):
+    response = requests.Response()
+    response.status_code = status_code
+    return response
+
+
+class TestAIMDLimiter(unittest.TestCase):
+
+    def test_additive_increase(self):
+        limiter = concurrency_limit.AIMDLimiter(initial=2, maximum=3)
+        for _ in range(2):
+            started = [limiter.acquire(), limiter.acquire()]
+            for start in started:
+                limiter.release(start, overloaded=False)
+        self.assertEquals(3, int(limiter.limit))
+
+        for _ in range(10):
+            started = [limiter.acquire() for _ in range(3)]
+            for start in started:
+                limiter.release(start, overloaded=False)
+        self.assertEquals(3, limiter.limit)
+
+    def test_not_increased_below_limit(self):
+        limiter = concurrency_limit.AIMDLimiter(initial=4)
+        for _ in range(10):
+            limiter.release(limiter.acquire(), overloaded=False)
+        self.assertEquals(4, limiter.limit)
+
+    def test_multiplicative_decrease_once_per_burst(self):
+        limiter = concurrency_limit.AIMDLimiter(initial=8, minimum=3)
+        started = [limiter.acquire() for _ in range(8)]
+        for start in started:
+            limiter.release(start, overloaded=True)
+        self.assertEquals(4, limiter.limit)
+
+        limiter.release(limiter.acquire(), overloaded=True)
+        self.assertEquals(3, limiter.limit)
+
+    def test_acquire_waits_for_free_slot(self):
+        limiter = concurrency_limit.AIMDLimiter(initial=1)
+        started = limiter.acquire()
+        acquired = threading.Event()
+
+        def acquire():
+            limiter.acquire()
+            acquired.set()
+
+        thread = threading.Thread(target=acquire)
+        thread.start()
+        self.assertFalse(acquired.wait(0.05))
+        limiter.release(started, overloaded=False)
+        self.assertTrue(acquired.wait(1))
+        thread.join()
+
+
+class TestLimit(unittest.TestCase):
+
+    def setUp(self):
+        self.addCleanup(concurrency_limit._limiters.clear)
+
+    def _limit(self, side_effect, **config):
+        self.http_client = _HTTPClient(side_effect)
+        concurrency_limit.limit(self.http_client, 'neutron',
+                                dict(config, enabled=True))
+
+    def test_disabled(self):
+        http_client = _HTTPClient(None)
+        request = http_client.request
+        concurrency_limit.limit(http_client, 'neutron', {'initial': 2})
+        self.assertIs(request, http_client.request)
+
+    def test_overload_decreases_limit_gauge(self):
+        self._limit([(_response(200), None), (_response(503), None)],
+                    initial=4)
+
+        with metrics.collect(None):
+            operation_metrics = metrics._local.metrics
+            self.http_client.request(NEUTRON_URL, 'GET')
+            self.http_client.request(NEUTRON_URL, 'GET')
+
+        self.assertEquals([{
+            'name': concurrency_limit.LIMIT_GAUGE,
+            'labels': {'service': 'neutron', 'endpoint': 'neutron:9696'},
+            'value': 2.0}], operation_metrics.gauges())
+
+    def test_timeout_decreases_limit(self):
+        self._limit(requests.exceptions.ReadTimeout('read timed out'),
+                    initial=4)
+
+        self.assertRaises(requests.exceptions.ReadTimeout,
+                          self.http_client.request, NEUTRON_URL, 'GET')
+
+        limiter, = concurrency_limit._limiters.values()
+        self.assertEquals(2, limiter.limit)
+        self.assertEquals(0, limiter.in_flight)
+
+    def test_slow_response_decreases_limit(self):
+        self._limit(lambda *args: time.sleep(0.02) or (_response(200), None),
+                    initial=4, latency_target=0.01)
+
+        self.http_client.request(NEUTRON_URL, 'GET')
+
+        limiter, = concurrency_limit._limiters.values()
+        self.assertEquals(2, limiter.limit)
+
+    def test_wait_for_free_slot_not_counted_as_latency(self):
+        self._limit(lambda *args: time.sleep(0.1) or (_response(200), None),
+                    initial=2, max=2, latency_target=0.15)
+
+        # half of the requests wait for the others' slots, responding after
+        # more than latency_target
+        threads = [threading.Thread(target=self.http_client.request,
+                                    args=(NEUTRON_URL, 'GET'))
+                   for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        limiter, = concurrency_limit._limiters.values()
+        self.assertEquals(2, limiter.limit)
+
+    def test_nova_over_limit(self):
+        cloud = FakeCloud()
+        cloud.inject_fault(413, 'GET', count=1)
+        config = dict(cloud.openstack_config(),
+                      concurrency_limit={'enabled': True, 'initial': 4})
+
+        with cloud.patch_requests(), \
+                mock.patch.dict(os.environ, {}, clear=True):
+            nova_client = common.NovaClient().get(config=config)
+            self.assertRaises(common.nova_exceptions.OverLimit,
+                              nova_client.flavors.list)
+            nova_client.flavors.list()
+
+        limiter, = [limiter for key, limiter in
+                    concurrency_limit._limiters.iteritems()
+                    if key[0] == 'nova']
+        self.assertEquals(2, limiter.limit)
@@ -0,0 +1,95 @@
+#########
+# Copyright (c) 2014 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+import openstack_plugin_common as common
+from openstack_plugin_common import connection_pool
+from openstack_plugin_common.tests.fake_cloud import (FakeCloud,
+                                                      FakeCloudServer)
+
+
+class TestConnectionPool(unittest.TestCase):
+
+    def setUp(self):
+        self.cloud = FakeCloud()
+        self.server = FakeCloudServer(self.cloud).start()
+        self.addCleanup(self.server.stop)
+        # closes the pool's connections before the server stops
+        self.addCleanup(connection_pool.reset)
+        connection_pool.reset()
+
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        environ = dict((k, v) for k, v in os.environ.iteritems()
+                       if not k.startswith('OS_'))
+        environ[common.Config.OPENSTACK_CONFIG_PATH_ENV_VAR] = os.path.join(
+            tmpdir, 'openstack_config.json')
+        environ_patch = mock.patch.dict(os.environ, environ, clear=True)
+        environ_patch.start()
+        self.addCleanup(environ_patch.stop)
+
+    def _operation(self, **config):
+        config = dict(self.cloud.openstack_config(), **config)
+        common.NovaClient().get(config=config).flavors.list(detailed=False)
+        common.NeutronClient().get(config=config).list_networks()
+        common.CinderClient().get(config=config).volumes.list()
+
+    def test_clients_of_operations_share_connections(self):
+        for _ in range(5):
+            self._operation(connection_pool={'enabled': True})
+
+        self.assertEquals(30, len(self.cloud.calls))
+        self.assertEquals(1, self.server.connections)
+
+    def test_disabled_by_default(self):
+        for _ in range(2):
+            self._operation()
+
+        self.assertEquals(12, len(self.cloud.calls))
+        # at least a connection per client
+        self.assertGreaterEqual(self.server.connections, 6)
+
+    def test_disabled_after_enabled(self):
+        self._operation(connection_pool={'enabled': True})
+        connections = self.server.connections
+        self._operation()
+
+        self.assertGreaterEqual(self.server.connections - connections, 3)
+
+    def test_library_modules_untouched(self):
+        import cinderclient.client
+        import neutronclient.client
+        import requests
+        self._operation(connection_pool={'enabled': True})
+
+        self.assertIs(requests, neutronclient.client.requests)
+        self.assertIs(requests, cinderclient.client.requests)
+
+    def test_clients_verifying_differently_not_shared(self):
+        verifying = common.NeutronClient().get(config=dict(
+            self.cloud.openstack_config(), connection_pool={'enabled': True}))
+        not_verifying = common.NeutronClient().get(config=dict(
+            self.cloud.openstack_config(), connection_pool={'enabled': True},
+            custom_configuration={'neutron_client': {'insecure': True}}))
+        verifying.list_networks()
+        not_verifying.list_networks()
+
+        self.assertEquals(2, self.server.connections)
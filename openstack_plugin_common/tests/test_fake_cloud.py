@@ -0,0 +1,127 @@
+#########
+# Copyright (c) 2014 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+
+import time
+import unittest
+
+from neutronclient.common import exceptions as neutron_exceptions
+from novaclient import exceptions as nova_exceptions
+
+from openstack_plugin_common import (NeutronClientWithSugar,
+                                     NovaClientWithSugar)
+from openstack_plugin_common.tests.fake_cloud import (constant_latency,
+                                                      FakeCloud,
+                                                      FakeCloudServer)
+
+
+def _neutron_client(cloud):
+    config = cloud.openstack_config()
+    return NeutronClientWithSugar(
+        username=config['username'], password=config['password'],
+        tenant_name=config['tenant_name'], auth_url=config['auth_url'],
+        region_name='')
+
+
+def _nova_client(cloud):
+    config = cloud.openstack_config()
+    return NovaClientWithSugar(
+        username=config['username'], api_key=config['password'],
+        project_id=config['tenant_name'], auth_url=config['auth_url'],
+        region_name='')
+
+
+class TestFakeCloud(unittest.TestCase):
+
+    def test_served_over_http(self):
+        cloud = FakeCloud()
+        server = FakeCloudServer(cloud).start()
+        self.addCleanup(server.stop)
+
+        neutron_client = _neutron_client(cloud)
+        network = neutron_client.create_network(
+            {'network': {'name': 'net'}})['network']
+
+        self.assertEquals(
+            [network['id']],
+            [n['id'] for n in neutron_client.list_networks()['networks']])
+        self.assertEquals(['POST /identity/v2.0/tokens',
+                           'POST /network/v2.0/networks.json',
+                           'GET /network/v2.0/networks.json'],
+                          cloud.calls)
+
+    def test_lists_paginated(self):
+        cloud = FakeCloud(max_limit=2)
+        for i in range(5):
+            cloud.add('network', name='net-{0}'.format(i))
+
+        with cloud.patch_requests():
+            networks = _neutron_client(cloud).list_networks()['networks']
+
+        self.assertEquals(['net-{0}'.format(i) for i in range(5)],
+                          [n['name'] for n in networks])
+        self.assertEquals(3, cloud.calls.count(
+            'GET /network/v2.0/networks.json'))
+
+    def test_latency(self):
+        cloud = FakeCloud(latency=constant_latency(0.05))
+        with cloud.patch_requests():
+            start = time.time()
+            _neutron_client(cloud).list_networks()
+        # the token request and the list request
+        self.assertGreaterEqual(time.time() - start, 0.1)
+
+    def test_injected_over_limit_fault(self):
+        cloud = FakeCloud()
+        cloud.inject_fault(413, 'GET', '/flavors$', count=1, retry_after=3)
+
+        with cloud.patch_requests():
+            nova_client = _nova_client(cloud)
+            try:
+                nova_client.flavors.list(detailed=False)
+                self.fail('The injected fault should have been raised')
+            except nova_exceptions.OverLimit as e:
+                self.assertEquals(3, e.retry_after)
+            self.assertEquals(2, len(nova_client.flavors.list(
+                detailed=False)))
+
+    def test_quota_exceeded(self):
+        cloud = FakeCloud(quotas={'port': 1})
+        network = cloud.add('network', name='net')
+
+        with cloud.patch_requests():
+            neutron_client = _neutron_client(cloud)
+            port = {'port': {'network_id': network['id']}}
+            neutron_client.create_port(port)
+            self.assertRaises(neutron_exceptions.OverQuotaClient,
+                              neutron_client.create_port, port)
+
+    def test_server_state_transitions(self):
+        cloud = FakeCloud(transition_time=0.2)
+
+        with cloud.patch_requests():
+            nova_client = _nova_client(cloud)
+            image, flavor = nova_client.images.list()[0], \
+                nova_client.flavors.list()[0]
+            server = nova_client.servers.create('server', image, flavor)
+            self.assertEquals('BUILD', nova_client.servers.get(
+                server.id).status)
+            time.sleep(0.2)
+            self.assertEquals('ACTIVE', nova_client.servers.get(
+                server.id).status)
+
+            nova_client.servers.delete(server.id)
+            self.assertEquals(1, len(nova_client.servers.list()))
+            time.sleep(0.2)
+            self.assertEquals([], nova_client.servers.list())
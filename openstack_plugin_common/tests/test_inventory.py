@@ -0,0 +1,181 @@
+#########
+# Copyright (c) 2014 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import mock
+from novaclient import exceptions as nova_exceptions
+
+import openstack_plugin_common as common
+from openstack_plugin_common import inventory
+from openstack_plugin_common.tests.fake_cloud import FakeCloud, IMAGES
+
+TOKEN_CALL = 'POST /identity/v2.0/tokens'
+SERVERS_LIST = 'GET /compute/v2/{id}/servers'
+SERVERS_DETAIL = 'GET /compute/v2/{id}/servers/detail'
+SERVER_GET = 'GET /compute/v2/{id}/servers/{id}'
+VOLUMES_DETAIL = 'GET /volume/v1/{id}/volumes/detail'
+
+
+class TestInventory(unittest.TestCase):
+
+    def setUp(self):
+        self.cloud = FakeCloud()
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        environ = dict((k, v) for k, v in os.environ.iteritems()
+                       if not k.startswith('OS_'))
+        environ[common.Config.OPENSTACK_CONFIG_PATH_ENV_VAR] = os.path.join(
+            tmpdir, 'openstack_config.json')
+        environ_patch = mock.patch.dict(os.environ, environ, clear=True)
+        environ_patch.start()
+        self.addCleanup(environ_patch.stop)
+        requests_patch = self.cloud.patch_requests()
+        requests_patch.__enter__()
+        self.addCleanup(requests_patch.__exit__, None, None, None)
+        self.addCleanup(inventory.reset)
+
+    def _client(self, client_class, **inventory_cache_config):
+        return client_class().get(config=dict(
+            self.cloud.openstack_config(),
+            inventory_cache=inventory_cache_config))
+
+    def _calls(self):
+        return [call for call in self.cloud.pop_calls()
+                if call != TOKEN_CALL]
+
+    def _create_servers(self, nova_client, *names):
+        servers = [nova_client.servers.create(name, IMAGES[0]['id'], '1')
+                   for name in names]
+        self.cloud.pop_calls()
+        return servers
+
+    def test_servers_listed_once_within_max_staleness(self):
+        nova_client = self._client(common.NovaClient, enabled=True,
+                                   max_staleness=60)
+        web, db = self._create_servers(nova_client, 'web', 'db')
+
+        self.assertEquals(web.id,
+                          nova_client.cosmo_get('server', name='web').id)
+        self.assertEquals([SERVERS_DETAIL], self._calls())
+
+        other_client = self._client(common.NovaClient, enabled=True,
+                                    max_staleness=60)
+        server = other_client.cosmo_get_by_id('server', db.id)
+        self.assertEquals(('db', 'ACTIVE'), (server.name, server.status))
+        self.assertEquals([], self._calls())
+
+    def test_servers_listed_by_changes_since(self):
+        nova_client = self._client(common.NovaClient, enabled=True,
+                                   max_staleness=0)
+        web, db = self._create_servers(nova_client, 'web', 'db')
+        nova_client.cosmo_get_by_id('server', web.id)
+        self.assertEquals([SERVERS_DETAIL], self._calls())
+
+        app, = self._create_servers(nova_client, 'app')
+        nova_client.servers.delete(web)
+        with mock.patch.object(nova_client.servers, 'list',
+                               wraps=nova_client.servers.list) as list_mock:
+            server = nova_client.cosmo_get_by_id('server', app.id)
+
+        self.assertEquals('app', server.name)
+        self.assertIn('changes-since', list_mock.call_args[1]['search_opts'])
+        self.assertEquals(['DELETE /compute/v2/{id}/servers/{id}',
+                           SERVERS_DETAIL], self._calls())
+        self.assertEquals([], nova_client.cosmo_inventory.find(
+            nova_client.servers, id=web.id))
+
+    def _backdate(self, server, seconds):
+        # as if the server's change was committed late
+        self.cloud._resources['server'][server.id].update(
+            _updated=time.time() - seconds,
+            _transition_until=time.time() - seconds)
+
+    def test_servers_changed_before_last_listing_listed(self):
+        nova_client = self._client(common.NovaClient, enabled=True,
+                                   max_staleness=0, changes_since_margin=60)
+        web, = self._create_servers(nova_client, 'web')
+        nova_client.cosmo_get_by_id('server', web.id)
+
+        db, = self._create_servers(nova_client, 'db')
+        self._backdate(db, 30)
+
+        self.assertEquals(db.id, nova_client.cosmo_inventory.find(
+            nova_client.servers, name='db')[0].id)
+        self.assertEquals([SERVERS_DETAIL], self._calls())
+
+    def test_servers_listed_in_full_every_full_sync_interval(self):
+        nova_client = self._client(common.NovaClient, enabled=True,
+                                   max_staleness=0, changes_since_margin=0,
+                                   full_sync_interval=2)
+        web, = self._create_servers(nova_client, 'web')
+        nova_client.cosmo_get_by_id('server', web.id)
+
+        db, = self._create_servers(nova_client, 'db')
+        self._backdate(db, 3600)
+
+        with mock.patch.object(nova_client.servers, 'list',
+                               wraps=nova_client.servers.list) as list_mock:
+            for _ in range(2):
+                self.assertEquals([], nova_client.cosmo_inventory.find(
+                    nova_client.servers, name='db'))
+                self.assertIn('changes-since',
+                              list_mock.call_args[1]['search_opts'])
+            self.assertEquals(db.id, nova_client.cosmo_inventory.find(
+                nova_client.servers, name='db')[0].id)
+            self.assertEquals({'detailed': True}, list_mock.call_args[1])
+
+    def test_servers_missing_from_inventory_looked_up(self):
+        nova_client = self._client(common.NovaClient, enabled=True,
+                                   max_staleness=60)
+        self.assertIsNone(nova_client.cosmo_get_if_exists('server',
+                                                          name='web'))
+        self.assertEquals([SERVERS_DETAIL, SERVERS_LIST], self._calls())
+
+        web, = self._create_servers(nova_client, 'web')
+
+        self.assertEquals(web.id,
+                          nova_client.cosmo_get_by_id('server', web.id).id)
+        self.assertEquals([SERVER_GET], self._calls())
+        self.assertRaises(nova_exceptions.NotFound,
+                          nova_client.cosmo_get_by_id, 'server', 'missing')
+
+    def test_volumes_listed_in_full(self):
+        cinder_client = self._client(common.CinderClient, enabled=True,
+                                     max_staleness=0)
+        self.cloud.add_volume(display_name='data', size=1)
+        self.assertEquals(
+            'data', cinder_client.cosmo_get('volume',
+                                            display_name='data').display_name)
+        self.assertEquals([VOLUMES_DETAIL], self._calls())
+
+        logs = self.cloud.add_volume(display_name='logs', size=1)
+
+        volume = cinder_client.cosmo_get_by_id('volume', logs['id'])
+        self.assertEquals('logs', volume.display_name)
+        self.assertEquals([VOLUMES_DETAIL], self._calls())
+
+    def test_disabled_by_default(self):
+        nova_client = common.NovaClient().get(
+            config=self.cloud.openstack_config())
+        web, = self._create_servers(nova_client, 'web')
+
+        self.assertIsNone(nova_client.cosmo_inventory)
+        nova_client.cosmo_get_by_id('server', web.id)
+        self.assertEquals([SERVER_GET], self._calls())
@@ -0,0 +1,71 @@
+#########
+# Copyright (c) 2014 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+import pkgutil
+import subprocess
+import sys
+import unittest
+
+import cinder_plugin
+import neutron_plugin
+import nova_plugin
+import openstack_plugin_common as common
+
+CHECK_SCRIPT = '''
+import sys
+{statement}
+print(' '.join(sorted(set(name.split('.')[0] for name in sys.modules
+                          if name.split('.')[0] in {libraries!r}))))
+'''
+
+
+class TestLazyImports(unittest.TestCase):
+
+    def _loaded_client_libraries(self, statement):
+        return subprocess.check_output([
+            sys.executable, '-c', CHECK_SCRIPT.format(
+                statement=statement,
+                libraries=('cinderclient', 'keystoneclient', 'neutronclient',
+                           'novaclient', 'IPy'))]).split()
+
+    def test_client_libraries_not_imported(self):
+        # by any of the plugin's modules
+        modules = []
+        for package in (common, nova_plugin, neutron_plugin, cinder_plugin):
+            modules.append(package.__name__)
+            modules.extend(package.__name__ + '.' + name for _, name, _ in
+                           pkgutil.iter_modules(package.__path__)
+                           if name != 'tests')
+        self.assertIn('nova_plugin.keypair', modules)
+        self.assertEquals([], self._loaded_client_libraries(
+            'import ' + ', '.join(modules)))
+
+    def test_only_used_client_library_imported(self):
+        loaded_libraries = self._loaded_client_libraries(
+            'from openstack_plugin_common import NeutronClientWithSugar\n'
+            'NeutronClientWithSugar(endpoint_url="http://localhost", '
+            'token="token")')
+
+        self.assertIn('neutronclient', loaded_libraries)
+        self.assertNotIn('novaclient', loaded_libraries)
+        self.assertNotIn('cinderclient', loaded_libraries)
+
+    def test_sugared_client_class(self):
+        neutron_client = common.NeutronClientWithSugar(
+            endpoint_url='http://localhost', token='token')
+
+        self.assertIsInstance(neutron_client, common.NeutronClientWithSugar)
+        self.assertIsInstance(neutron_client, common.NeutronClientSugar)
+        self.assertIsInstance(neutron_client, common.neutron_client.Client)
+        self.assertNotIsInstance(neutron_client, common.NovaClientWithSugar)
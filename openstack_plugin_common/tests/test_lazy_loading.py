@@ -0,0 +1,108 @@
+#########
+# Copyright (c) 2014 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+import openstack_plugin_common as common
+from openstack_plugin_common import lazy_loading
+from openstack_plugin_common.tests.fake_cloud import FakeCloud, IMAGES
+
+SERVER_GET = 'GET /compute/v2/{id}/servers/{id}'
+
+
+class TestLazyLoading(unittest.TestCase):
+
+    def setUp(self):
+        self.cloud = FakeCloud()
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        environ = dict((k, v) for k, v in os.environ.iteritems()
+                       if not k.startswith('OS_'))
+        environ[common.Config.OPENSTACK_CONFIG_PATH_ENV_VAR] = os.path.join(
+            tmpdir, 'openstack_config.json')
+        environ_patch = mock.patch.dict(os.environ, environ, clear=True)
+        environ_patch.start()
+        self.addCleanup(environ_patch.stop)
+        requests_patch = self.cloud.patch_requests()
+        requests_patch.__enter__()
+        self.addCleanup(requests_patch.__exit__, None, None, None)
+
+    def _create_server(self, **lazy_loading_config):
+        nova_client = common.NovaClient().get(config=dict(
+            self.cloud.openstack_config(), lazy_loading=lazy_loading_config))
+        server = nova_client.servers.create('server', IMAGES[0]['id'], '1')
+        self.cloud.pop_calls()
+        return nova_client, server
+
+    def test_implicit_load_counted(self):
+        _, server = self._create_server()
+        ctx = mock.Mock()
+
+        with lazy_loading.scope(ctx):
+            self.assertEquals('ACTIVE', server.status)
+            self.assertEquals('server', server.name)
+
+        self.assertEquals([SERVER_GET], self.cloud.pop_calls())
+        message = ctx.logger.warning.call_args[0][0]
+        self.assertRegexpMatches(
+            message, r'"{0}:\d+ \(test_implicit_load_counted\)": 1'.format(
+                __name__))
+
+    def test_strict_mode_refuses_implicit_load(self):
+        _, server = self._create_server(strict=True)
+        ctx = mock.Mock()
+
+        with lazy_loading.scope(ctx):
+            self.assertRaises(AttributeError, getattr, server, 'status')
+
+        self.assertEquals([], self.cloud.pop_calls())
+        self.assertTrue(ctx.logger.warning.called)
+
+    def test_explicit_load(self):
+        _, server = self._create_server(strict=True)
+        ctx = mock.Mock()
+
+        with lazy_loading.scope(ctx):
+            self.assertEquals('ACTIVE',
+                              lazy_loading.ensure_loaded(server).status)
+            lazy_loading.ensure_loaded(server)
+
+        self.assertEquals([SERVER_GET], self.cloud.pop_calls())
+        self.assertFalse(ctx.logger.warning.called)
+
+    def test_loaded_resources_unaffected(self):
+        nova_client, server = self._create_server(strict=True)
+        server = nova_client.servers.get(server.id)
+        ctx = mock.Mock()
+
+        with lazy_loading.scope(ctx):
+            self.assertRaises(AttributeError, getattr, server, 'missing')
+
+        self.assertFalse(ctx.logger.warning.called)
+
+    def test_disabled(self):
+        _, server = self._create_server(enabled=False, strict=True)
+        ctx = mock.Mock()
+
+        with lazy_loading.scope(ctx):
+            self.assertEquals('ACTIVE', server.status)
+
+        self.assertEquals([SERVER_GET], self.cloud.pop_calls())
+        self.assertFalse(ctx.logger.warning.called)
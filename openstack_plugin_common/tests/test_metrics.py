@@ -0,0 +1,175 @@
+#########
+# Copyright (c) 2014 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+import requests
+
+from cloudify.mocks import MockCloudifyContext
+
+import openstack_plugin_common as common
+from openstack_plugin_common import metrics
+
+SG_ID = 'b1b1a3c4-9c53-4d3a-8d6f-111111111111'
+EMPTY_SG_LIST = '{"security_groups": []}'
+
+
+def _response(status_code, content):
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = content
+    return response
+
+
+class TestMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.ctx = MockCloudifyContext(
+            node_id='sg_node_1',
+            deployment_id='dep',
+            operation={'name': 'cloudify.interfaces.lifecycle.create'},
+            properties={'openstack_config': {
+                'username': 'user',
+                'password': 'password',
+                'tenant_name': 'tenant',
+                'auth_url': 'http://localhost:5000/v2.0',
+                'neutron_url': 'http://localhost:9696',
+                'custom_configuration': {'neutron_client': {'token': 'token'}},
+                'metrics': {
+                    'enabled': True,
+                    'prometheus_file': os.path.join(
+                        self.tmp_dir, '{node_instance_id}.prom')
+                }
+            }})
+        self.ctx._mock_context_logger = mock.Mock()
+
+    def test_url_template(self):
+        self.assertEquals(
+            '/v2.0/security-groups/{id}.json',
+            metrics.url_template('http://localhost:9696/v2.0/security-groups/'
+                                 '{0}.json?fields=id'.format(SG_ID)))
+        self.assertEquals(
+            '/v2/{id}/servers/{id}/action',
+            metrics.url_template('/v2/0123456789abcdef0123456789abcdef/'
+                                 'servers/{0}/action'.format(SG_ID)))
+        self.assertEquals('/v2/{id}/flavors/detail',
+                          metrics.url_template('/v2/42/flavors/detail'))
+
+    def test_operation_calls_reported(self):
+        responses = [_response(200, EMPTY_SG_LIST),
+                     _response(200, EMPTY_SG_LIST),
+                     _response(404, '{"NeutronError": "not found"}')]
+
+        @common.with_neutron_client
+        def operation(neutron_client, **kwargs):
+            neutron_client.list_security_groups()
+            neutron_client.list_security_groups()
+            neutron_client.show_security_group(SG_ID)
+
+        with mock.patch('neutronclient.client.requests.request',
+                        side_effect=responses):
+            self.assertRaises(Exception, operation, ctx=self.ctx)
+
+        summary_line = self.ctx._mock_context_logger.info.call_args[0][0]
+        summary = json.loads(summary_line[summary_line.index('{'):])
+        self.assertEquals('sg_node_1', summary['node_instance_id'])
+        calls = dict(((call['url'], call['status']), call)
+                     for call in summary['calls'])
+        self.assertEquals(2, calls[('/v2.0/security-groups.json',
+                                    '200')]['count'])
+        self.assertEquals(46, calls[('/v2.0/security-groups.json',
+                                     '200')]['bytes'])
+        self.assertEquals(1, calls[('/v2.0/security-groups/{id}.json',
+                                    '404')]['count'])
+
+        with open(os.path.join(self.tmp_dir, 'sg_node_1.prom')) as f:
+            prometheus_text = f.read()
+        self.assertIn(
+            'openstack_api_request_duration_seconds_count{'
+            'deployment_id="dep",method="GET",'
+            'node_instance_id="sg_node_1",'
+            'operation="cloudify.interfaces.lifecycle.create",'
+            'service="neutron",status="200",'
+            'url="/v2.0/security-groups.json"} 2', prometheus_text)
+        self.assertIn('le="+Inf"', prometheus_text)
+
+    def test_disabled(self):
+        openstack_config = self.ctx.node.properties['openstack_config']
+        del openstack_config['metrics']
+
+        @common.with_neutron_client
+        def operation(neutron_client, **kwargs):
+            self.assertNotIn('request', vars(neutron_client.httpclient))
+            neutron_client.list_security_groups()
+
+        with mock.patch('neutronclient.client.requests.request',
+                        return_value=_response(200, EMPTY_SG_LIST)):
+            operation(ctx=self.ctx)
+
+        self.assertFalse(self.ctx._mock_context_logger.info.called)
+
+    def test_nested_operations_reported_once(self):
+        @common.with_neutron_client
+        def list_security_groups(neutron_client, **kwargs):
+            neutron_client.list_security_groups()
+
+        @common.with_nova_client
+        def operation(nova_client, **kwargs):
+            list_security_groups(ctx=kwargs['ctx'])
+            list_security_groups(ctx=kwargs['ctx'])
+
+        with mock.patch('neutronclient.client.requests.request',
+                        return_value=_response(200, EMPTY_SG_LIST)):
+            operation(ctx=self.ctx, nova_client=mock.Mock())
+
+        self.assertEquals(1, self.ctx._mock_context_logger.info.call_count)
+        summary_line = self.ctx._mock_context_logger.info.call_args[0][0]
+        self.assertIn('"count": 2', summary_line)
+
+    def test_latency_histogram(self):
+        operation_metrics = metrics.OperationMetrics()
+        operation_metrics.record('neutron', 'get', '/v2.0/networks.json',
+                                 200, 10, 0.02)
+        operation_metrics.record('neutron', 'get', '/v2.0/networks.json',
+                                 200, 10, 3)
+        operation_metrics.record('neutron', 'get', '/v2.0/networks.json',
+                                 200, 10, 30)
+
+        call, = operation_metrics.summary()
+        self.assertEquals([0, 1, 0, 0, 0, 0, 0, 0, 1, 0, 1],
+                          call['latency_buckets'])
+        self.assertEquals(30, call['bytes'])
+        self.assertEquals(30, call['latency_max'])
+
+    def test_gauges(self):
+        operation_metrics = metrics.OperationMetrics()
+        operation_metrics.set_gauge('openstack_api_concurrency_limit',
+                                    {'service': 'nova'}, 4.0)
+        operation_metrics.set_gauge('openstack_api_concurrency_limit',
+                                    {'service': 'nova'}, 2.0)
+
+        self.assertEquals([{'name': 'openstack_api_concurrency_limit',
+                            'labels': {'service': 'nova'}, 'value': 2.0}],
+                          operation_metrics.gauges())
+        self.assertIn('# TYPE openstack_api_concurrency_limit gauge\n'
+                      'openstack_api_concurrency_limit{operation="op",'
+                      'service="nova"} 2.0\n',
+                      operation_metrics.prometheus_text({'operation': 'op'}))
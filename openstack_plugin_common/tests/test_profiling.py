@@ -0,0 +1,171 @@
+#########
+# Copyright (c) 2014 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+import errno
+import os
+import shutil
+import StringIO
+import tempfile
+import unittest
+
+import mock
+
+from cloudify.exceptions import NonRecoverableError
+from cloudify.mocks import MockCloudifyContext
+
+import openstack_plugin_common as common
+from openstack_plugin_common import profiling
+
+
+def _hotspot():
+    return sum(i * i for i in range(10000))
+
+
+@common.with_neutron_client
+def _operation(neutron_client, **kwargs):
+    _hotspot()
+
+
+class TestProfiling(unittest.TestCase):
+
+    def setUp(self):
+        self.profiles_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.profiles_dir)
+
+    def _get_mock_ctx(self, profiling_config=None):
+        return MockCloudifyContext(
+            node_id='server_1',
+            deployment_id='dep',
+            operation={'name': 'cloudify.interfaces.lifecycle.create'},
+            properties={'openstack_config': {
+                profiling.PROFILING_CONFIG_KEY: profiling_config or {}}})
+
+    def _profiles(self):
+        return sorted(os.listdir(self.profiles_dir))
+
+    def test_disabled(self):
+        with mock.patch.dict(os.environ, {profiling.PROFILE_DIR_ENV_VAR: ''}):
+            _operation(ctx=self._get_mock_ctx(), neutron_client=mock.Mock())
+
+        self.assertEquals([], self._profiles())
+
+    def test_enabled_by_config(self):
+        _operation(ctx=self._get_mock_ctx({
+            'enabled': True, 'directory': self.profiles_dir}),
+            neutron_client=mock.Mock())
+
+        profile, = self._profiles()
+        self.assertTrue(profile.startswith(
+            'dep.server_1.cloudify.interfaces.lifecycle.create.'))
+        self.assertTrue(profile.endswith('.prof'))
+
+    def test_enabled_by_env_var(self):
+        with mock.patch.dict(os.environ, {
+                profiling.PROFILE_DIR_ENV_VAR: self.profiles_dir}):
+            _operation(ctx=self._get_mock_ctx(), neutron_client=mock.Mock())
+
+        self.assertEquals(1, len(self._profiles()))
+
+    def test_directory_created_private(self):
+        directory = os.path.join(self.profiles_dir, 'profiles')
+
+        _operation(ctx=self._get_mock_ctx({
+            'enabled': True, 'directory': directory}),
+            neutron_client=mock.Mock())
+
+        self.assertEquals(0o700, os.stat(directory).st_mode & 0o777)
+        self.assertEquals(1, len(os.listdir(directory)))
+
+    def test_directory_writable_by_others_not_used(self):
+        os.chmod(self.profiles_dir, 0o777)
+        ctx = self._get_mock_ctx({'enabled': True,
+                                  'directory': self.profiles_dir})
+
+        with mock.patch.object(ctx.logger, 'warning') as warning:
+            _operation(ctx=ctx, neutron_client=mock.Mock())
+
+        self.assertTrue(warning.called)
+        self.assertEquals([], self._profiles())
+
+    def test_directory_of_other_user_not_used(self):
+        ctx = self._get_mock_ctx({'enabled': True,
+                                  'directory': self.profiles_dir})
+
+        with mock.patch('os.getuid', return_value=os.getuid() + 1):
+            _operation(ctx=ctx, neutron_client=mock.Mock())
+
+        self.assertEquals([], self._profiles())
+
+    def test_max_files_below_one(self):
+        ctx = self._get_mock_ctx({'enabled': True,
+                                  'directory': self.profiles_dir,
+                                  'max_files': 0})
+
+        self.assertRaises(NonRecoverableError, _operation, ctx=ctx,
+                          neutron_client=mock.Mock())
+        self.assertEquals([], self._profiles())
+
+    def test_rotation(self):
+        ctx = self._get_mock_ctx({'enabled': True,
+                                  'directory': self.profiles_dir,
+                                  'max_files': 3})
+        for i in range(5):
+            with mock.patch('os.getpid', return_value=i):
+                _operation(ctx=ctx, neutron_client=mock.Mock())
+
+        profiles = self._profiles()
+        self.assertEquals(3, len(profiles))
+        self.assertEquals(['2', '3', '4'],
+                          sorted(p.split('.')[-2] for p in profiles))
+
+    def test_rotation_by_concurrent_processes(self):
+        ctx = self._get_mock_ctx({'enabled': True,
+                                  'directory': self.profiles_dir,
+                                  'max_files': 1})
+        with mock.patch('os.getpid', return_value=1):
+            _operation(ctx=ctx, neutron_client=mock.Mock())
+        remove = os.remove
+
+        def concurrent_remove(path):
+            # another process rotated the profile first
+            remove(path)
+            raise OSError(errno.ENOENT, 'No such file or directory', path)
+
+        with mock.patch('os.getpid', return_value=2), \
+                mock.patch('os.remove', side_effect=concurrent_remove), \
+                mock.patch.object(ctx.logger, 'warning') as warning:
+            _operation(ctx=ctx, neutron_client=mock.Mock())
+
+        self.assertFalse(warning.called)
+        self.assertEquals(1, len(self._profiles()))
+
+    def test_merge(self):
+        ctx = self._get_mock_ctx({'enabled': True,
+                                  'directory': self.profiles_dir})
+        for i in range(2):
+            with mock.patch('os.getpid', return_value=i):
+                _operation(ctx=ctx, neutron_client=mock.Mock())
+
+        output = StringIO.StringIO()
+        profiling.merge([self.profiles_dir], output=output, top=10)
+
+        report = output.getvalue()
+        self.assertIn('Merged 2 profiles', report)
+        hotspot_line, = [line for line in report.splitlines()
+                         if '(_hotspot)' in line]
+        # called once by each of the merged operations
+        self.assertEquals('2', hotspot_line.split()[0])
+
+    def test_merge_without_profiles(self):
+        self.assertRaises(ValueError, profiling.merge, [self.profiles_dir])
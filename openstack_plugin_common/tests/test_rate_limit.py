@@ -0,0 +1,138 @@
+#########
+# Copyright (c) 2014 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+import openstack_plugin_common as common
+from openstack_plugin_common import rate_limit
+from openstack_plugin_common.tests.fake_cloud import FakeCloud
+
+NOVA_URL = 'http://nova:8774/v2/tenant/servers'
+NEUTRON_URL = 'http://neutron:9696/v2.0/ports.json'
+
+
+class _HTTPClient(object):
+
+    def __init__(self):
+        self.requests = []
+
+    def request(self, url, method, **kwargs):
+        self.requests.append((method, url))
+        return 'response', 'body'
+
+
+class TestTokenBucket(unittest.TestCase):
+
+    @mock.patch('time.time')
+    def test_burst_then_rate(self, time_mock):
+        time_mock.return_value = 1000.0
+        bucket = rate_limit.TokenBucket(rate=2, burst=3)
+
+        self.assertEquals([0, 0, 0, 0.5, 1.0],
+                          [bucket.reserve() for _ in range(5)])
+
+        # refilled for the waiting callers first
+        time_mock.return_value = 1002.0
+        self.assertEquals([0, 0, 0.5], [bucket.reserve() for _ in range(3)])
+
+    def test_shared_between_instances(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        path = os.path.join(tmp_dir, 'bucket')
+        first = rate_limit.SharedTokenBucket(path, rate=0.1, burst=2)
+        second = rate_limit.SharedTokenBucket(path, rate=0.1, burst=2)
+
+        self.assertEquals(0, first.reserve())
+        self.assertEquals(0, second.reserve())
+        self.assertAlmostEqual(10, first.reserve(), places=1)
+        self.assertAlmostEqual(20, second.reserve(), places=1)
+
+
+class TestThrottle(unittest.TestCase):
+
+    def setUp(self):
+        self.addCleanup(rate_limit._buckets.clear)
+        sleep_patch = mock.patch('time.sleep')
+        self.sleep = sleep_patch.start()
+        self.addCleanup(sleep_patch.stop)
+
+    def test_not_configured(self):
+        http_client = _HTTPClient()
+        request = http_client.request
+        rate_limit.throttle(http_client, 'nova', None)
+        rate_limit.throttle(http_client, 'nova', {'burst': 5})
+        self.assertEquals(request, http_client.request)
+
+    def test_limited_per_method_class(self):
+        http_client = _HTTPClient()
+        rate_limit.throttle(http_client, 'nova', {'write': 1})
+
+        for _ in range(3):
+            self.assertEquals(('response', 'body'),
+                              http_client.request(NOVA_URL, 'GET'))
+        self.assertFalse(self.sleep.called)
+
+        http_client.request(NOVA_URL, 'POST')
+        http_client.request(NOVA_URL, 'DELETE')
+        self.assertEquals(1, self.sleep.call_count)
+        self.assertEquals(5, len(http_client.requests))
+
+    def test_buckets_shared_by_clients_of_endpoint(self):
+        config = {'read': 1, 'burst': 2}
+        clients = [_HTTPClient() for _ in range(3)]
+        for client in clients:
+            rate_limit.throttle(client, 'neutron', config)
+
+        clients[0].request(NEUTRON_URL, 'GET')
+        clients[1].request(NEUTRON_URL, 'GET')
+        self.assertFalse(self.sleep.called)
+        clients[2].request(NEUTRON_URL, 'GET')
+        self.assertEquals(1, self.sleep.call_count)
+
+        # a different endpoint has a bucket of its own
+        clients[2].request(NOVA_URL, 'GET')
+        self.assertEquals(1, self.sleep.call_count)
+
+    def test_shared_dir(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        shared_dir = os.path.join(tmp_dir, 'rate-limit')
+        http_client = _HTTPClient()
+        rate_limit.throttle(http_client, 'nova',
+                            {'write': 1, 'shared_dir': shared_dir})
+
+        http_client.request(NOVA_URL, 'POST')
+
+        self.assertEquals(['nova-nova_8774-write'], os.listdir(shared_dir))
+
+    def test_clients_throttled(self):
+        cloud = FakeCloud()
+        config = dict(cloud.openstack_config(),
+                      rate_limit={'read': 1, 'write': 1})
+
+        with cloud.patch_requests(), \
+                mock.patch.dict(os.environ, {}, clear=True):
+            neutron_client = common.NeutronClient().get(config=config)
+            for _ in range(3):
+                neutron_client.list_networks()
+
+        # the token request and the first list aren't limited
+        self.assertEquals(2, self.sleep.call_count)
+        self.assertEquals(4, len(cloud.calls))
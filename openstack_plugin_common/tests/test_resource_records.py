@@ -0,0 +1,250 @@
+#########
+# Copyright (c) 2014 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+
+import unittest
+import urllib
+
+import mock
+
+from cloudify.exceptions import NonRecoverableError
+
+from openstack_plugin_common import (CinderClientWithSugar,
+                                     get_resource_by_name_or_id,
+                                     NeutronClientWithSugar,
+                                     NovaClientWithSugar,
+                                     ResourceRecord)
+from openstack_plugin_common.tests.fake_cloud import (FakeCloud, FLAVORS,
+                                                      IMAGES)
+
+SERVERS_LIST = 'GET /compute/v2/{id}/servers'
+SERVER_GET = 'GET /compute/v2/{id}/servers/{id}'
+VOLUMES_LIST = 'GET /volume/v1/{id}/volumes'
+VOLUME_GET = 'GET /volume/v1/{id}/volumes/{id}'
+
+
+def _neutron_client(cloud):
+    config = cloud.openstack_config()
+    return NeutronClientWithSugar(
+        username=config['username'], password=config['password'],
+        tenant_name=config['tenant_name'], auth_url=config['auth_url'],
+        region_name='')
+
+
+def _nova_client(cloud):
+    config = cloud.openstack_config()
+    return NovaClientWithSugar(
+        username=config['username'], api_key=config['password'],
+        project_id=config['tenant_name'], auth_url=config['auth_url'],
+        region_name='')
+
+
+def _cinder_client(cloud):
+    config = cloud.openstack_config()
+    return CinderClientWithSugar(
+        username=config['username'], api_key=config['password'],
+        project_id=config['tenant_name'], auth_url=config['auth_url'],
+        region_name='')
+
+
+class TestResourceRecords(unittest.TestCase):
+
+    def setUp(self):
+        self.cloud = FakeCloud()
+        self.networks = [self.cloud.add('network', name='net-{0}'.format(i))
+                         for i in range(3)]
+        patch = self.cloud.patch_requests()
+        patch.__enter__()
+        self.addCleanup(patch.__exit__, None, None, None)
+
+    def test_record(self):
+        record = ResourceRecord('id', 'name', lambda obj_id: {'id': obj_id})
+
+        self.assertEquals(('id', 'name'), (record.id, record.name))
+        self.assertEquals(('id', 'name'), (record['id'], record['name']))
+        self.assertRaises(KeyError, lambda: record['status'])
+        self.assertRaises(AttributeError, setattr, record, 'status', 'up')
+        self.assertEquals({'id': 'id'}, record.fetch())
+
+    def test_neutron_records(self):
+        neutron_client = _neutron_client(self.cloud)
+
+        records = list(neutron_client.cosmo_list_records('network'))
+
+        self.assertEquals([(n['id'], n['name']) for n in self.networks],
+                          [(r.id, r.name) for r in records])
+        self.assertEquals(self.networks[1], records[1].fetch())
+        self.assertEquals(['POST /identity/v2.0/tokens',
+                           'GET /network/v2.0/networks.json',
+                           'GET /network/v2.0/networks/{id}.json'],
+                          self.cloud.pop_calls())
+
+    def test_neutron_record_by_name(self):
+        neutron_client = _neutron_client(self.cloud)
+
+        self.assertEquals(self.networks[2]['id'], neutron_client.
+                          cosmo_get_record('network', name='net-2').id)
+        self.assertIsNone(neutron_client.cosmo_get_record_if_exists(
+            'network', name='missing'))
+        self.assertRaises(NonRecoverableError,
+                          neutron_client.cosmo_get_record, 'network',
+                          name='missing')
+
+    def test_nova_records_listed_briefly(self):
+        nova_client = _nova_client(self.cloud)
+
+        record = nova_client.cosmo_get_record('flavor', name='m1.small')
+
+        self.assertEquals(FLAVORS[1]['id'], record.id)
+        self.assertEquals(['POST /identity/v2.0/tokens',
+                           'GET /compute/v2/{id}/flavors'],
+                          self.cloud.pop_calls())
+        self.assertEquals(FLAVORS[1]['ram'], record.fetch().ram)
+
+    def test_nova_records_of_other_filters_and_types(self):
+        nova_client = _nova_client(self.cloud)
+        nova_client.keypairs.create('keypair')
+
+        self.assertEquals(
+            ['m1.small'],
+            [r.name for r in nova_client.cosmo_list_records('flavor',
+                                                            ram=2048)])
+        self.assertEquals(
+            ['keypair'],
+            [r.name for r in nova_client.cosmo_list_records('keypair')])
+
+    def _create_servers(self, nova_client, *names):
+        servers = [nova_client.servers.create(
+            name, IMAGES[0]['id'], FLAVORS[0]['id'],
+            nics=[{'net-id': self.networks[0]['id']}]) for name in names]
+        self.cloud.pop_calls()
+        return servers
+
+    def test_nova_server_found_by_name_briefly(self):
+        nova_client = _nova_client(self.cloud)
+        self._create_servers(nova_client, 'web.1', 'webx1', 'web.10')
+
+        with mock.patch.object(nova_client.servers, '_list',
+                               wraps=nova_client.servers._list) as list_mock:
+            server = nova_client.cosmo_get('server', name='web.1')
+
+        self.assertEquals(('web.1', 'ACTIVE'), (server.name, server.status))
+        list_mock.assert_called_once_with(
+            '/servers?' + urllib.urlencode({'name': r'^web\.1$'}), 'servers')
+        self.assertEquals([SERVERS_LIST, SERVER_GET], self.cloud.pop_calls())
+
+    def test_nova_server_found_by_id(self):
+        nova_client = _nova_client(self.cloud)
+        servers = self._create_servers(nova_client, 'web', 'db')
+
+        server = get_resource_by_name_or_id(servers[1].id, 'server',
+                                            nova_client)
+
+        self.assertEquals('db', server.name)
+        self.assertEquals([SERVERS_LIST, SERVER_GET], self.cloud.pop_calls())
+        self.assertIsNone(nova_client.cosmo_get_if_exists('server',
+                                                          id='missing'))
+        self.assertEquals(['GET /compute/v2/{id}/servers/missing'],
+                          self.cloud.pop_calls())
+        self.assertIsNone(nova_client.cosmo_get_if_exists('server',
+                                                          name='missing'))
+        self.assertEquals([SERVERS_LIST], self.cloud.pop_calls())
+
+
+class TestKeypairLookup(unittest.TestCase):
+
+    def setUp(self):
+        self.cloud = FakeCloud()
+        patch = self.cloud.patch_requests()
+        patch.__enter__()
+        self.addCleanup(patch.__exit__, None, None, None)
+        self.nova_client = _nova_client(self.cloud)
+        self.nova_client.keypairs.create('keypair')
+        self.cloud.pop_calls()
+
+    def test_keypair_fetched_by_name_once(self):
+        keypair = get_resource_by_name_or_id('keypair', 'keypair',
+                                             self.nova_client)
+
+        self.assertEquals('00:00', keypair.fingerprint)
+        self.assertIs(keypair,
+                      self.nova_client.cosmo_get_named('keypair', 'keypair'))
+        self.assertIs(keypair, self.nova_client.cosmo_get('keypair',
+                                                          id='keypair'))
+        self.assertEquals(['GET /compute/v2/{id}/os-keypairs/keypair'],
+                          self.cloud.pop_calls())
+
+    def test_missing_keypair_cached(self):
+        self.assertIsNone(get_resource_by_name_or_id(
+            'missing', 'keypair', self.nova_client, raise_if_not_found=False))
+        self.assertRaises(NonRecoverableError, self.nova_client.cosmo_get,
+                          'keypair', name='missing')
+        self.assertEquals(['GET /compute/v2/{id}/os-keypairs/missing'],
+                          self.cloud.pop_calls())
+
+    def test_deleted_keypair_not_found(self):
+        self.nova_client.cosmo_get('keypair', name='keypair')
+
+        self.nova_client.cosmo_delete_resource('keypair', 'keypair')
+
+        self.assertIsNone(self.nova_client.cosmo_get_if_exists(
+            'keypair', name='keypair'))
+
+
+class TestVolumeLookup(unittest.TestCase):
+
+    def setUp(self):
+        self.cloud = FakeCloud()
+        patch = self.cloud.patch_requests()
+        patch.__enter__()
+        self.addCleanup(patch.__exit__, None, None, None)
+        self.cinder_client = _cinder_client(self.cloud)
+        self.volumes = [self.cinder_client.volumes.create(
+            1, display_name='volume-{0}'.format(i)) for i in range(3)]
+        self.cloud.pop_calls()
+
+    def test_volume_found_by_name_within_tenant(self):
+        self.cloud.add_volume(tenant_id='other-tenant', size=1,
+                              display_name='volume-1')
+        volumes = self.cinder_client.volumes
+        with mock.patch.object(volumes, '_list',
+                               wraps=volumes._list) as list_mock:
+            volume = self.cinder_client.cosmo_get('volume',
+                                                  display_name='volume-1')
+
+        self.assertEquals(self.volumes[1].id, volume.id)
+        self.assertEquals('available', volume.status)
+        list_mock.assert_called_once_with(
+            '/volumes?display_name=volume-1', 'volumes')
+        self.assertEquals([VOLUMES_LIST, VOLUME_GET], self.cloud.pop_calls())
+
+    def test_volume_found_by_id(self):
+        volume = get_resource_by_name_or_id(self.volumes[2].id, 'volume',
+                                            self.cinder_client,
+                                            name_field_name='display_name')
+
+        self.assertEquals('volume-2', volume.display_name)
+        self.assertEquals([VOLUMES_LIST, VOLUME_GET], self.cloud.pop_calls())
+        self.assertIsNone(self.cinder_client.cosmo_get_if_exists(
+            'volume', id='missing'))
+
+    def test_volume_records(self):
+        self.assertEquals(
+            sorted(v.id for v in self.volumes),
+            sorted(r.id for r in
+                   self.cinder_client.cosmo_list_records('volume')))
+        self.assertEquals(
+            ['volume-0'],
+            [v.display_name for v in self.cinder_client.cosmo_list(
+                'volume', display_name='volume-0', size=1)])
@@ -0,0 +1,149 @@
+#########
+# Copyright (c) 2014 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+import requests
+
+import openstack_plugin_common as common
+from openstack_plugin_common import connection_pool
+from openstack_plugin_common import response_decoding
+from openstack_plugin_common.tests.fake_cloud import (FakeCloud,
+                                                      FakeCloudServer,
+                                                      FLAVORS)
+
+
+class _RecordingJSON(object):
+
+    def __init__(self):
+        self.parsed = []
+
+    def loads(self, s):
+        self.parsed.append(s)
+        return json.loads(s)
+
+
+def _response(content_type):
+    response = requests.Response()
+    response.headers['Content-Type'] = content_type
+    response.encoding = requests.utils.get_encoding_from_headers(
+        response.headers)
+    return response
+
+
+class TestResponseDecoding(unittest.TestCase):
+
+    def setUp(self):
+        self.cloud = FakeCloud()
+        for i in range(50):
+            self.cloud.add('network', name='net-{0}'.format(i))
+        self.server = FakeCloudServer(self.cloud, compress=True).start()
+        self.addCleanup(self.server.stop)
+        self.addCleanup(connection_pool.reset)
+
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        environ = dict((k, v) for k, v in os.environ.iteritems()
+                       if not k.startswith('OS_'))
+        environ[common.Config.OPENSTACK_CONFIG_PATH_ENV_VAR] = os.path.join(
+            tmpdir, 'openstack_config.json')
+        environ_patch = mock.patch.dict(os.environ, environ, clear=True)
+        environ_patch.start()
+        self.addCleanup(environ_patch.stop)
+
+        self.json_module = _RecordingJSON()
+        json_module_patch = mock.patch.object(
+            response_decoding, '_json_module', self.json_module)
+        json_module_patch.start()
+        self.addCleanup(json_module_patch.stop)
+
+    def _config(self, **response_decoding_config):
+        return dict(self.cloud.openstack_config(),
+                    response_decoding=dict(response_decoding_config,
+                                           enabled=True))
+
+    def _list_networks(self, **response_decoding_config):
+        bytes_sent = self.server.bytes_sent
+        networks = common.NeutronClient().get(
+            config=self._config(**response_decoding_config)).list_networks()
+        return networks['networks'], self.server.bytes_sent - bytes_sent
+
+    def test_gzip(self):
+        networks, compressed_size = self._list_networks()
+        _, size = self._list_networks(gzip=False)
+
+        self.assertEquals(50, len(networks))
+        self.assertLess(compressed_size * 4, size)
+
+    def test_fast_json(self):
+        config = self._config()
+        networks = common.NeutronClient().get(config=config).list_networks()
+        flavors = common.NovaClient().get(config=config).flavors.list()
+        volumes = common.CinderClient().get(config=config).volumes.list()
+
+        self.assertEquals(50, len(networks['networks']))
+        self.assertEquals(len(FLAVORS), len(flavors))
+        self.assertEquals([], volumes)
+        self.assertEquals(
+            [['networks', 'networks_links'], ['flavors'], ['volumes']],
+            [sorted(body) for body in map(json.loads, self.json_module.parsed)
+             if 'access' not in body])
+
+    def test_disabled_by_default(self):
+        neutron_client = common.NeutronClient().get(
+            config=self.cloud.openstack_config())
+        networks = neutron_client.list_networks()
+
+        self.assertEquals(50, len(networks['networks']))
+        self.assertNotIn('request', vars(neutron_client.httpclient))
+        self.assertNotIn('deserialize', vars(neutron_client))
+        self.assertEquals([], self.json_module.parsed)
+
+    def test_library_modules_untouched(self):
+        from cinderclient import client as cinder_client
+        from neutronclient.openstack.common import jsonutils
+        from novaclient import client as nova_client
+        modules = (nova_client, cinder_client, jsonutils)
+        json_modules = [module.json for module in modules]
+        config = self._config()
+        common.NeutronClient().get(config=config).list_networks()
+        common.NovaClient().get(config=config).flavors.list()
+        common.CinderClient().get(config=config).volumes.list()
+
+        self.assertEquals(json_modules, [module.json for module in modules])
+        self.assertNotEquals([], self.json_module.parsed)
+
+    def test_fast_json_disabled(self):
+        networks, _ = self._list_networks(fast_json=False)
+
+        self.assertEquals(50, len(networks))
+        self.assertEquals([], self.json_module.parsed)
+
+    def test_json_module_fallback(self):
+        with mock.patch('importlib.import_module', side_effect=ImportError):
+            self.assertIs(json, response_decoding._import_json_module())
+
+    def test_json_without_charset_decoded_as_utf8(self):
+        self.assertEquals('utf-8', response_decoding.default_to_utf8(
+            _response('application/json')).encoding)
+        self.assertEquals('latin-1', response_decoding.default_to_utf8(
+            _response('application/json; charset=latin-1')).encoding)
+        self.assertEquals('ISO-8859-1', response_decoding.default_to_utf8(
+            _response('text/plain')).encoding)
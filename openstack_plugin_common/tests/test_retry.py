@@ -0,0 +1,201 @@
+#########
+# Copyright (c) 2014 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+
+import os
+import random
+import unittest
+
+import mock
+import requests
+
+from cloudify.exceptions import NonRecoverableError, RecoverableError
+from cloudify.mocks import MockCloudifyContext
+
+import openstack_plugin_common as common
+from openstack_plugin_common import retry
+from openstack_plugin_common.tests.fake_cloud import FakeCloud
+
+
+def _ctx(openstack_config=None, operation='create'):
+    return MockCloudifyContext(
+        node_id='node', operation={'name': operation},
+        properties={'openstack_config': openstack_config or {}})
+
+
+class TestClassify(unittest.TestCase):
+
+    def test_transient_errors(self):
+        self.assertEquals('rate_limit', retry.classify(
+            common.nova_exceptions.OverLimit(413, retry_after=10)))
+        self.assertEquals('server_error', retry.classify(
+            common.neutron_exceptions.NeutronClientException(
+                status_code=503)))
+        self.assertEquals('server_error', retry.classify(
+            common.cinder_exceptions.ClientException(500)))
+        self.assertEquals('connection', retry.classify(
+            common.neutron_exceptions.ConnectionFailed(reason='reset')))
+        self.assertEquals('connection', retry.classify(
+            requests.exceptions.ReadTimeout()))
+
+    def test_other_errors(self):
+        self.assertIsNone(retry.classify(
+            common.nova_exceptions.NotFound(404)))
+        self.assertIsNone(retry.classify(ValueError('bug')))
+        self.assertIsNone(retry.classify(NonRecoverableError('failed')))
+
+        class ConnectionTimeout(Exception):
+            pass
+        # not an error of the client libraries, despite its name
+        self.assertIsNone(retry.classify(ConnectionTimeout()))
+
+
+class TestRetryAfter(unittest.TestCase):
+
+    def setUp(self):
+        random.seed(0)
+
+    def test_decorrelated_jitter(self):
+        ctx = _ctx()
+        delays = [retry.retry_after(ctx, 'server_error') for _ in range(20)]
+
+        state = ctx.instance.runtime_properties[retry.RETRY_STATE_PROPERTY]
+        self.assertEquals(20, state['server_error']['attempts'])
+        self.assertTrue(all(2 <= delay <= 60 for delay in delays))
+        self.assertEquals(60, max(delays))
+        self.assertLess(delays[0], 60)
+
+    def test_delays_grow(self):
+        delay = 0
+        for _ in range(10):
+            previous_delay = delay
+            delay = retry.next_delay(previous_delay, 1, 1000)
+            self.assertTrue(1 <= delay <= max(1, previous_delay * 3))
+
+    def test_server_retry_after_honored(self):
+        self.assertEquals(30, retry.retry_after(
+            _ctx(), 'rate_limit', server_retry_after=30, cap=10))
+
+    def test_floor(self):
+        ctx = _ctx()
+        delays = [retry.retry_after(ctx, 'status_wait', floor=10)
+                  for _ in range(20)]
+        self.assertTrue(all(10 <= delay <= 30 for delay in delays))
+
+        self.assertEquals(45, retry.retry_after(_ctx(), 'status_wait',
+                                                floor=45))
+
+    def test_policy_configured(self):
+        config = {'retry_policy': {'connection': {'base': 7, 'cap': 7}}}
+        self.assertEquals(7, retry.retry_after(_ctx(), 'connection', config))
+
+    def test_state_of_other_operation_ignored(self):
+        ctx = _ctx(operation='delete')
+        ctx.instance.runtime_properties[retry.RETRY_STATE_PROPERTY] = {
+            'operation': 'create',
+            'server_error': {'attempts': 7, 'delay': 60}}
+
+        retry.retry_after(ctx, 'server_error')
+
+        self.assertEquals({'attempts': 1, 'delay': mock.ANY},
+                          ctx.instance.runtime_properties[
+                              retry.RETRY_STATE_PROPERTY]['server_error'])
+
+    def test_poll_delays(self):
+        delays = retry.poll_delays(base=0.5, cap=4)
+        self.assertTrue(all(0.5 <= next(delays) <= 4 for _ in range(20)))
+
+
+class TestScope(unittest.TestCase):
+
+    def test_state_cleared_on_success(self):
+        ctx = _ctx()
+        with retry.scope(ctx):
+            retry.retry_after(ctx, 'server_error')
+        self.assertIn(retry.RETRY_STATE_PROPERTY,
+                      ctx.instance.runtime_properties)
+
+        with retry.scope(ctx):
+            with retry.scope(ctx):
+                pass
+            self.assertIn(retry.RETRY_STATE_PROPERTY,
+                          ctx.instance.runtime_properties)
+        self.assertNotIn(retry.RETRY_STATE_PROPERTY,
+                         ctx.instance.runtime_properties)
+
+    def test_state_kept_on_failure(self):
+        ctx = _ctx()
+        ctx.instance.runtime_properties[retry.RETRY_STATE_PROPERTY] = {}
+        try:
+            with retry.scope(ctx):
+                raise ValueError()
+        except ValueError:
+            pass
+        self.assertIn(retry.RETRY_STATE_PROPERTY,
+                      ctx.instance.runtime_properties)
+
+
+class TestClientDecorators(unittest.TestCase):
+
+    def setUp(self):
+        self.cloud = FakeCloud()
+        environ_patch = mock.patch.dict(os.environ, {}, clear=True)
+        environ_patch.start()
+        self.addCleanup(environ_patch.stop)
+
+    def test_neutron_server_error_retried_with_backoff(self):
+        self.cloud.inject_fault(503, 'GET', count=1)
+        ctx = _ctx(self.cloud.openstack_config())
+
+        @common.with_neutron_client
+        def operation(neutron_client, **kwargs):
+            neutron_client.list_networks()
+
+        with self.cloud.patch_requests():
+            try:
+                operation(ctx=ctx)
+                self.fail('Expected a RecoverableError')
+            except RecoverableError as e:
+                self.assertTrue(2 <= e.retry_after <= 60)
+            self.assertEquals(1, ctx.instance.runtime_properties[
+                retry.RETRY_STATE_PROPERTY]['server_error']['attempts'])
+
+            operation(ctx=ctx)
+        self.assertNotIn(retry.RETRY_STATE_PROPERTY,
+                         ctx.instance.runtime_properties)
+
+    def test_nova_over_limit_retry_after_honored(self):
+        self.cloud.inject_fault(413, 'GET', count=1, retry_after=90)
+        ctx = _ctx(self.cloud.openstack_config())
+
+        @common.with_nova_client
+        def operation(nova_client, **kwargs):
+            nova_client.flavors.list()
+
+        with self.cloud.patch_requests():
+            try:
+                operation(ctx=ctx)
+                self.fail('Expected a RecoverableError')
+            except RecoverableError as e:
+                self.assertEquals(90, e.retry_after)
+
+    def test_non_recoverable_errors_unchanged(self):
+        ctx = _ctx(self.cloud.openstack_config())
+
+        @common.with_neutron_client
+        def operation(neutron_client, **kwargs):
+            neutron_client.show_network('missing')
+
+        with self.cloud.patch_requests():
+            self.assertRaises(NonRecoverableError, operation, ctx=ctx)
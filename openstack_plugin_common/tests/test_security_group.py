@@ -0,0 +1,230 @@
+########
+# Copyright (c) 2014 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#    * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    * See the License for the specific language governing permissions and
+#    * limitations under the License.
+
+import itertools
+import random
+import unittest
+
+import mock
+from IPy import IP
+
+from cloudify.exceptions import NonRecoverableError
+from cloudify.mocks import MockCloudifyContext
+
+from openstack_plugin_common import NeutronClientWithSugar
+from openstack_plugin_common.security_group import (
+    compile_rules,
+    diff_rules,
+    process_rules
+)
+
+
+CIDR_FIELD = 'remote_ip_prefix'
+MIN_PORT_FIELD = 'port_range_min'
+MAX_PORT_FIELD = 'port_range_max'
+
+BASE_NETWORK = IP('10.0.0.0/26')
+ADDRESSES = [ip.int() for ip in BASE_NETWORK] + [IP('192.168.0.1').int()]
+PORTS = range(0, 18)
+ICMP_TYPES_AND_CODES = [(0, 0), (8, 0), (3, 1)]
+REMOTE_GROUPS = ['sg-a', 'sg-b']
+
+
+def _compile(rules):
+    return compile_rules(rules, CIDR_FIELD, MIN_PORT_FIELD, MAX_PORT_FIELD)
+
+
+def _random_cidr(rand):
+    prefixlen = rand.randint(BASE_NETWORK.prefixlen(), 32)
+    address = BASE_NETWORK.int() + rand.randint(0, BASE_NETWORK.len() - 1)
+    return str(IP(address).make_net(prefixlen))
+
+
+def _random_rule(rand):
+    rule = {
+        'direction': rand.choice(['ingress', 'egress']),
+        'ethertype': 'IPv4',
+        'protocol': rand.choice(['tcp', 'TCP', 'udp', 'icmp']),
+        'remote_group_id': None,
+        CIDR_FIELD: _random_cidr(rand),
+    }
+    if rule['protocol'] == 'icmp':
+        rule[MIN_PORT_FIELD], rule[MAX_PORT_FIELD] = \
+            rand.choice(ICMP_TYPES_AND_CODES)
+    else:
+        min_port = rand.choice(PORTS[1:-1])
+        rule[MIN_PORT_FIELD] = min_port
+        rule[MAX_PORT_FIELD] = rand.randint(min_port, PORTS[-2])
+    if rand.random() < 0.2:
+        rule['remote_group_id'] = rand.choice(REMOTE_GROUPS)
+        rule[CIDR_FIELD] = None
+    return rule
+
+
+def _allowed_traffic(rules):
+    traffic = set()
+    for rule in rules:
+        protocol = rule['protocol'].lower()
+        if rule['remote_group_id']:
+            remotes = [rule['remote_group_id']]
+        else:
+            cidr = IP(rule[CIDR_FIELD])
+            remotes = [address for address in ADDRESSES
+                       if cidr.int() <= address < cidr.int() + cidr.len()]
+        if protocol == 'icmp':
+            values = [(rule[MIN_PORT_FIELD], rule[MAX_PORT_FIELD])]
+        else:
+            values = range(rule[MIN_PORT_FIELD], rule[MAX_PORT_FIELD] + 1)
+        traffic.update(itertools.product([rule['direction']], [protocol],
+                                         remotes, values))
+    return traffic
+
+
+class TestCompileRules(unittest.TestCase):
+
+    def test_duplicates_removed(self):
+        rule = {'protocol': 'tcp', MIN_PORT_FIELD: 22, MAX_PORT_FIELD: 22,
+                CIDR_FIELD: '0.0.0.0/0'}
+        self.assertEquals([rule], _compile([rule, dict(rule), dict(rule)]))
+
+    def test_adjacent_cidrs_and_ports_merged(self):
+        rules = [{'protocol': 'tcp', MIN_PORT_FIELD: port,
+                  MAX_PORT_FIELD: port, CIDR_FIELD: '10.0.{0}.0/24'.format(i)}
+                 for i in range(4) for port in (80, 81, 82, 443)]
+        self.assertEquals(
+            [{'protocol': 'tcp', MIN_PORT_FIELD: 80, MAX_PORT_FIELD: 82,
+              CIDR_FIELD: '10.0.0.0/22'},
+             {'protocol': 'tcp', MIN_PORT_FIELD: 443, MAX_PORT_FIELD: 443,
+              CIDR_FIELD: '10.0.0.0/22'}],
+            _compile(rules))
+
+    def test_icmp_and_remote_group_rules_kept(self):
+        rules = [
+            {'protocol': 'icmp', MIN_PORT_FIELD: 0, MAX_PORT_FIELD: 0,
+             CIDR_FIELD: '0.0.0.0/0'},
+            {'protocol': 'icmp', MIN_PORT_FIELD: 1, MAX_PORT_FIELD: 1,
+             CIDR_FIELD: '0.0.0.0/0'},
+            {'protocol': 'tcp', MIN_PORT_FIELD: 80, MAX_PORT_FIELD: 80,
+             CIDR_FIELD: None, 'remote_group_id': 'sg-a'},
+            {'protocol': 'tcp', MIN_PORT_FIELD: 80, MAX_PORT_FIELD: 80,
+             CIDR_FIELD: None, 'remote_group_id': 'sg-b'},
+        ]
+        self.assertEquals(rules, _compile(rules))
+
+    def test_invalid_cidr_kept(self):
+        rules = [{'protocol': 'tcp', MIN_PORT_FIELD: 80, MAX_PORT_FIELD: 80,
+                  CIDR_FIELD: 'not-a-cidr'},
+                 {'protocol': 'tcp', MIN_PORT_FIELD: 80, MAX_PORT_FIELD: 80,
+                  CIDR_FIELD: '10.0.0.0/24'}]
+        self.assertEquals(rules, _compile(rules))
+
+    def test_random_rule_sets(self):
+        rand = random.Random(1234)
+        for _ in range(100):
+            rules = [_random_rule(rand) for _ in range(rand.randint(1, 25))]
+            rules += [dict(rule) for rule in
+                      rand.sample(rules, len(rules) / 3)]
+
+            compiled_rules = _compile(rules)
+
+            self.assertLessEqual(len(compiled_rules), len(rules))
+            self.assertEquals(_allowed_traffic(rules),
+                              _allowed_traffic(compiled_rules))
+            self.assertEquals(compiled_rules, _compile(compiled_rules))
+
+
+class TestDiffRules(unittest.TestCase):
+
+    def test_only_differences_returned(self):
+        def rule(port, **kwargs):
+            return dict({'protocol': 'tcp', MIN_PORT_FIELD: port,
+                         MAX_PORT_FIELD: port, CIDR_FIELD: '10.0.0.0/8'},
+                        **kwargs)
+
+        declared = [rule(22), rule(80), rule(443)]
+        live = [rule('22', id='1', protocol='TCP'),
+                rule(22, id='2'),
+                rule(80, id='3'),
+                rule(8080, id='4')]
+
+        rules_to_add, rules_to_remove = diff_rules(
+            declared, live, ['protocol', CIDR_FIELD, MIN_PORT_FIELD,
+                             MAX_PORT_FIELD],
+            CIDR_FIELD, MIN_PORT_FIELD, MAX_PORT_FIELD)
+
+        self.assertEquals([rule(443)], rules_to_add)
+        self.assertEquals(['2', '4'], [r['id'] for r in rules_to_remove])
+
+    def test_unicode_live_rules_match(self):
+        declared = [{'protocol': 'tcp', CIDR_FIELD: '0.0.0.0/0'}]
+        live = [{u'protocol': u'tcp', CIDR_FIELD: u'0.0.0.0/0', u'id': u'1'}]
+
+        self.assertEquals(([], []), diff_rules(
+            declared, live, ['protocol', CIDR_FIELD], CIDR_FIELD,
+            MIN_PORT_FIELD, MAX_PORT_FIELD))
+
+
+class TestProcessRules(unittest.TestCase):
+
+    def test_remote_group_names_resolved_with_single_list_call(self):
+        rules = [{'port': port, 'remote_group_name': 'sg-{0}'.format(port % 3)}
+                 for port in range(1, 101)]
+        security_groups = [{'id': 'sg-{0}-id'.format(i),
+                            'name': 'sg-{0}'.format(i)} for i in range(5)]
+
+        neutron_client = self._get_neutron_client(security_groups)
+        with mock.patch('openstack_plugin_common.security_group.ctx',
+                        self._get_mock_ctx(rules)):
+            sg_rules = process_rules(neutron_client, {}, 'remote_ip_prefix',
+                                     'remote_group_id', 'port_range_min',
+                                     'port_range_max')
+
+        neutron_client.list_security_groups.assert_called_once_with(
+            name=mock.ANY, fields=['id', 'name'])
+        self.assertEquals(
+            ['sg-0', 'sg-1', 'sg-2'],
+            sorted(neutron_client.list_security_groups.call_args[1]['name']))
+        self.assertEquals(['sg-0-id', 'sg-1-id', 'sg-2-id'],
+                          sorted(set(sgr['remote_group_id']
+                                     for sgr in sg_rules)))
+
+    def test_missing_remote_group_name(self):
+        rules = [{'port': 80, 'remote_group_name': 'missing-sg'}]
+
+        neutron_client = self._get_neutron_client([])
+        with mock.patch('openstack_plugin_common.security_group.ctx',
+                        self._get_mock_ctx(rules)):
+            self.assertRaises(NonRecoverableError, process_rules,
+                              neutron_client, {}, 'remote_ip_prefix',
+                              'remote_group_id', 'port_range_min',
+                              'port_range_max')
+
+    @staticmethod
+    def _get_neutron_client(security_groups):
+        neutron_client = NeutronClientWithSugar(
+            username='username', password='password',
+            tenant_name='tenant-name', auth_url='http://auth-url')
+
+        def list_security_groups(**kw):
+            return {'security_groups': [sg for sg in security_groups
+                                        if sg['name'] in kw['name']]}
+        neutron_client.list_security_groups = mock.Mock(
+            side_effect=list_security_groups)
+        return neutron_client
+
+    @staticmethod
+    def _get_mock_ctx(rules):
+        return MockCloudifyContext(node_id='test_node_id',
+                                   properties={'rules': rules})
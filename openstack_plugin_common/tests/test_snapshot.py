@@ -0,0 +1,197 @@
+#########
+# Copyright (c) 2014 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+from cloudify.mocks import MockCloudifyContext
+
+from nova_plugin import keypair as keypair_plugin
+import openstack_plugin_common as common
+from openstack_plugin_common import prefetch
+from openstack_plugin_common import snapshot
+from openstack_plugin_common.tests.fake_cloud import FakeCloud, FLAVORS
+
+TOKEN_CALL = 'POST /identity/v2.0/tokens'
+NETWORKS_LIST = 'GET /network/v2.0/networks.json'
+FLAVORS_LIST = 'GET /compute/v2/{id}/flavors'
+
+
+class TestSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        self.cloud = FakeCloud()
+        self.network = self.cloud.add('network', name='net')
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        environ = dict((k, v) for k, v in os.environ.iteritems()
+                       if not k.startswith('OS_'))
+        environ[common.Config.OPENSTACK_CONFIG_PATH_ENV_VAR] = os.path.join(
+            self.tmpdir, 'openstack_config.json')
+        environ_patch = mock.patch.dict(os.environ, environ, clear=True)
+        environ_patch.start()
+        self.addCleanup(environ_patch.stop)
+        requests_patch = self.cloud.patch_requests()
+        requests_patch.__enter__()
+        self.addCleanup(requests_patch.__exit__, None, None, None)
+
+    def _config(self, **resource_snapshot_config):
+        return dict(self.cloud.openstack_config(), resource_snapshot=dict(
+            resource_snapshot_config, directory=self.tmpdir))
+
+    def _prefetch(self, config):
+        ctx = MockCloudifyContext(node_id='snapshot', properties={
+            'openstack_config': config})
+        prefetch.prefetch(ctx=ctx)
+        self.cloud.pop_calls()
+
+    def _calls(self):
+        return [call for call in self.cloud.pop_calls()
+                if call != TOKEN_CALL]
+
+    def test_lookups_served_from_snapshot(self):
+        config = self._config(enabled=True)
+        self._prefetch(config)
+        neutron_client = common.NeutronClient().get(config=config)
+        nova_client = common.NovaClient().get(config=config)
+
+        self.assertEquals(self.network['id'], neutron_client.cosmo_get(
+            'network', name='net')['id'])
+        flavor = nova_client.cosmo_get_record('flavor', name=FLAVORS[0][
+            'name'])
+        self.assertEquals(FLAVORS[0]['id'], flavor.id)
+        self.assertEquals([], self._calls())
+
+        self.assertIsNone(neutron_client.cosmo_get_if_exists(
+            'network', name='missing'))
+        self.assertEquals([NETWORKS_LIST], self._calls())
+
+    def test_snapshot_expires(self):
+        config = self._config(enabled=True, ttl=0)
+        self._prefetch(config)
+        neutron_client = common.NeutronClient().get(config=config)
+
+        neutron_client.cosmo_get('network', name='net')
+
+        self.assertEquals([NETWORKS_LIST], self._calls())
+
+    def test_created_and_deleted_resources_written_through(self):
+        config = self._config(enabled=True)
+        self._prefetch(config)
+        neutron_client = common.NeutronClient().get(config=config)
+        nova_client = common.NovaClient().get(config=config)
+
+        network = neutron_client.create_network({'network': {
+            'name': 'new-net'}})['network']
+        neutron_client.cosmo_created('network', network)
+        keypair = nova_client.keypairs.create('keypair')
+        nova_client.cosmo_created('keypair', keypair)
+        self.cloud.pop_calls()
+
+        self.assertEquals(network['id'], neutron_client.cosmo_get(
+            'network', name='new-net')['id'])
+        self.assertEquals(keypair.fingerprint, nova_client.cosmo_get(
+            'keypair', name='keypair').fingerprint)
+        self.assertEquals([], self._calls())
+        with open(nova_client.cosmo_snapshot.path) as f:
+            self.assertNotIn('private_key', f.read())
+
+        neutron_client.cosmo_delete_resource('network', network['id'])
+        nova_client.cosmo_delete_resource('keypair', keypair.id)
+        self.cloud.pop_calls()
+
+        self.assertEquals([], neutron_client.cosmo_snapshot.find(
+            'network', name='new-net'))
+        self.assertEquals([], nova_client.cosmo_snapshot.find(
+            'keypair', name='keypair'))
+
+    def test_keypair_deleted_by_plugin_discarded(self):
+        config = self._config(enabled=True)
+        self._prefetch(config)
+        ctx = MockCloudifyContext(node_id='keypair', properties={
+            'openstack_config': config,
+            'use_external_resource': False,
+            'resource_id': 'keypair',
+            'private_key_path': os.path.join(self.tmpdir, 'keypair.pem'),
+            'keypair': {}})
+        keypair_plugin.create(ctx=ctx)
+        nova_client = common.NovaClient().get(config=config)
+        self.assertEquals(1, len(nova_client.cosmo_snapshot.find(
+            'keypair', name='keypair')))
+
+        keypair_plugin.delete(ctx=ctx)
+
+        self.assertEquals([], nova_client.cosmo_snapshot.find(
+            'keypair', name='keypair'))
+
+    def test_resources_of_other_service_not_seen(self):
+        config = self._config(enabled=True)
+        self._prefetch(config)
+        nova_client = common.NovaClient().get(config=config)
+
+        self.assertEquals([], nova_client.cosmo_snapshot.find(
+            'network', name='net'))
+
+    def test_snapshot_of_other_version_ignored(self):
+        config = self._config(enabled=True)
+        self._prefetch(config)
+        nova_client = common.NovaClient().get(config=config)
+        path = nova_client.cosmo_snapshot.path
+        with open(path) as f:
+            content = json.load(f)
+        content['version'] = snapshot.SNAPSHOT_VERSION + 1
+        with open(path, 'w') as f:
+            json.dump(content, f)
+
+        nova_client.cosmo_get_record('flavor', name=FLAVORS[0]['name'])
+
+        self.assertEquals([FLAVORS_LIST], self._calls())
+
+    def _snapshot_of_directory(self, directory):
+        config = dict(self.cloud.openstack_config(), resource_snapshot={
+            'enabled': True, 'directory': directory})
+        return common.NovaClient().get(config=config).cosmo_snapshot
+
+    def test_directory_created_private(self):
+        directory = os.path.join(self.tmpdir, 'snapshots')
+
+        self.assertIsNotNone(self._snapshot_of_directory(directory))
+        self.assertEquals(0o700, os.stat(directory).st_mode & 0o777)
+
+    def test_directory_writable_by_others_not_used(self):
+        directory = os.path.join(self.tmpdir, 'snapshots')
+        os.mkdir(directory)
+        os.chmod(directory, 0o777)
+
+        self.assertIsNone(self._snapshot_of_directory(directory))
+
+    def test_directory_of_other_user_not_used(self):
+        with mock.patch('os.getuid', return_value=os.getuid() + 1):
+            self.assertIsNone(self._snapshot_of_directory(self.tmpdir))
+
+    def test_disabled_by_default(self):
+        config = self.cloud.openstack_config()
+        prefetch.prefetch(ctx=MockCloudifyContext(
+            node_id='snapshot', properties={'openstack_config': config}))
+        neutron_client = common.NeutronClient().get(config=config)
+
+        self.assertIsNone(neutron_client.cosmo_snapshot)
+        self.assertEquals([], self.cloud.pop_calls())
+        self.assertEquals([], os.listdir(self.tmpdir))
@@ -0,0 +1,196 @@
+#########
+# Copyright (c) 2014 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#  * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  * See the License for the specific language governing permissions and
+#  * limitations under the License.
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+import requests
+
+import openstack_plugin_common as common
+from openstack_plugin_common import connection_pool
+from openstack_plugin_common import metrics
+from openstack_plugin_common import streaming
+from openstack_plugin_common.tests.fake_cloud import (FakeCloud,
+                                                      FakeCloudServer)
+
+DOCUMENT = {
+    'ports_links': [{'rel': 'next', 'href': 'http://neutron/ports?marker=1'}],
+    'ports': [
+        {'id': '1', 'name': u'p\xf6rt', 'fixed_ips': [{'ip': '10.0.0.1'}]},
+        {'id': '2', 'name': u'\u30dd\u30fc\u30c8', 'mtu': 1500,
+         'admin_state_up': True, 'binding:profile': {}, 'qos': None},
+        {'id': '3', 'name': 'port "3", [escaped] {braces}'},
+    ],
+    'count': 12345,
+}
+
+
+def _chunks(content, size):
+    return [content[i:i + size] for i in range(0, len(content), size)]
+
+
+class TestIterItems(unittest.TestCase):
+
+    def _iter_items(self, content, chunk_size, collection='ports'):
+        members = {}
+        items = list(streaming.iter_items(_chunks(content, chunk_size),
+                                          collection, members))
+        return items, members
+
+    def test_any_chunk_size(self):
+        content = json.dumps(DOCUMENT, indent=1, ensure_ascii=False).encode(
+            'utf-8')
+        for chunk_size in range(1, 40) + [len(content)]:
+            items, members = self._iter_items(content, chunk_size)
+
+            self.assertEquals(DOCUMENT['ports'], items)
+            self.assertEquals({'ports_links': DOCUMENT['ports_links'],
+                               'count': 12345}, members)
+
+    def test_empty(self):
+        self.assertEquals(([], {'ports_links': []}), self._iter_items(
+            '{"ports": [ ], "ports_links": []}', 4))
+        self.assertEquals(([], {}), self._iter_items('{}', 4))
+
+    def test_malformed(self):
+        for content in ('{"ports": [{"id": "1"}', '{"ports": [{"id": "1"}}',
+                        '{"ports": [{"id": 1,}]}', '["ports"]', ''):
+            self.assertRaises(ValueError, self._iter_items, content, 4)
+
+
+class TestStreamedList(unittest.TestCase):
+
+    def setUp(self):
+        self.cloud = FakeCloud(max_limit=40)
+        self.network = self.cloud.add('network', name='net')
+        self.ports = [self.cloud.add('port', name='port-{0}'.format(i),
+                                     network_id=self.network['id'])
+                      for i in range(100)]
+        self.server = FakeCloudServer(self.cloud).start()
+        self.addCleanup(self.server.stop)
+        self.addCleanup(connection_pool.reset)
+
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        environ = dict((k, v) for k, v in os.environ.iteritems()
+                       if not k.startswith('OS_'))
+        environ[common.Config.OPENSTACK_CONFIG_PATH_ENV_VAR] = os.path.join(
+            tmpdir, 'openstack_config.json')
+        environ_patch = mock.patch.dict(os.environ, environ, clear=True)
+        environ_patch.start()
+        self.addCleanup(environ_patch.stop)
+
+    def _client(self, **streaming_lists_config):
+        streaming_lists_config.setdefault('enabled', True)
+        return common.NeutronClient().get(config=dict(
+            self.cloud.openstack_config(),
+            streaming_lists=streaming_lists_config))
+
+    def test_disabled_by_default(self):
+        client = common.NeutronClient().get(
+            config=self.cloud.openstack_config())
+
+        self.assertIsNone(client.stream_chunk_size)
+        self.assertNotIn('request', vars(client.httpclient))
+        self.assertEquals(self.ports, list(client.cosmo_list('port')))
+
+    def test_pages_streamed(self):
+        client = self._client(chunk_size=100)
+        client.list_ports = mock.Mock()
+
+        ports = list(client.cosmo_list('port'))
+
+        self.assertFalse(client.list_ports.called)
+        self.assertEquals(self.ports, ports)
+        self.assertEquals(['POST /identity/v2.0/tokens'] +
+                          ['GET /network/v2.0/ports.json'] * 3,
+                          self.cloud.calls)
+
+    def test_same_as_not_streamed(self):
+        filters = {'name': ['port-1', 'port-2', 'port-99'],
+                   'network_id': self.network['id']}
+        ports = list(self._client().cosmo_list('port', **filters))
+        calls = self.cloud.pop_calls()
+
+        self.assertEquals(ports, list(self._client(enabled=False).cosmo_list(
+            'port', **filters)))
+        self.assertEquals(calls, self.cloud.pop_calls())
+
+    def test_streamed_with_metrics(self):
+        content = requests.Response.content
+        read_urls = []
+
+        def read_content(resp):
+            read_urls.append(resp.url)
+            return content.fget(resp)
+
+        with metrics.collect(None), \
+                mock.patch.object(requests.Response, 'content',
+                                  property(read_content)):
+            operation_metrics = metrics._local.metrics
+            client = common.NeutronClient().get(config=dict(
+                self.cloud.openstack_config(), metrics={'enabled': True},
+                streaming_lists={'enabled': True}))
+            ports = client.cosmo_list('port')
+            self.assertEquals(self.ports[0], next(ports))
+            self.assertEquals(self.ports, [self.ports[0]] + list(ports))
+
+        self.assertEquals([], [url for url in read_urls if 'ports' in url])
+        ports_call, = [call for call in operation_metrics.summary()
+                       if call['url'] == '/network/v2.0/ports.json']
+        self.assertGreater(ports_call['bytes'], 0)
+
+    def test_partly_read(self):
+        client = self._client(chunk_size=100)
+        ports = client.cosmo_list('port')
+        self.assertEquals(self.ports[0], next(ports))
+        ports.close()
+
+        self.assertEquals([self.network], list(client.cosmo_list('network')))
+
+    def test_error(self):
+        client = self._client()
+        self.cloud.inject_fault(404, url_pattern='ports')
+
+        self.assertRaises(common.neutron_exceptions.NotFound, list,
+                          client.cosmo_list('port'))
+
+    def test_connection_failure_retried(self):
+        client = self._client()
+        client.retries = 1
+        client.retry_interval = 0
+        request = client.httpclient.request
+        failures = [requests.exceptions.ConnectionError()]
+
+        def failing_request(url, method, **kwargs):
+            if 'ports' in url and failures:
+                raise failures.pop()
+            return request(url, method, **kwargs)
+        client.httpclient.request = failing_request
+
+        self.assertEquals(self.ports, list(client.cosmo_list('port')))
+        self.assertEquals([], failures)
+
+    def test_uri_too_long(self):
+        names = ['port-{0}-{1}'.format(i, 'x' * 100) for i in range(200)]
+        names[0] = 'port-0'
+
+        ports = list(self._client().cosmo_list_named('port', names))
+
+        self.assertEquals(self.ports, ports)